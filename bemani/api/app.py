@@ -35,7 +35,7 @@ def before_request() -> None:
     global config
 
     g.config = config
-    g.data = Data(config)
+    g.data = Data(config, use_replica=True)
     g.authorized = False
 
     authkey = request.headers.get("Authorization")
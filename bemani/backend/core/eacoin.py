@@ -1,3 +1,4 @@
+from typing import List, Tuple
 from typing_extensions import Final
 
 from bemani.backend.base import Base, Status
@@ -154,9 +155,34 @@ class PASELIHandler(Base):
                 # consume payment.
                 balance = None
             else:
-                # Look up the new balance based on this delta. If there isn't enough,
-                # we will end up returning None here and exit without performing.
-                balance = self.data.local.user.update_balance(userid, self.config.machine.arcade, -payment)
+                # Apply the debit and record it in the same transaction, so a purchase is
+                # never charged without being logged or logged without being charged.
+                with self.data.local.user.transaction():
+                    # Look up the new balance based on this delta. If there isn't enough,
+                    # we will end up returning None here and exit without performing.
+                    balance = self.data.local.user.update_balance(userid, self.config.machine.arcade, -payment)
+                    if balance is not None:
+                        self.data.local.user.put_paseli_transaction(
+                            userid,
+                            self.config.machine.arcade,
+                            -payment,
+                            balance,
+                            service=service,
+                            pcbid=self.config.machine.pcbid,
+                            reason=details,
+                        )
+                        self.data.local.network.put_event(
+                            "paseli_transaction",
+                            {
+                                "delta": -payment,
+                                "balance": balance,
+                                "service": -service,
+                                "reason": details,
+                                "pcbid": self.config.machine.pcbid,
+                            },
+                            userid=userid,
+                            arcadeid=self.config.machine.arcade,
+                        )
 
             if balance is None:
                 print("Not enough balance for eacoin consume request")
@@ -164,19 +190,6 @@ class PASELIHandler(Base):
                     1,
                     self.data.local.user.get_balance(userid, self.config.machine.arcade),
                 )
-            else:
-                self.data.local.network.put_event(
-                    "paseli_transaction",
-                    {
-                        "delta": -payment,
-                        "balance": balance,
-                        "service": -service,
-                        "reason": details,
-                        "pcbid": self.config.machine.pcbid,
-                    },
-                    userid=userid,
-                    arcadeid=self.config.machine.arcade,
-                )
 
         return make_resp(0, balance)
 
@@ -216,21 +229,16 @@ class PASELIHandler(Base):
                 return root
             arcadeid = arcade.id
 
-        # Now, look up all transactions for this specific group
-        events = self.data.local.network.get_events(
-            userid=userid,
-            arcadeid=arcadeid,
-            event="paseli_transaction",
-        )
-
-        # Further filter it down to the current PCBID
-        events = [event for event in events if event.data.get("pcbid") == target]
-
         # Grab the end of day today as a timestamp
         end_of_today = Time.end_of_today()
         time_format = "%Y-%m-%d %H:%M:%S"
         date_format = "%Y-%m-%d"
 
+        # All totals are summed up by the ledger for this arcade, restricted to the
+        # target PCBID and, for user sessions, the current user.
+        def spend(start: int, width: int, count: int) -> List[Tuple[int, int]]:
+            return self.data.local.user.get_paseli_spend(arcadeid, start, width, count, pcbid=target, userid=userid)
+
         # Set up common structure
         lognode = Node.void(logtype)
         topic = Node.void("topic")
@@ -249,48 +257,20 @@ class PASELIHandler(Base):
 
             topic.add_child(Node.string("sumfrom", Time.format(beginning_of_week, date_format)))
             topic.add_child(Node.string("sumto", Time.format(end_of_week, date_format)))
-            today_total = sum(
-                [
-                    -event.data.get_int("delta")
-                    for event in events
-                    if event.timestamp >= beginning_of_today and event.timestamp < end_of_today
-                ]
-            )
 
-            today_total = sum(
-                [
-                    -event.data.get_int("delta")
-                    for event in events
-                    if event.timestamp >= beginning_of_today and event.timestamp < end_of_today
-                ]
-            )
-            week_txns = [
-                -event.data.get_int("delta")
-                for event in events
-                if event.timestamp >= beginning_of_week and event.timestamp < end_of_week
-            ]
-            week_total = sum(week_txns)
-            if len(week_txns) > 0:
-                week_avg = int(sum(week_txns) / len(week_txns))
+            # Buckets run oldest to newest, with the last one being today.
+            days = spend(beginning_of_week, Time.SECONDS_IN_DAY, 8)
+            today_total = days[-1][0]
+            week_total = sum(total for total, _ in days[:-1])
+            week_count = sum(count for _, count in days[:-1])
+            if week_count > 0:
+                week_avg = int(week_total / week_count)
             else:
                 week_avg = 0
 
             # We display the totals for each day starting with yesterday and up through 7 days prior.
             # Index starts at 0 = yesterday, 1 = the day before, etc...
-            items = []
-            for days in range(0, 7):
-                end_of_day = end_of_week - (days * Time.SECONDS_IN_DAY)
-                start_of_day = end_of_day - Time.SECONDS_IN_DAY
-
-                items.append(
-                    sum(
-                        [
-                            -event.data.get_int("delta")
-                            for event in events
-                            if event.timestamp >= start_of_day and event.timestamp < end_of_day
-                        ]
-                    )
-                )
+            items = [total for total, _ in reversed(days[:-1])]
 
             topic.add_child(Node.s32("today", today_total))
             topic.add_child(Node.s32("average", week_avg))
@@ -301,88 +281,65 @@ class PASELIHandler(Base):
             # Start one week back, since the operator can look at last7days for newer stuff.
             beginning_of_today = end_of_today - Time.SECONDS_IN_DAY
             end_of_52_weeks = beginning_of_today - Time.SECONDS_IN_WEEK
+            beginning_of_52_weeks = end_of_52_weeks - (52 * Time.SECONDS_IN_WEEK)
 
-            topic.add_child(
-                Node.string(
-                    "sumfrom",
-                    Time.format(end_of_52_weeks - (52 * Time.SECONDS_IN_WEEK), date_format),
-                )
-            )
+            topic.add_child(Node.string("sumfrom", Time.format(beginning_of_52_weeks, date_format)))
             topic.add_child(Node.string("sumto", Time.format(end_of_52_weeks, date_format)))
 
             # We index backwards, where index 0 = the first week back, 1 = the next week back after that, etc...
-            items = []
-            for weeks in range(0, 52):
-                end_of_range = end_of_52_weeks - (weeks * Time.SECONDS_IN_WEEK)
-                beginning_of_range = end_of_range - Time.SECONDS_IN_WEEK
-
-                items.append(
-                    sum(
-                        [
-                            -event.data.get_int("delta")
-                            for event in events
-                            if event.timestamp >= beginning_of_range and event.timestamp < end_of_range
-                        ]
-                    )
-                )
+            weeks = spend(beginning_of_52_weeks, Time.SECONDS_IN_WEEK, 52)
+            items = [total for total, _ in reversed(weeks)]
 
             summary.add_child(Node.s32_array("items", items))
 
-        if logtype == "eachday":
-            start_ts = Time.now()
-            end_ts = Time.now()
-            weekdays = [0] * 7
-
-            for event in events:
-                event_day = Time.days_into_week(event.timestamp)
-                weekdays[event_day] = weekdays[event_day] - event.data.get_int("delta")
-                if event.timestamp < start_ts:
-                    start_ts = event.timestamp
-
-            topic.add_child(Node.string("sumfrom", Time.format(start_ts, date_format)))
-            topic.add_child(Node.string("sumto", Time.format(end_ts, date_format)))
-            summary.add_child(Node.s32_array("items", weekdays))
-
-        if logtype == "eachhour":
-            start_ts = Time.now()
+        if logtype in ["eachday", "eachhour"]:
+            if logtype == "eachday":
+                # The unix epoch was a Thursday, so shift by three days to make Monday zero.
+                period, width, offset = Time.SECONDS_IN_WEEK, Time.SECONDS_IN_DAY, 3 * Time.SECONDS_IN_DAY
+            else:
+                period, width, offset = Time.SECONDS_IN_DAY, Time.SECONDS_IN_HOUR, 0
+
+            items, oldest = self.data.local.user.get_paseli_spend_cycle(
+                arcadeid,
+                period,
+                width,
+                offset=offset,
+                pcbid=target,
+                userid=userid,
+            )
             end_ts = Time.now()
-            hours = [0] * 24
-
-            for event in events:
-                event_hour = int((event.timestamp % Time.SECONDS_IN_DAY) / Time.SECONDS_IN_HOUR)
-                hours[event_hour] = hours[event_hour] - event.data.get_int("delta")
-                if event.timestamp < start_ts:
-                    start_ts = event.timestamp
+            start_ts = min(oldest, end_ts) if oldest is not None else end_ts
 
             topic.add_child(Node.string("sumfrom", Time.format(start_ts, date_format)))
             topic.add_child(Node.string("sumto", Time.format(end_ts, date_format)))
-            summary.add_child(Node.s32_array("items", hours))
+            summary.add_child(Node.s32_array("items", items))
 
         if logtype == "detail":
             history = Node.void("history")
             lognode.add_child(history)
 
             # Respect details paging
-            if offset is not None:
-                events = events[offset:]
-            if limit is not None:
-                events = events[:limit]
+            transactions = self.data.local.user.get_paseli_transactions(
+                arcadeid,
+                pcbid=target,
+                userid=userid,
+                limit=limit,
+                offset=offset or 0,
+            )
+            cards = self.data.local.user.get_cards_for_users({transaction.userid for transaction in transactions})
 
             # Output the details themselves
-            for event in events:
+            for transaction in transactions:
                 card_no = ""
-                if event.userid is not None:
-                    user = self.data.local.user.get_user(event.userid)
-                    if user is not None:
-                        cards = self.data.local.user.get_cards(user.id)
-                        if len(cards) > 0:
-                            card_no = CardCipher.encode(cards[0])
+                usercards = cards.get(transaction.userid, [])
+                if len(usercards) > 0:
+                    card_no = CardCipher.encode(usercards[0])
 
                 item = Node.void("item")
                 history.add_child(item)
-                item.add_child(Node.string("date", Time.format(event.timestamp, time_format)))
-                item.add_child(Node.s32("consume", -event.data.get_int("delta")))
-                item.add_child(Node.s32("service", -event.data.get_int("service")))
+                item.add_child(Node.string("date", Time.format(transaction.timestamp, time_format)))
+                item.add_child(Node.s32("consume", -transaction.delta))
+                item.add_child(Node.s32("service", transaction.service))
                 item.add_child(Node.string("cardtype", ""))
                 item.add_child(Node.string("cardno", " " * self.paseli_padding + card_no))
                 item.add_child(Node.string("title", ""))
@@ -400,24 +357,10 @@ class PASELIHandler(Base):
             for start, end in [(month_before, last_month), (last_month, this_month)]:
                 year, month, _ = Time.date_from_timestamp(start)
 
-                items = []
-                for day in range(0, 31):
-                    begin_ts = start + (day * Time.SECONDS_IN_DAY)
-                    end_ts = begin_ts + Time.SECONDS_IN_DAY
-                    if begin_ts >= end:
-                        # Passed the end of this month
-                        items.append(0)
-                    else:
-                        # Sum up all the txns for this day
-                        items.append(
-                            sum(
-                                [
-                                    -event.data.get_int("delta")
-                                    for event in events
-                                    if event.timestamp >= begin_ts and event.timestamp < end_ts
-                                ]
-                            )
-                        )
+                # Days past the end of this month are left zeroed.
+                daycount = int((end - start) / Time.SECONDS_IN_DAY)
+                items = [total for total, _ in spend(start, Time.SECONDS_IN_DAY, daycount)][:31]
+                items.extend([0] * (31 - len(items)))
 
                 item = Node.void("item")
                 summary.add_child(item)
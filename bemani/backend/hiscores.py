@@ -0,0 +1,163 @@
+from typing import Any, Dict, List, Optional, Tuple
+from typing_extensions import Final
+
+from bemani.backend.base import Base
+from bemani.common import Model, Time, cache
+from bemani.data import Config, Data, Score, UserID
+
+
+class HiscoreCache(Base):
+    """
+    Cached hiscore snapshots for games whose hiscore packet sends the hit chart, global and
+    area records and clear rates all at once. This assumes it is attached as a mixin to a game
+    class which provides get_clear_rates(), and which calls invalidate_hiscores() whenever it
+    saves a score.
+
+    Building a snapshot scans every record and attempt for a version, so snapshots are cached
+    and rebuilt by the scheduler for any area that has asked recently. A score save evicts a
+    snapshot only when it beats one of the snapshot's records. Everything else in a snapshot,
+    including clear rates and record holder names, can be up to one scheduler run (or at most
+    HISCORE_CACHE_LIFETIME) out of date.
+    """
+
+    # How long a cached hiscore snapshot lives if nothing evicts it sooner.
+    HISCORE_CACHE_LIFETIME: Final[int] = Time.SECONDS_IN_HOUR
+
+    @property
+    def hiscore_version(self) -> int:
+        """
+        The version that snapshots are cached under. Override this if a game keeps separate
+        charts for the same version, such as omnimix.
+        """
+        return self.version
+
+    def get_clear_rates(self) -> Dict[int, Dict[int, Dict[str, int]]]:
+        """
+        Returns clear rates for every chart, as sent in a hiscore packet. Should be overridden.
+        """
+        return {}
+
+    @classmethod
+    def run_scheduled_work(cls, data: Data, config: Config) -> List[Tuple[str, Dict[str, Any]]]:
+        # Rebuild hiscore snapshots for every area that asked for one recently, so that
+        # cabinets booting later never have to wait on building them.
+        areas: Dict[str, List[int]] = cache.get(f"{cls.game.value}.{cls.version}.hiscores.areas") or {}
+        for modelstring, locids in areas.items():
+            game = cls(data, config, Model.from_modelstring(modelstring))
+            game.refresh_hiscores(locids)
+        return []
+
+    def __hiscore_key(self, suffix: str) -> str:
+        # The list of areas is keyed on the base version since the scheduler only knows about that.
+        version = self.version if suffix == "areas" else self.hiscore_version
+        return f"{self.game.value}.{version}.hiscores.{suffix}"
+
+    def __format_hiscore_records(self, records: List[Tuple[UserID, Score]]) -> Dict[Tuple[int, int], Dict[str, Any]]:
+        users = {userid: profile for (userid, profile) in self.get_any_profiles([userid for (userid, _) in records])}
+        return {
+            (score.id, score.chart): {
+                "userid": userid,
+                "extid": users[userid].extid,
+                "name": users[userid].get_str("name"),
+                "points": score.points,
+            }
+            for (userid, score) in records
+        }
+
+    def __build_global_hiscores(self) -> Dict[str, Any]:
+        return {
+            "hitchart": self.data.local.music.get_hit_chart(self.game, self.version, 1024),
+            "global": self.__format_hiscore_records(self.data.remote.music.get_all_records(self.game, self.version)),
+            "clears": self.get_clear_rates(),
+        }
+
+    def __build_area_hiscores(self, locid: int) -> Dict[Tuple[int, int], Dict[str, Any]]:
+        area_users = [
+            uid
+            for (uid, prof) in self.data.local.user.get_all_profiles(self.game, self.version)
+            if prof.get_int("loc", -1) == locid
+        ]
+        return self.__format_hiscore_records(
+            self.data.local.music.get_all_records(self.game, self.version, userlist=area_users)
+        )
+
+    def refresh_hiscores(self, locids: List[int]) -> None:
+        """
+        Rebuild the cached global hiscore snapshot along with the area snapshot for
+        each location ID given.
+        """
+        self.cache.set(
+            self.__hiscore_key("global"),
+            self.__build_global_hiscores(),
+            timeout=self.HISCORE_CACHE_LIFETIME,
+        )
+        for locid in locids:
+            self.cache.set(
+                self.__hiscore_key(f"area.{locid}"),
+                self.__build_area_hiscores(locid),
+                timeout=self.HISCORE_CACHE_LIFETIME,
+            )
+
+    def get_hiscores(self, locid: int) -> Dict[str, Any]:
+        """
+        Returns everything a hiscore request needs, similar to the following:
+
+        {
+            hitchart: [(musicid, plays), ...],
+            global: {
+                (musicid, chart): {
+                    userid: record holder,
+                    extid: record holder's extid,
+                    name: record holder's name,
+                    points: record score,
+                },
+            },
+            area: same as global but only for players from this location,
+            clears: same as get_clear_rates(),
+        }
+        """
+        # Remember that this area wants hiscores so the scheduler keeps it warm.
+        areas_key = self.__hiscore_key("areas")
+        areas: Dict[str, List[int]] = self.cache.get(areas_key) or {}
+        modelstring = str(self.model)
+        if locid not in areas.get(modelstring, []):
+            areas[modelstring] = [*areas.get(modelstring, []), locid]
+            self.cache.set(areas_key, areas, timeout=Time.SECONDS_IN_DAY)
+
+        global_key = self.__hiscore_key("global")
+        area_key = self.__hiscore_key(f"area.{locid}")
+        global_hiscores, area_hiscores = self.cache.get_many(global_key, area_key)
+        if global_hiscores is None:
+            global_hiscores = self.__build_global_hiscores()
+            self.cache.set(global_key, global_hiscores, timeout=self.HISCORE_CACHE_LIFETIME)
+        if area_hiscores is None:
+            area_hiscores = self.__build_area_hiscores(locid)
+            self.cache.set(area_key, area_hiscores, timeout=self.HISCORE_CACHE_LIFETIME)
+
+        return {**global_hiscores, "area": area_hiscores}
+
+    def invalidate_hiscores(self, userid: UserID, songid: int, chart: int, points: int) -> None:
+        """
+        Evict any cached snapshot whose record for this chart was just beaten.
+        """
+
+        def beats(records: Optional[Dict[Tuple[int, int], Dict[str, Any]]]) -> bool:
+            if records is None:
+                return False
+            record = records.get((songid, chart))
+            return record is None or points > record["points"]
+
+        global_key = self.__hiscore_key("global")
+        global_hiscores = self.cache.get(global_key)
+        if global_hiscores is not None and beats(global_hiscores["global"]):
+            self.cache.delete(global_key)
+
+        if not self.cache.get(self.__hiscore_key("areas")):
+            # Nobody has asked for area records, so there's nothing to evict.
+            return
+        profile = self.data.local.user.get_profile(self.game, self.version, userid)
+        if profile is None:
+            return
+        area_key = self.__hiscore_key(f"area.{profile.get_int('loc', -1)}")
+        if beats(self.cache.get(area_key)):
+            self.cache.delete(area_key)
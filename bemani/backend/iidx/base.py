@@ -652,6 +652,22 @@ class IIDXBase(CoreHandler, CardManagerHandler, PASELIHandler, Base):
         # The machine they joined matches the arcade of the current machine
         return their_machine.arcade == machine.arcade
 
+    def get_arcade_userids(self, machine: Machine) -> List[UserID]:
+        """
+        Look up every user who joined a machine in the same arcade as the given machine,
+        using the same rules as user_joined_arcade.
+        """
+        if machine.arcade is not None:
+            machines = self.data.local.machine.get_all_machines(arcade=machine.arcade)
+        else:
+            machines = [m for m in self.data.local.machine.get_all_machines() if m.arcade is None]
+        return self.data.local.user.get_indexed_users(
+            self.game,
+            self.version,
+            "shop_location",
+            [m.id for m in machines],
+        )
+
     def get_ghost(
         self,
         ghost_type: int,
@@ -686,17 +702,6 @@ class IIDXBase(CoreHandler, CardManagerHandler, PASELIHandler, Base):
             or ghost_type == self.GHOST_TYPE_LOCAL_AVERAGE
         ):
             if ghost_type == self.GHOST_TYPE_LOCAL_TOP or ghost_type == self.GHOST_TYPE_LOCAL_AVERAGE:
-                all_scores = sorted(
-                    self.data.local.music.get_all_scores(
-                        game=self.game,
-                        version=self.music_version,
-                        songid=musicid,
-                        songchart=chart,
-                    ),
-                    key=lambda s: s[1].points,
-                    reverse=True,
-                )
-
                 # Figure out what arcade this user joined and filter scores by
                 # other users who have also joined that arcade.
                 my_profile = self.get_profile(userid)
@@ -715,24 +720,24 @@ class IIDXBase(CoreHandler, CardManagerHandler, PASELIHandler, Base):
                     machine = None
 
                 if machine is not None:
-                    all_scores = [
-                        score
-                        for score in all_scores
-                        if self.user_joined_arcade(machine, self.get_any_profile(score[0]))
-                    ]
-                else:
-                    # Not joined an arcade, so nobody matches our scores
-                    all_scores = []
-            else:
-                all_scores = sorted(
-                    self.data.remote.music.get_all_scores(
+                    local_userids = self.get_arcade_userids(machine)
+                    all_scores = self.data.local.music.get_all_scores(
                         game=self.game,
                         version=self.music_version,
                         songid=musicid,
                         songchart=chart,
-                    ),
-                    key=lambda s: s[1].points,
-                    reverse=True,
+                        userlist=local_userids,
+                        limit=1 if ghost_type == self.GHOST_TYPE_LOCAL_TOP else None,
+                    )
+                else:
+                    # Not joined an arcade, so nobody matches our scores
+                    all_scores = []
+            else:
+                all_scores = self.data.remote.music.get_leaderboard(
+                    self.game,
+                    self.music_version,
+                    musicid,
+                    chart,
                 )
 
             if ghost_type == self.GHOST_TYPE_GLOBAL_TOP or ghost_type == self.GHOST_TYPE_LOCAL_TOP:
@@ -778,23 +783,20 @@ class IIDXBase(CoreHandler, CardManagerHandler, PASELIHandler, Base):
                 dan_rank = my_profile.get_int(self.DAN_RANKING_SINGLE, -1)
 
             if dan_rank != -1:
-                all_scores = sorted(
-                    self.data.local.music.get_all_scores(
-                        game=self.game,
-                        version=self.music_version,
-                        songid=musicid,
-                        songchart=chart,
-                    ),
-                    key=lambda s: s[1].points,
-                    reverse=True,
+                relevant_userids = self.data.local.user.get_indexed_users(
+                    self.game,
+                    self.version,
+                    self.DAN_RANKING_DOUBLE if is_dp else self.DAN_RANKING_SINGLE,
+                    [dan_rank],
+                )
+                relevant_scores = self.data.local.music.get_all_scores(
+                    game=self.game,
+                    version=self.music_version,
+                    songid=musicid,
+                    songchart=chart,
+                    userlist=relevant_userids,
+                    limit=1 if ghost_type == self.GHOST_TYPE_DAN_TOP else None,
                 )
-                all_profiles = self.data.local.user.get_all_profiles(self.game, self.version)
-                relevant_userids = {
-                    profile[0]
-                    for profile in all_profiles
-                    if profile[1].get_int(self.DAN_RANKING_DOUBLE if is_dp else self.DAN_RANKING_SINGLE) == dan_rank
-                }
-                relevant_scores = [score for score in all_scores if score[0] in relevant_userids]
                 if ghost_type == self.GHOST_TYPE_DAN_TOP:
                     for potential_top in relevant_scores:
                         top_userid = potential_top[0]
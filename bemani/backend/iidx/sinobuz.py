@@ -718,31 +718,17 @@ class IIDXSinobuz(IIDXCourse, IIDXBase):
             machine = None
 
         # First, determine our current ranking before saving the new score
-        all_scores = sorted(
-            self.data.remote.music.get_all_scores(
-                game=self.game,
-                version=self.music_version,
-                songid=musicid,
-                songchart=chart,
-            ),
-            key=lambda s: (s[1].points, s[1].timestamp),
-            reverse=True,
-        )
-        all_players = {uid: prof for (uid, prof) in self.get_any_profiles([s[0] for s in all_scores])}
-
-        if not global_scores:
-            all_scores = [
-                score
-                for score in all_scores
-                if (score[0] == userid or self.user_joined_arcade(machine, all_players[score[0]]))
-            ]
-
-        # Find our actual index
-        oldindex = None
-        for i in range(len(all_scores)):
-            if all_scores[i][0] == userid:
-                oldindex = i
-                break
+        userlist = None if global_scores else self.get_arcade_userids(machine)
+        oldrank = None
+        if userid is not None:
+            oldrank = self.data.remote.music.get_score_rank(
+                self.game,
+                self.music_version,
+                userid,
+                musicid,
+                chart,
+                userlist=userlist,
+            )
 
         if userid is not None:
             clear_status = self.game_to_db_status(int(request.attribute("cflg")))
@@ -786,50 +772,26 @@ class IIDXSinobuz(IIDXCourse, IIDXBase):
             # Shop ranking
             shopdata = Node.void("shopdata")
             root.add_child(shopdata)
-            shopdata.set_attribute("rank", "-1" if oldindex is None else str(oldindex + 1))
+            shopdata.set_attribute("rank", "-1" if oldrank is None else str(oldrank))
 
             # Grab the rank of some other players on this song
             ranklist = Node.void("ranklist")
             root.add_child(ranklist)
 
-            all_scores = sorted(
-                self.data.remote.music.get_all_scores(
-                    game=self.game,
-                    version=self.music_version,
-                    songid=musicid,
-                    songchart=chart,
-                ),
-                key=lambda s: (s[1].points, s[1].timestamp),
-                reverse=True,
+            neighbors = self.data.remote.music.get_score_neighbors(
+                self.game,
+                self.music_version,
+                userid,
+                musicid,
+                chart,
+                4,
+                userlist=userlist,
             )
-            missing_players = [uid for (uid, _) in all_scores if uid not in all_players]
-            for uid, prof in self.get_any_profiles(missing_players):
-                all_players[uid] = prof
-
-            if not global_scores:
-                all_scores = [
-                    score
-                    for score in all_scores
-                    if (score[0] == userid or self.user_joined_arcade(machine, all_players[score[0]]))
-                ]
-
-            # Find our actual index
-            ourindex = None
-            for i in range(len(all_scores)):
-                if all_scores[i][0] == userid:
-                    ourindex = i
-                    break
-            if ourindex is None:
+            if neighbors is None:
                 raise Exception("Cannot find our own score after saving to DB!")
-            start = ourindex - 4
-            end = ourindex + 4
-            if start < 0:
-                start = 0
-            if end >= len(all_scores):
-                end = len(all_scores) - 1
-            relevant_scores = all_scores[start : (end + 1)]
-
-            record_num = start + 1
+            record_num, relevant_scores = neighbors
+            all_players = {uid: prof for (uid, prof) in self.get_any_profiles([s[0] for s in relevant_scores])}
+
             for score in relevant_scores:
                 profile = all_players[score[0]]
 
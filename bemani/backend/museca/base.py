@@ -4,6 +4,7 @@ from typing_extensions import Final
 
 from bemani.backend.base import Base
 from bemani.backend.core import CoreHandler, CardManagerHandler, PASELIHandler
+from bemani.backend.hiscores import HiscoreCache
 from bemani.common import (
     Profile,
     ValidatedDict,
@@ -16,7 +17,7 @@ from bemani.data import UserID, Config, Data
 from bemani.protocol import Node
 
 
-class MusecaBase(CoreHandler, CardManagerHandler, PASELIHandler, Base):
+class MusecaBase(CoreHandler, CardManagerHandler, PASELIHandler, HiscoreCache, Base):
     """
     Base game class for all Museca version that we support.
     """
@@ -54,6 +55,11 @@ class MusecaBase(CoreHandler, CardManagerHandler, PASELIHandler, Base):
             return DBConstants.OMNIMIX_VERSION_BUMP + self.version
         return self.version
 
+    @property
+    def hiscore_version(self) -> int:
+        # Omnimix has its own clear rates, so it gets its own snapshots.
+        return self.music_version
+
     def previous_version(self) -> Optional["MusecaBase"]:
         """
         Returns the previous version of the game, based on this game. Should
@@ -297,6 +303,7 @@ class MusecaBase(CoreHandler, CardManagerHandler, PASELIHandler, Base):
                 scoredata,
                 highscore,
             )
+            self.invalidate_hiscores(userid, songid, chart, points)
 
         # Save the history of this score too
         self.data.local.music.put_attempt(
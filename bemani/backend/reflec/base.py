@@ -1,11 +1,11 @@
 # vim: set fileencoding=utf-8
-from typing import Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 from typing_extensions import Final
 
 from bemani.backend.base import Base
 from bemani.backend.core import CoreHandler, CardManagerHandler, PASELIHandler
-from bemani.common import Profile, ValidatedDict, GameConstants, DBConstants, Time
-from bemani.data import Machine, ScoreSaveException, UserID
+from bemani.common import Profile, ValidatedDict, GameConstants, DBConstants, Time, cache
+from bemani.data import Config, Data, Machine, ScoreSaveException, UserID
 from bemani.protocol import Node
 
 
@@ -42,6 +42,39 @@ class ReflecBeatBase(CoreHandler, CardManagerHandler, PASELIHandler, Base):
         "lobby2",
     ]
 
+    # Hit chart windows, in days, that this version displays. Hit charts don't need to be
+    # up to the second, so they are cached and kept warm by the scheduler.
+    HIT_CHART_WINDOWS: List[int] = []
+    HIT_CHART_COUNT: Final[int] = 1024
+    HIT_CHART_CACHE_LIFETIME: Final[int] = Time.SECONDS_IN_MINUTE * 10
+
+    @classmethod
+    def run_scheduled_work(cls, data: Data, config: Config) -> List[Tuple[str, Dict[str, Any]]]:
+        """
+        Refresh this version's cached hit charts, if it has any.
+        """
+        if cls.HIT_CHART_WINDOWS:
+            cache.set(
+                f"{cls.game.value}.{cls.version}.hitcharts",
+                data.local.music.get_hit_charts(cls.game, cls.version, cls.HIT_CHART_COUNT, cls.HIT_CHART_WINDOWS),
+                timeout=cls.HIT_CHART_CACHE_LIFETIME,
+            )
+        return []
+
+    def get_hit_charts(self) -> Dict[Optional[int], List[Tuple[int, int]]]:
+        """
+        Returns this version's hit charts for each of HIT_CHART_WINDOWS, computed in a single
+        query and cached briefly.
+        """
+        key = f"{self.game.value}.{self.version}.hitcharts"
+        charts = self.cache.get(key)
+        if charts is None:
+            charts = self.data.local.music.get_hit_charts(
+                self.game, self.version, self.HIT_CHART_COUNT, self.HIT_CHART_WINDOWS
+            )
+            self.cache.set(key, charts, timeout=self.HIT_CHART_CACHE_LIFETIME)
+        return charts
+
     def previous_version(self) -> Optional["ReflecBeatBase"]:
         """
         Returns the previous version of the game, based on this game. Should
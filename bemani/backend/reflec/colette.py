@@ -13,6 +13,9 @@ class ReflecBeatColette(ReflecBeatBase):
     name: str = "REFLEC BEAT colette"
     version: int = VersionConstants.REFLEC_BEAT_COLETTE
 
+    # Weekly, monthly and yearly hit charts
+    HIT_CHART_WINDOWS: List[int] = [7, 30, 365]
+
     # Clear types according to the game
     GAME_CLEAR_TYPE_NO_PLAY: Final[int] = 0
     GAME_CLEAR_TYPE_FAILED: Final[int] = 1
@@ -171,12 +174,14 @@ class ReflecBeatColette(ReflecBeatBase):
                 d.add_child(Node.s16("mid", mid))
                 d.add_child(Node.s32("cnt", plays))
 
+        hitcharts = self.get_hit_charts()
+
         # Weekly hit chart
         add_hitchart(
             "weekly",
             Time.now() - Time.SECONDS_IN_WEEK,
             Time.now(),
-            self.data.local.music.get_hit_chart(self.game, self.version, 1024, 7),
+            hitcharts[7],
         )
 
         # Monthly hit chart
@@ -184,7 +189,7 @@ class ReflecBeatColette(ReflecBeatBase):
             "monthly",
             Time.now() - Time.SECONDS_IN_DAY * 30,
             Time.now(),
-            self.data.local.music.get_hit_chart(self.game, self.version, 1024, 30),
+            hitcharts[30],
         )
 
         # All time hit chart
@@ -192,7 +197,7 @@ class ReflecBeatColette(ReflecBeatBase):
             "total",
             Time.now() - Time.SECONDS_IN_DAY * 365,
             Time.now(),
-            self.data.local.music.get_hit_chart(self.game, self.version, 1024, 365),
+            hitcharts[365],
         )
 
         return root
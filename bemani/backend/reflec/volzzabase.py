@@ -1,14 +1,16 @@
-from typing import Dict, List, Tuple
+from typing import List, Tuple
 from typing_extensions import Final
 
 from bemani.backend.reflec.base import ReflecBeatBase
 
-from bemani.common import ID, Time, Profile
-from bemani.data import Attempt, UserID
+from bemani.common import ID, Time
 from bemani.protocol import Node
 
 
 class ReflecBeatVolzzaBase(ReflecBeatBase):
+    # Weekly, monthly and yearly hit charts
+    HIT_CHART_WINDOWS: List[int] = [7, 30, 365]
+
     # Clear types according to the game
     GAME_CLEAR_TYPE_NO_PLAY: Final[int] = 0
     GAME_CLEAR_TYPE_EARLY_FAILED: Final[int] = 1
@@ -79,56 +81,27 @@ class ReflecBeatVolzzaBase(ReflecBeatBase):
         yesterday = Node.void("yesterday")
         shop_score.add_child(yesterday)
 
-        all_profiles = self.data.local.user.get_all_profiles(self.game, self.version)
-        all_attempts = self.data.local.music.get_all_attempts(
-            self.game,
-            self.version,
-            timelimit=(Time.beginning_of_today() - Time.SECONDS_IN_DAY),
-        )
         machine = self.data.local.machine.get_machine(self.config.machine.pcbid)
         if machine.arcade is not None:
             lids = [machine.id for machine in self.data.local.machine.get_all_machines(machine.arcade)]
         else:
             lids = [machine.id]
 
-        relevant_profiles = [profile for profile in all_profiles if profile[1].get_int("lid", -1) in lids]
+        relevant_users = self.data.local.user.get_indexed_users(self.game, self.version, "lid", lids)
+        relevant_profiles = self.data.local.user.get_all_profiles(self.game, self.version, userlist=relevant_users)
 
         for rootnode, timeoffset in [
             (today, 0),
             (yesterday, Time.SECONDS_IN_DAY),
         ]:
-            # Grab all attempts made in the relevant day
-            relevant_attempts = [
-                attempt
-                for attempt in all_attempts
-                if (
-                    attempt[1].timestamp >= (Time.beginning_of_today() - timeoffset)
-                    and attempt[1].timestamp <= (Time.end_of_today() - timeoffset)
-                )
-            ]
-
-            # Calculate scores based on attempt
-            scores_by_user: Dict[UserID, Dict[int, Dict[int, Attempt]]] = {}
-            for userid, attempt in relevant_attempts:
-                if userid not in scores_by_user:
-                    scores_by_user[userid] = {}
-                if attempt.id not in scores_by_user[userid]:
-                    scores_by_user[userid][attempt.id] = {}
-                if attempt.chart not in scores_by_user[userid][attempt.id]:
-                    # No high score for this yet, just use this attempt
-                    scores_by_user[userid][attempt.id][attempt.chart] = attempt
-                else:
-                    # If this attempt is better than the stored one, replace it
-                    if scores_by_user[userid][attempt.id][attempt.chart].points < attempt.points:
-                        scores_by_user[userid][attempt.id][attempt.chart] = attempt
-
-            # Calculate points earned by user in the day
-            points_by_user: Dict[UserID, int] = {}
-            for userid in scores_by_user:
-                points_by_user[userid] = 0
-                for mid in scores_by_user[userid]:
-                    for chart in scores_by_user[userid][mid]:
-                        points_by_user[userid] = points_by_user[userid] + scores_by_user[userid][mid][chart].points
+            # Calculate points earned by each user in the day, based on their best attempt per chart
+            points_by_user = self.data.local.music.get_attempt_points(
+                self.game,
+                self.version,
+                relevant_users,
+                Time.beginning_of_today() - timeoffset,
+                Time.end_of_today() - timeoffset,
+            )
 
             # Output that day's earned points
             for userid, profile in relevant_profiles:
@@ -171,12 +144,14 @@ class ReflecBeatVolzzaBase(ReflecBeatBase):
                 d.add_child(Node.s16("mid", mid))
                 d.add_child(Node.s32("cnt", plays))
 
+        hitcharts = self.get_hit_charts()
+
         # Weekly hit chart
         add_hitchart(
             "weekly",
             Time.now() - Time.SECONDS_IN_WEEK,
             Time.now(),
-            self.data.local.music.get_hit_chart(self.game, self.version, 1024, 7),
+            hitcharts[7],
         )
 
         # Monthly hit chart
@@ -184,7 +159,7 @@ class ReflecBeatVolzzaBase(ReflecBeatBase):
             "monthly",
             Time.now() - Time.SECONDS_IN_DAY * 30,
             Time.now(),
-            self.data.local.music.get_hit_chart(self.game, self.version, 1024, 30),
+            hitcharts[30],
         )
 
         # All time hit chart
@@ -192,7 +167,7 @@ class ReflecBeatVolzzaBase(ReflecBeatBase):
             "total",
             Time.now() - Time.SECONDS_IN_DAY * 365,
             Time.now(),
-            self.data.local.music.get_hit_chart(self.game, self.version, 1024, 365),
+            hitcharts[365],
         )
 
         return root
@@ -206,49 +181,51 @@ class ReflecBeatVolzzaBase(ReflecBeatBase):
         root.add_child(shop_score)
         shop_score.add_child(Node.s32("time", Time.now()))
 
-        profiles: Dict[UserID, Profile] = {}
-        for songid in range(start_music_id, end_music_id + 1):
-            allscores = self.data.local.music.get_all_scores(
-                self.game,
-                self.version,
-                songid=songid,
-            )
-            profiles.update({u: p for u, p in self.get_any_profiles([s[0] for s in allscores if s[0] not in profiles])})
-
-            for ng in [
-                self.CHART_TYPE_BASIC,
-                self.CHART_TYPE_MEDIUM,
-                self.CHART_TYPE_HARD,
-                self.CHART_TYPE_SPECIAL,
-            ]:
-                scores = sorted(
-                    [score for score in allscores if score[1].chart == ng],
-                    key=lambda score: score[1].points,
-                    reverse=True,
-                )
+        # Grab every score in the requested range at once, along with the profiles of everyone
+        # who set one, and then rank each chart in a single pass.
+        allscores = self.data.local.music.get_all_scores(
+            self.game,
+            self.version,
+            songrange=(start_music_id, end_music_id),
+        )
+        profiles = dict(self.get_any_profiles([userid for userid, _ in allscores]))
+
+        charts = {
+            self.CHART_TYPE_BASIC,
+            self.CHART_TYPE_MEDIUM,
+            self.CHART_TYPE_HARD,
+            self.CHART_TYPE_SPECIAL,
+        }
+        scores = sorted(
+            [(userid, score) for userid, score in allscores if score.chart in charts],
+            key=lambda score: (score[1].id, score[1].chart, -score[1].points),
+        )
 
-                for i in range(len(scores)):
-                    userid, score = scores[i]
-                    if userid not in profiles:
-                        profiles[userid] = self.get_any_profile(userid)
-                    profile = profiles[userid]
-
-                    data = Node.void("data")
-                    shop_score.add_child(data)
-                    data.add_child(Node.s32("rank", i + 1))
-                    data.add_child(Node.s16("music_id", songid))
-                    data.add_child(Node.s8("note_grade", score.chart))
-                    data.add_child(
-                        Node.s8(
-                            "clear_type",
-                            self._db_to_game_clear_type(score.data.get_int("clear_type")),
-                        )
-                    )
-                    data.add_child(Node.s32("user_id", profile.extid))
-                    data.add_child(Node.s16("icon_id", profile.get_dict("config").get_int("icon_id")))
-                    data.add_child(Node.s32("score", score.points))
-                    data.add_child(Node.s32("time", score.timestamp))
-                    data.add_child(Node.string("name", profile.get_str("name")))
+        rank = 0
+        lastchart = None
+        for userid, score in scores:
+            if (score.id, score.chart) != lastchart:
+                rank = 0
+                lastchart = (score.id, score.chart)
+            rank = rank + 1
+            profile = profiles[userid]
+
+            data = Node.void("data")
+            shop_score.add_child(data)
+            data.add_child(Node.s32("rank", rank))
+            data.add_child(Node.s16("music_id", score.id))
+            data.add_child(Node.s8("note_grade", score.chart))
+            data.add_child(
+                Node.s8(
+                    "clear_type",
+                    self._db_to_game_clear_type(score.data.get_int("clear_type")),
+                )
+            )
+            data.add_child(Node.s32("user_id", profile.extid))
+            data.add_child(Node.s16("icon_id", profile.get_dict("config").get_int("icon_id")))
+            data.add_child(Node.s32("score", score.points))
+            data.add_child(Node.s32("time", score.timestamp))
+            data.add_child(Node.string("name", profile.get_str("name")))
 
         return root
 
@@ -4,12 +4,13 @@ from typing_extensions import Final
 
 from bemani.backend.base import Base
 from bemani.backend.core import CoreHandler, CardManagerHandler, PASELIHandler
+from bemani.backend.hiscores import HiscoreCache
 from bemani.common import Profile, ValidatedDict, GameConstants, DBConstants, Parallel
 from bemani.data import UserID
 from bemani.protocol import Node
 
 
-class SoundVoltexBase(CoreHandler, CardManagerHandler, PASELIHandler, Base):
+class SoundVoltexBase(CoreHandler, CardManagerHandler, PASELIHandler, HiscoreCache, Base):
     """
     Base game class for all Sound Voltex version that we support.
     """
@@ -286,6 +287,7 @@ class SoundVoltexBase(CoreHandler, CardManagerHandler, PASELIHandler, Base):
                 scoredata,
                 highscore,
             )
+            self.invalidate_hiscores(userid, songid, chart, points)
 
         # Save the history of this score too
         self.data.local.music.put_attempt(
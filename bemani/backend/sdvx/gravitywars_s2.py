@@ -1,9 +1,9 @@
 # vim: set fileencoding=utf-8
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, List
 
 from bemani.backend.sdvx.gravitywars import SoundVoltexGravityWars
 from bemani.common import ID, Profile
-from bemani.data import Score, UserID
+from bemani.data import UserID
 from bemani.protocol import Node
 
 
@@ -3833,81 +3833,44 @@ class SoundVoltexGravityWarsSeason2(
     def handle_game_3_hiscore_request(self, request: Node) -> Node:
         # Grab location for local scores
         locid = ID.parse_machine_id(request.child_value("locid"))
+        hiscores = self.get_hiscores(locid)
 
         # Start the response packet
         game = Node.void("game_3")
 
-        # First, grab hit chart
-        playcounts = self.data.local.music.get_hit_chart(self.game, self.version, 1024)
-
+        # First, output hit chart
         hitchart = Node.void("hit")
         game.add_child(hitchart)
-        for songid, count in playcounts:
+        for songid, count in hiscores["hitchart"]:
             info = Node.void("d")
             hitchart.add_child(info)
             info.add_child(Node.u32("id", songid))
             info.add_child(Node.u32("cnt", count))
 
-        # Now, grab global and local scores as well as clear rates
-        global_records = self.data.remote.music.get_all_records(self.game, self.version)
-        users = {uid: prof for (uid, prof) in self.data.local.user.get_all_profiles(self.game, self.version)}
-        area_users = [uid for uid in users if users[uid].get_int("loc", -1) == locid]
-        area_records = self.data.local.music.get_all_records(self.game, self.version, userlist=area_users)
-        clears = self.get_clear_rates()
-        records: Dict[int, Dict[int, Dict[str, Tuple[UserID, Score]]]] = {}
-
-        missing_users = [userid for (userid, _) in global_records if userid not in users] + [
-            userid for (userid, _) in area_records if userid not in users
-        ]
-        for userid, profile in self.get_any_profiles(missing_users):
-            users[userid] = profile
-
-        for userid, score in global_records:
-            if userid not in users:
-                raise Exception("Logic error, missing profile for user!")
-            if score.id not in records:
-                records[score.id] = {}
-            if score.chart not in records[score.id]:
-                records[score.id][score.chart] = {}
-            records[score.id][score.chart]["global"] = (userid, score)
-
-        for userid, score in area_records:
-            if userid not in users:
-                raise Exception("Logic error, missing profile for user!")
-            if score.id not in records:
-                records[score.id] = {}
-            if score.chart not in records[score.id]:
-                records[score.id][score.chart] = {}
-            records[score.id][score.chart]["area"] = (userid, score)
-
-        # Output it to the game
+        # Output global and local scores as well as clear rates
+        clears = hiscores["clears"]
         highscores = Node.void("sc")
         game.add_child(highscores)
-        for musicid in records:
-            for chart in records[musicid]:
-                (globaluserid, globalscore) = records[musicid][chart]["global"]
+        for (musicid, chart), record in hiscores["global"].items():
+            if clears[musicid][chart]["total"] > 0:
+                clear_rate = float(clears[musicid][chart]["clears"]) / float(clears[musicid][chart]["total"])
+            else:
+                clear_rate = 0.0
 
-                global_profile = users[globaluserid]
-                if clears[musicid][chart]["total"] > 0:
-                    clear_rate = float(clears[musicid][chart]["clears"]) / float(clears[musicid][chart]["total"])
-                else:
-                    clear_rate = 0.0
-
-                info = Node.void("d")
-                highscores.add_child(info)
-                info.add_child(Node.u32("id", musicid))
-                info.add_child(Node.u32("ty", chart))
-                info.add_child(Node.string("a_sq", ID.format_extid(global_profile.extid)))
-                info.add_child(Node.string("a_nm", global_profile.get_str("name")))
-                info.add_child(Node.u32("a_sc", globalscore.points))
-                info.add_child(Node.s32("cr", int(clear_rate * 10000)))
+            info = Node.void("d")
+            highscores.add_child(info)
+            info.add_child(Node.u32("id", musicid))
+            info.add_child(Node.u32("ty", chart))
+            info.add_child(Node.string("a_sq", ID.format_extid(record["extid"])))
+            info.add_child(Node.string("a_nm", record["name"]))
+            info.add_child(Node.u32("a_sc", record["points"]))
+            info.add_child(Node.s32("cr", int(clear_rate * 10000)))
 
-                if "area" in records[musicid][chart]:
-                    (localuserid, localscore) = records[musicid][chart]["area"]
-                    local_profile = users[localuserid]
-                    info.add_child(Node.string("l_sq", ID.format_extid(local_profile.extid)))
-                    info.add_child(Node.string("l_nm", local_profile.get_str("name")))
-                    info.add_child(Node.u32("l_sc", localscore.points))
+            if (musicid, chart) in hiscores["area"]:
+                local = hiscores["area"][(musicid, chart)]
+                info.add_child(Node.string("l_sq", ID.format_extid(local["extid"])))
+                info.add_child(Node.string("l_nm", local["name"]))
+                info.add_child(Node.u32("l_sc", local["points"]))
 
         return game
 
@@ -1961,82 +1961,38 @@ class SoundVoltexInfiniteInfection(
     def handle_game_2_hiscore_request(self, request: Node) -> Node:
         # Grab location for local scores
         locid = ID.parse_machine_id(request.child_value("locid"))
+        hiscores = self.get_hiscores(locid)
 
         # Start the response packet
         game = Node.void("game_2")
 
-        # First, grab hit chart
-        playcounts = self.data.local.music.get_hit_chart(self.game, self.version, 1024)
-
+        # First, output hit chart
         hitchart = Node.void("hitchart")
         game.add_child(hitchart)
-        for songid, count in playcounts:
+        for songid, count in hiscores["hitchart"]:
             info = Node.void("info")
             hitchart.add_child(info)
             info.add_child(Node.u32("id", songid))
             info.add_child(Node.u32("cnt", count))
 
-        # Now, grab user records
-        records = self.data.remote.music.get_all_records(self.game, self.version)
-        missing_users = [userid for (userid, _) in records]
-        users = {userid: profile for (userid, profile) in self.get_any_profiles(missing_users)}
-
-        hiscore_allover = Node.void("hiscore_allover")
-        game.add_child(hiscore_allover)
-
-        # Output records
-        for userid, score in records:
-            info = Node.void("info")
-
-            if userid not in users:
-                raise Exception("Logic error, missing profile for user!")
-            profile = users[userid]
-
-            info.add_child(Node.u32("id", score.id))
-            info.add_child(Node.u32("type", score.chart))
-            info.add_child(Node.string("name", profile.get_str("name")))
-            info.add_child(Node.string("code", ID.format_extid(profile.extid)))
-            info.add_child(Node.u32("score", score.points))
-
-            # Add to global scores
-            hiscore_allover.add_child(info)
-
-        # Now, grab local records
-        area_users = [
-            uid
-            for (uid, prof) in self.data.local.user.get_all_profiles(self.game, self.version)
-            if prof.get_int("loc", -1) == locid
-        ]
-        records = self.data.local.music.get_all_records(self.game, self.version, userlist=area_users)
-        missing_users = [userid for (userid, _) in records if userid not in users]
-        for userid, profile in self.get_any_profiles(missing_users):
-            users[userid] = profile
-
-        hiscore_location = Node.void("hiscore_location")
-        game.add_child(hiscore_location)
-
-        # Output records
-        for userid, score in records:
-            info = Node.void("info")
-
-            if userid not in users:
-                raise Exception("Logic error, missing profile for user!")
-            profile = users[userid]
-
-            info.add_child(Node.u32("id", score.id))
-            info.add_child(Node.u32("type", score.chart))
-            info.add_child(Node.string("name", profile.get_str("name")))
-            info.add_child(Node.string("code", ID.format_extid(profile.extid)))
-            info.add_child(Node.u32("score", score.points))
-
-            # Add to local scores
-            hiscore_location.add_child(info)
-
-        # Now, grab clear rates
+        # Now, output global and local records
+        for nodename, records in [("hiscore_allover", hiscores["global"]), ("hiscore_location", hiscores["area"])]:
+            hiscore = Node.void(nodename)
+            game.add_child(hiscore)
+            for (songid, chart), record in records.items():
+                info = Node.void("info")
+                hiscore.add_child(info)
+                info.add_child(Node.u32("id", songid))
+                info.add_child(Node.u32("type", chart))
+                info.add_child(Node.string("name", record["name"]))
+                info.add_child(Node.string("code", ID.format_extid(record["extid"])))
+                info.add_child(Node.u32("score", record["points"]))
+
+        # Now, output clear rates
         clear_rate = Node.void("clear_rate")
         game.add_child(clear_rate)
 
-        clears = self.get_clear_rates()
+        clears = hiscores["clears"]
         for songid in clears:
             for chart in clears[songid]:
                 if clears[songid][chart]["total"] > 0:
@@ -1,5 +1,9 @@
 import concurrent.futures
-from typing import Any, Callable, List, TypeVar
+import os
+import threading
+import time
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional, TypeVar
 
 T = TypeVar("T")
 
@@ -9,70 +13,139 @@ class Parallel:
     Utilities for executing parallel operations. This is used as a convenience
     so that we don't have to plumb async/await support (yuck) through the network,
     but we can still make multiple queries at once to remote services and the DB.
-    """
 
-    @staticmethod
-    def execute(lambdas: List[Callable[[], Any]]) -> List[Any]:
-        """
-        Given a list of callables, execute them and return a list of their returns.
-        Guarantees order of return based on order of callable.
-        """
+    Every call shares a single process-wide thread pool capped at MAX_WORKERS threads,
+    so that busy servers don't spawn and tear down threads for every request. Parallel
+    calls made from inside the pool, or while every thread is busy, run any of their work
+    that the pool hasn't gotten to yet themselves. This keeps nested parallel calls from
+    deadlocking when the pool is full.
+    """
 
-        if len(lambdas) == 0:
+    # The most threads the shared pool will ever run at once.
+    MAX_WORKERS: int = 32
+
+    __lock = threading.Lock()
+    __local = threading.local()
+    __executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+    __stats: Dict[str, int] = {}
+
+    @classmethod
+    def _reset(cls) -> None:
+        # Threads don't survive a fork, so a forked child needs its own pool.
+        cls.__lock = threading.Lock()
+        cls.__local = threading.local()
+        cls.__executor = None
+        cls.__stats = {
+            "submitted": 0,
+            "queued": 0,
+            "active": 0,
+            "peak_queued": 0,
+            "peak_active": 0,
+            "ran_by_caller": 0,
+            "timeouts": 0,
+        }
+
+    @classmethod
+    def __get_executor(cls) -> concurrent.futures.ThreadPoolExecutor:
+        with cls.__lock:
+            if cls.__executor is None:
+                cls.__executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=cls.MAX_WORKERS,
+                    thread_name_prefix="parallel",
+                )
+            return cls.__executor
+
+    @classmethod
+    def __track(cls, call: Callable[[], Any]) -> Any:
+        cls.__local.worker = True
+        with cls.__lock:
+            cls.__stats["queued"] -= 1
+            cls.__stats["active"] += 1
+            cls.__stats["peak_active"] = max(cls.__stats["peak_active"], cls.__stats["active"])
+        try:
+            return call()
+        finally:
+            with cls.__lock:
+                cls.__stats["active"] -= 1
+
+    @classmethod
+    def __run(cls, calls: List[Callable[[], Any]], timeout: Optional[float]) -> List[Any]:
+        if len(calls) == 0:
             return []
-        with concurrent.futures.ThreadPoolExecutor(max_workers=len(lambdas)) as executor:
-            futures = {executor.submit(lambdas[pos]): pos for pos in range(len(lambdas))}
-            results = []  # List: Tuple[Any, int]
 
-            for future in concurrent.futures.as_completed(futures):
-                pos = futures[future]
-                data = future.result()
-                results.append((data, pos))
+        executor = cls.__get_executor()
+        with cls.__lock:
+            cls.__stats["submitted"] += len(calls)
+            cls.__stats["queued"] += len(calls)
+            cls.__stats["peak_queued"] = max(cls.__stats["peak_queued"], cls.__stats["queued"])
+        futures = [executor.submit(cls.__track, call) for call in calls]
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        results = []
+        try:
+            for call, future in zip(calls, futures):
+                with cls.__lock:
+                    saturated = cls.__stats["active"] >= cls.MAX_WORKERS
+                if (saturated or getattr(cls.__local, "worker", False)) and future.cancel():
+                    # Nobody has picked this up yet, so do it ourselves instead of waiting.
+                    with cls.__lock:
+                        cls.__stats["queued"] -= 1
+                        cls.__stats["ran_by_caller"] += 1
+                    results.append(call())
+                else:
+                    remaining = None if deadline is None else max(deadline - time.monotonic(), 0.0)
+                    results.append(future.result(timeout=remaining))
+        except BaseException as e:
+            # Don't bother running anything else, since the caller is getting an exception.
+            for future in futures:
+                if future.cancel():
+                    with cls.__lock:
+                        cls.__stats["queued"] -= 1
+            if isinstance(e, concurrent.futures.TimeoutError):
+                with cls.__lock:
+                    cls.__stats["timeouts"] += 1
+            raise
+
+        return results
+
+    @classmethod
+    def stats(cls) -> Dict[str, int]:
+        """
+        Return how saturated the shared pool is. This includes the number of calls
+        submitted, queued and running right now and at the most, how many calls were
+        run by their callers because the pool was busy, and how many waits timed out.
+        """
+        with cls.__lock:
+            return {"workers": cls.MAX_WORKERS, **cls.__stats}
 
-            return [r[0] for r in sorted(results, key=lambda r: r[1])]
+    @classmethod
+    def execute(cls, lambdas: List[Callable[[], Any]], timeout: Optional[float] = None) -> List[Any]:
+        """
+        Given a list of callables, execute them and return a list of their returns.
+        Guarantees order of return based on order of callable. If any callable raises,
+        or they don't all finish within the optional timeout in seconds, the exception
+        is raised and any callables that haven't started yet are cancelled.
+        """
+        return cls.__run(lambdas, timeout)
 
-    @staticmethod
-    def map(lam: Callable[[T], Any], params: List[T]) -> List[Any]:
+    @classmethod
+    def map(cls, lam: Callable[[T], Any], params: List[T], timeout: Optional[float] = None) -> List[Any]:
         """
         Given a callable and a list of params, executes that callable with each set
         of params in the list and returns a list of their returns. Guarantees order
-        of return.
+        of return. Exceptions and timeouts are handled as in execute.
         """
+        return cls.__run([partial(lam, param) for param in params], timeout)
 
-        if len(params) == 0:
-            return []
-        with concurrent.futures.ThreadPoolExecutor(max_workers=len(params)) as executor:
-            futures = {executor.submit(lam, params[pos]): pos for pos in range(len(params))}
-            results = []  # List: Tuple[Any, int]
-
-            for future in concurrent.futures.as_completed(futures):
-                pos = futures[future]
-                data = future.result()
-                results.append((data, pos))
-
-            return [r[0] for r in sorted(results, key=lambda r: r[1])]
-
-    @staticmethod
-    def call(lambdas: "List[Callable[..., Any]]", *params: Any) -> List[Any]:
+    @classmethod
+    def call(cls, lambdas: "List[Callable[..., Any]]", *params: Any, timeout: Optional[float] = None) -> List[Any]:
         """
         Given a list of callables and zero or more params, calls each callable in
         parallel with the params specified. Essentially a map of params to multiple
         callables in parallel. Returns a list of returns, garanteed to be in the
-        same order as the lambdas.
+        same order as the lambdas. Exceptions and timeouts are handled as in execute.
         """
-
-        if len(lambdas) == 0:
-            return []
-        with concurrent.futures.ThreadPoolExecutor(max_workers=len(lambdas)) as executor:
-            futures = {executor.submit(lambdas[pos], *params): pos for pos in range(len(lambdas))}
-            results = []  # List: Tuple[Any, int]
-
-            for future in concurrent.futures.as_completed(futures):
-                pos = futures[future]
-                data = future.result()
-                results.append((data, pos))
-
-            return [r[0] for r in sorted(results, key=lambda r: r[1])]
+        return cls.__run([partial(lam, *params) for lam in lambdas], timeout)
 
     @staticmethod
     def flatten(lists: List[List[Any]]) -> List[Any]:
@@ -83,3 +156,7 @@ class Parallel:
         """
 
         return [item for sublist in lists for item in sublist]
+
+
+Parallel._reset()
+os.register_at_fork(after_in_child=Parallel._reset)
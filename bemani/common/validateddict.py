@@ -1,5 +1,5 @@
 import copy
-from typing import Optional, List, Dict, Any
+from typing import Callable, Optional, List, Dict, Set, Tuple, Any
 
 from bemani.common.constants import GameConstants
 
@@ -465,9 +465,51 @@ class Profile(ValidatedDict):
         self.version = version
         self.refid = refid
         self.extid = extid
+        # What this profile looked like when it was loaded, if it was loaded from storage,
+        # so that saving it only needs to write the keys that changed since.
+        self.revision: Optional[int] = None
+        self.stored: Optional[Callable[[], Dict[str, Any]]] = None
+
+    def mark_stored(self, revision: int, stored: Callable[[], Dict[str, Any]]) -> None:
+        """
+        Record the revision and contents of this profile as it exists in storage.
+
+        Parameters:
+            revision - The storage revision, bumped on every write.
+            stored - A function returning the profile contents as stored. It is only called
+                     when the profile is saved, and must return objects that aren't shared
+                     with the profile itself, since games modify values in place.
+        """
+        self.revision = revision
+        self.stored = stored
+
+    def dirty_keys(self) -> Optional[Tuple[Set[str], Set[str]]]:
+        """
+        Returns the top-level keys that have been added or modified since this profile was
+        loaded, and the keys that have been removed, or None if it wasn't loaded from storage.
+        Scalars are compared by type as well, so that switching an integer to an equal float
+        is still treated as a change.
+        """
+        if self.stored is None:
+            return None
+        stored = self.stored()
+
+        def same(a: Any, b: Any) -> bool:
+            if isinstance(a, dict) and isinstance(b, dict):
+                return a.keys() == b.keys() and all(same(a[k], b[k]) for k in a)
+            if isinstance(a, (list, tuple)) and isinstance(b, (list, tuple)):
+                return len(a) == len(b) and all(same(x, y) for x, y in zip(a, b))
+            return type(a) == type(b) and bool(a == b)
+
+        changed = {key for key, value in self.items() if key not in stored or not same(value, stored[key])}
+        removed = {key for key in stored if key not in self}
+        return changed, removed
 
     def clone(self) -> "Profile":
-        return Profile(self.game, self.version, self.refid, self.extid, copy.deepcopy(self))
+        profile = Profile(self.game, self.version, self.refid, self.extid, copy.deepcopy(self))
+        if self.revision is not None and self.stored is not None:
+            profile.mark_stored(self.revision, self.stored)
+        return profile
 
 
 class PlayStatistics(ValidatedDict):
@@ -12,6 +12,7 @@ from bemani.data.types import (
     Link,
     Song,
     Event,
+    PaseliTransaction,
     Server,
     Client,
     UserID,
@@ -36,6 +37,7 @@ __all__ = [
     "Link",
     "Song",
     "Event",
+    "PaseliTransaction",
     "Server",
     "Client",
     "UserID",
@@ -1,20 +1,28 @@
 from typing import List, Optional
 
 from bemani.data.api.client import APIClient
+from bemani.data.api.mirror import MirrorClient
 from bemani.data.interfaces import APIProviderInterface
+from bemani.data.mysql.mirror import MirrorData
 
 
 class BaseGlobalData:
-    def __init__(self, api: APIProviderInterface) -> None:
+    def __init__(self, api: APIProviderInterface, mirror: Optional[MirrorData] = None) -> None:
         self.__localapi = api
+        self.__mirror = mirror
         self.__apiclients: Optional[List[APIClient]] = None
 
     @property
     def clients(self) -> List[APIClient]:
         if self.__apiclients is None:
             servers = self.__localapi.get_all_servers()
-            self.__apiclients = [
-                APIClient(server.uri, server.token, server.allow_stats, server.allow_scores) for server in servers
-            ]
+            if self.__mirror is not None:
+                # Serve remote data out of the locally replicated copy.
+                mirror = self.__mirror
+                self.__apiclients = [MirrorClient(server, mirror) for server in servers]
+            else:
+                self.__apiclients = [
+                    APIClient(server.uri, server.token, server.allow_stats, server.allow_scores) for server in servers
+                ]
 
         return self.__apiclients
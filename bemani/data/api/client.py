@@ -1,6 +1,9 @@
+import hashlib
 import json
 import requests
-from typing import Tuple, Dict, List, Any, Optional
+import threading
+import time
+from typing import Callable, Tuple, Dict, List, Any, Optional, TypeVar
 from typing_extensions import Final
 
 from bemani.common import (
@@ -38,13 +41,116 @@ class RemoteServerErrorAPIException(APIException):
     pass
 
 
+class UnavailableAPIException(APIException):
+    pass
+
+
+T = TypeVar("T")
+
+
+class Peer:
+    """
+    State shared by every APIClient talking to the same remote server within a process.
+    This holds a pooled HTTP session so that we reuse connections, a circuit breaker so
+    that a server which is down is skipped for a cooldown period instead of costing every
+    request a full timeout, and latency/error counters for the admin panel.
+    """
+
+    # Number of consecutive failures before we stop talking to a server.
+    FAILURE_THRESHOLD: Final[int] = 3
+
+    # How long, in seconds, to skip a server after it trips the breaker. Once this elapses
+    # a single request is let through, and the breaker closes again if it succeeds.
+    COOLDOWN: Final[int] = 60
+
+    def __init__(self) -> None:
+        self.session = requests.Session()
+        self.__lock = threading.Lock()
+        self.__failures = 0
+        self.__open_until = 0.0
+        self.__stats: Dict[str, Any] = {
+            "requests": 0,
+            "errors": 0,
+            "skipped": 0,
+            "total_latency": 0.0,
+            "last_latency": 0.0,
+            "last_error": None,
+        }
+
+    def allow(self) -> bool:
+        """
+        Returns whether a request should be attempted against this server right now.
+        """
+        with self.__lock:
+            if self.__failures < self.FAILURE_THRESHOLD:
+                return True
+            if time.monotonic() >= self.__open_until:
+                # Half-open, let this request probe the server and hold everyone else off
+                # until it either succeeds or the cooldown passes again.
+                self.__open_until = time.monotonic() + self.COOLDOWN
+                return True
+            self.__stats["skipped"] += 1
+            return False
+
+    def record(self, latency: float, error: Optional[str]) -> None:
+        with self.__lock:
+            self.__stats["requests"] += 1
+            self.__stats["total_latency"] += latency
+            self.__stats["last_latency"] = latency
+            if error is None:
+                self.__failures = 0
+                return
+
+            self.__stats["errors"] += 1
+            self.__stats["last_error"] = error
+            self.__failures += 1
+            if self.__failures >= self.FAILURE_THRESHOLD:
+                self.__open_until = time.monotonic() + self.COOLDOWN
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        """
+        A snapshot of request, error and skipped counts, latency in seconds, and breaker state.
+        """
+        with self.__lock:
+            stats = dict(self.__stats)
+            stats["open"] = self.__failures >= self.FAILURE_THRESHOLD and time.monotonic() < self.__open_until
+        stats["average_latency"] = (stats["total_latency"] / stats["requests"]) if stats["requests"] else 0.0
+        return stats
+
+
+class _Flight:
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: Optional[Exception] = None
+
+
 class APIClient:
     """
     A client that fully speaks BEMAPI and can pull information from a remote server.
+
+    Profile, record, statistics and catalog lookups are cached with stale-while-revalidate
+    and single-flight semantics. These are what game requests use by default. When the
+    remote data mirror is enabled, MirrorClient answers everything but the catalog out of
+    the DB instead, and the replicator uses get_objects, which is deliberately uncached
+    since it needs fresh data. Every request shares the per-server pooled session and
+    circuit breaker either way.
     """
 
     API_VERSION: Final[str] = "v1"
 
+    # How many seconds to wait for a remote server to respond.
+    TIMEOUT: Final[int] = 10
+
+    # How many multiples of a cached value's lifetime we are willing to keep serving it
+    # for while a refresh is in progress or the remote server is unreachable.
+    STALE_MULTIPLIER: Final[int] = 10
+
+    __peers: Dict[str, Peer] = {}
+    __inflight: Dict[str, _Flight] = {}
+    __lock = threading.Lock()
+
     def __init__(self, base_uri: str, token: str, allow_stats: bool, allow_scores: bool) -> None:
         self.base_uri = base_uri
         self.token = token
@@ -69,6 +175,86 @@ class APIClient:
         repr_val = repr_val.replace("\n", "_")
         return repr_val
 
+    @classmethod
+    def peer(cls, base_uri: str) -> Peer:
+        with cls.__lock:
+            if base_uri not in cls.__peers:
+                cls.__peers[base_uri] = Peer()
+            return cls.__peers[base_uri]
+
+    @classmethod
+    def peer_stats(cls) -> Dict[str, Dict[str, Any]]:
+        """
+        Per-server latency, error and circuit breaker stats for this process, keyed by base URI.
+        """
+        with cls.__lock:
+            peers = dict(cls.__peers)
+        return {uri: peer.stats for uri, peer in peers.items()}
+
+    def __cache_key(self, name: str, *args: Any) -> str:
+        # Hash the key, since IDs lists can blow past memcached's key length limit.
+        return "apiclient." + hashlib.sha1(repr((self, name, args)).encode("utf-8")).hexdigest()
+
+    def __fetch(self, key: str, lifetime: int, fetch: Callable[[], T]) -> T:
+        value = fetch()
+        cache.set(
+            key,
+            {"expires": Time.now() + lifetime, "value": value},
+            timeout=lifetime * self.STALE_MULTIPLIER,
+        )
+        return value
+
+    def __cached(self, name: str, lifetime: int, fetch: Callable[[], T], *args: Any) -> T:
+        """
+        Look up a cached response, refreshing it if needed. Fresh responses are served
+        straight from the cache. Once a response expires, exactly one caller is elected to
+        refresh it while everyone else keeps getting the stale copy, and if the refresh
+        fails the stale copy keeps being served. When there is nothing cached at all,
+        concurrent callers within a process share a single remote request.
+        """
+        key = self.__cache_key(name, *args)
+        entry = cache.get(key)
+        if entry is not None:
+            if entry["expires"] > Time.now():
+                return entry["value"]
+            if not cache.add(f"{key}.refresh", True, timeout=self.TIMEOUT * 2):
+                # Somebody else is already refreshing this.
+                return entry["value"]
+            try:
+                return self.__fetch(key, lifetime, fetch)
+            except Exception:
+                # This includes malformed responses, which are no better than no response.
+                return entry["value"]
+            finally:
+                cache.delete(f"{key}.refresh")
+
+        with APIClient.__lock:
+            flight = APIClient.__inflight.get(key)
+            leader = flight is None
+            if flight is None:
+                flight = _Flight()
+                APIClient.__inflight[key] = flight
+
+        if not leader:
+            if not flight.done.wait(self.TIMEOUT * 2):
+                raise UnavailableAPIException("Timed out waiting for remote server!")
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = self.__fetch(key, lifetime, fetch)
+            return flight.value
+        except Exception as e:
+            # Hand whatever went wrong to everybody waiting on us, not just API errors, so
+            # that nobody mistakes a failed request for an empty response.
+            flight.error = e
+            raise
+        finally:
+            with APIClient.__lock:
+                del APIClient.__inflight[key]
+            flight.done.set()
+
     def _content_type_valid(self, content_type: str) -> bool:
         if ";" in content_type:
             left, right = content_type.split(";", 1)
@@ -97,21 +283,37 @@ class APIClient:
         }
         data = json.dumps(request_args).encode("utf8")
 
+        peer = APIClient.peer(self.base_uri)
+        if not peer.allow():
+            raise UnavailableAPIException("Remote server is failing, skipping it for now!")
+
+        start = time.monotonic()
+        try:
+            resp = self.__parse_response(peer.session, uri, headers, data)
+        except (UnavailableAPIException, RemoteServerErrorAPIException) as e:
+            peer.record(time.monotonic() - start, str(e))
+            raise
+        peer.record(time.monotonic() - start, None)
+        return resp
+
+    def __parse_response(
+        self, session: requests.Session, uri: str, headers: Dict[str, str], data: bytes
+    ) -> Dict[str, Any]:
         try:
-            r = requests.request(
+            r = session.request(
                 "GET",
                 uri,
                 headers=headers,
                 data=data,
                 allow_redirects=False,
-                timeout=10,
+                timeout=self.TIMEOUT,
             )
         except Exception:
-            raise APIException("Failed to query remote server!")
+            raise UnavailableAPIException("Failed to query remote server!")
 
         # Verify that content type is in the form of "application/json; charset=utf-8".
         if not self._content_type_valid(r.headers["content-type"]):
-            raise APIException(f'API returned invalid content type \'{r.headers["content-type"]}\'!')
+            raise UnavailableAPIException(f'API returned invalid content type \'{r.headers["content-type"]}\'!')
 
         jsondata = r.json()
 
@@ -229,6 +431,33 @@ class APIClient:
 
         return (servergame, serverversion)
 
+    def get_objects(
+        self,
+        game: GameConstants,
+        version: int,
+        idtype: APIConstants,
+        ids: List[str],
+        objects: List[str],
+        since: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """
+        Fetch one or more objects from the remote server in a single request. Unlike the
+        convenience getters below, this raises an APIException on failure so that callers
+        which replicate data can distinguish an empty response from a failed one.
+        """
+        servergame, serverversion = self.__translate(game, version)
+        data: Dict[str, Any] = {
+            "ids": ids,
+            "type": idtype.value,
+            "objects": objects,
+        }
+        if since is not None:
+            data["since"] = since
+        return self.__exchange_data(
+            f"{self.API_VERSION}/{servergame}/{serverversion}",
+            data,
+        )
+
     # Not caching this, as it is only hit when looking at the admin panel, and we want this to
     # always be up-to-date.
     def get_server_info(self) -> ValidatedDict:
@@ -241,9 +470,8 @@ class APIClient:
             }
         )
 
-    # Not caching this, as we would have to go back and ensure that any code which got outdated
-    # profiles from a cache didn't end up with KeyError exceptions when trying to link profiles to
-    # records. This is the coward's way out, but whatever.
+    # Cached for the same lifetime as records, so that profiles and the records which reference
+    # them go stale together rather than leaving records that link to profiles we don't have.
     def get_profiles(
         self, game: GameConstants, version: int, idtype: APIConstants, ids: List[str]
     ) -> List[Dict[str, Any]]:
@@ -251,7 +479,7 @@ class APIClient:
         if not self.allow_scores:
             return []
 
-        try:
+        def fetch() -> List[Dict[str, Any]]:
             servergame, serverversion = self.__translate(game, version)
             resp = self.__exchange_data(
                 f"{self.API_VERSION}/{servergame}/{serverversion}",
@@ -262,11 +490,13 @@ class APIClient:
                 },
             )
             return resp["profile"]
+
+        try:
+            return self.__cached("profile", Time.SECONDS_IN_MINUTE * 1, fetch, game, version, idtype, ids)
         except APIException:
             # Couldn't talk to server, assume empty profiles
             return []
 
-    @cache.memoize(Time.SECONDS_IN_MINUTE * 1)
     def get_records(
         self,
         game: GameConstants,
@@ -280,7 +510,7 @@ class APIClient:
         if not self.allow_scores:
             return []
 
-        try:
+        def fetch() -> List[Dict[str, Any]]:
             servergame, serverversion = self.__translate(game, version)
             data: Dict[str, Any] = {
                 "ids": ids,
@@ -296,11 +526,13 @@ class APIClient:
                 data,
             )
             return resp["records"]
+
+        try:
+            return self.__cached("records", Time.SECONDS_IN_MINUTE * 1, fetch, game, version, idtype, ids, since, until)
         except APIException:
             # Couldn't talk to server, assume empty records
             return []
 
-    @cache.memoize(Time.SECONDS_IN_MINUTE * 5)
     def get_statistics(
         self, game: GameConstants, version: int, idtype: APIConstants, ids: List[str]
     ) -> List[Dict[str, Any]]:
@@ -308,7 +540,7 @@ class APIClient:
         if not self.allow_stats:
             return []
 
-        try:
+        def fetch() -> List[Dict[str, Any]]:
             servergame, serverversion = self.__translate(game, version)
             resp = self.__exchange_data(
                 f"{self.API_VERSION}/{servergame}/{serverversion}",
@@ -319,15 +551,17 @@ class APIClient:
                 },
             )
             return resp["statistics"]
+
+        try:
+            return self.__cached("statistics", Time.SECONDS_IN_MINUTE * 5, fetch, game, version, idtype, ids)
         except APIException:
             # Couldn't talk to server, assume empty statistics
             return []
 
-    @cache.memoize(Time.SECONDS_IN_HOUR * 1)
     def get_catalog(self, game: GameConstants, version: int) -> Dict[str, List[Dict[str, Any]]]:
         # No point disallowing this, since its only ever used for bootstrapping.
 
-        try:
+        def fetch() -> Dict[str, List[Dict[str, Any]]]:
             servergame, serverversion = self.__translate(game, version)
             resp = self.__exchange_data(
                 f"{self.API_VERSION}/{servergame}/{serverversion}",
@@ -338,6 +572,9 @@ class APIClient:
                 },
             )
             return resp["catalog"]
+
+        try:
+            return self.__cached("catalog", Time.SECONDS_IN_HOUR * 1, fetch, game, version)
         except APIException:
             # Couldn't talk to server, assume empty catalog
             return {}
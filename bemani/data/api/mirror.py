@@ -0,0 +1,215 @@
+from typing import Any, Dict, List, Optional, Set, Tuple
+from typing_extensions import Final
+
+from bemani.common import APIConstants, GameConstants, Time
+from bemani.data.api.client import APIClient, APIException, UnsupportedRequestAPIException
+from bemani.data.interfaces import APIProviderInterface
+from bemani.data.mysql.mirror import MirrorData
+from bemani.data.types import Server
+
+
+class MirrorClient(APIClient):
+    """
+    A drop-in replacement for APIClient which answers profile, record and statistics
+    requests out of the local mirror tables instead of talking to the remote server.
+    The mirror is kept up to date by the Replicator below, which is run from the
+    scheduler, so that no game request ever blocks on a remote HTTP round-trip. Catalog
+    and server info requests are rare and still go to the remote server directly.
+    """
+
+    def __init__(self, server: Server, mirror: MirrorData) -> None:
+        super().__init__(server.uri, server.token, server.allow_stats, server.allow_scores)
+        self.serverid = server.id
+        self.mirror = mirror
+
+    def get_profiles(
+        self, game: GameConstants, version: int, idtype: APIConstants, ids: List[str]
+    ) -> List[Dict[str, Any]]:
+        # Allow remote servers to be disabled
+        if not self.allow_scores:
+            return []
+
+        if idtype == APIConstants.ID_TYPE_SERVER:
+            return [profile for _, profile in self.mirror.get_profiles(self.serverid, game, version)]
+        if idtype == APIConstants.ID_TYPE_CARD:
+            # Like the remote server, fall back to a profile from another version when the
+            # player doesn't have one on this version, and flag it as a partial match.
+            owners = self.mirror.get_owners(self.serverid, ids)
+            profiles: Dict[str, Dict[str, Any]] = {}
+            for profileversion, profile in self.mirror.get_profiles(self.serverid, game, None, owners):
+                owner = self.mirror.owner(profile.get("cards", []))
+                if owner is None:
+                    continue
+                if profileversion == version:
+                    profiles[owner] = profile
+                elif owner not in profiles:
+                    profiles[owner] = {**profile, "match": "partial"}
+            return list(profiles.values())
+
+        # Remote servers don't support any other lookup type.
+        return []
+
+    def get_records(
+        self,
+        game: GameConstants,
+        version: int,
+        idtype: APIConstants,
+        ids: List[str],
+        since: Optional[int] = None,
+        until: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        # Allow remote servers to be disabled
+        if not self.allow_scores:
+            return []
+
+        if idtype == APIConstants.ID_TYPE_SERVER:
+            return self.mirror.get_charts(self.serverid, game, version, MirrorData.CHART_TYPE_RECORDS)
+        if idtype == APIConstants.ID_TYPE_SONG:
+            return self.mirror.get_scores(
+                self.serverid,
+                game,
+                version,
+                songid=int(ids[0]),
+                songchart=int(ids[1]) if len(ids) > 1 else None,
+                since=since,
+                until=until,
+            )
+        if idtype == APIConstants.ID_TYPE_INSTANCE:
+            return self.mirror.get_scores(
+                self.serverid,
+                game,
+                version,
+                owners=self.mirror.get_owners(self.serverid, [ids[2]]),
+                songid=int(ids[0]),
+                songchart=int(ids[1]),
+            )
+
+        # Every other lookup is by card.
+        return self.mirror.get_scores(
+            self.serverid,
+            game,
+            version,
+            owners=self.mirror.get_owners(self.serverid, ids),
+            since=since,
+            until=until,
+        )
+
+    def get_statistics(
+        self, game: GameConstants, version: int, idtype: APIConstants, ids: List[str]
+    ) -> List[Dict[str, Any]]:
+        # Allow remote servers to be disabled
+        if not self.allow_stats:
+            return []
+
+        if idtype == APIConstants.ID_TYPE_SERVER:
+            return self.mirror.get_charts(self.serverid, game, version, MirrorData.CHART_TYPE_STATISTICS)
+        if idtype == APIConstants.ID_TYPE_SONG:
+            return self.mirror.get_charts(
+                self.serverid,
+                game,
+                version,
+                MirrorData.CHART_TYPE_STATISTICS,
+                songid=int(ids[0]),
+                songchart=int(ids[1]) if len(ids) > 1 else None,
+            )
+
+        # We only mirror server-wide statistics.
+        return []
+
+
+class Replicator:
+    """
+    Pulls profiles, records and statistics from every authorized remote server and stores
+    them in the local mirror for MirrorClient to serve. After the first sync of a server,
+    per-player scores are only requested for players whose profile changed since the last
+    sync, and only for scores earned since then.
+    """
+
+    # Number of card IDs to request scores for in a single remote request.
+    CARD_BATCH_SIZE: Final[int] = 100
+
+    # Slop applied to incremental fetches so that clock skew between us and the remote
+    # server doesn't cause us to miss scores earned right around the last sync.
+    SYNC_OVERLAP: Final[int] = Time.SECONDS_IN_MINUTE * 5
+
+    def __init__(self, api: APIProviderInterface, mirror: MirrorData) -> None:
+        self.api = api
+        self.mirror = mirror
+
+    def replicate(self, game: GameConstants, version: int) -> List[Tuple[int, str]]:
+        """
+        Replicate a single game/version from every authorized server.
+
+        Returns:
+            A list of (server ID, error) tuples for servers that could not be replicated.
+        """
+        failures: List[Tuple[int, str]] = []
+        for server in self.api.get_all_servers():
+            if not server.allow_scores and not server.allow_stats:
+                continue
+            try:
+                self.__replicate_server(server, game, version)
+            except UnsupportedRequestAPIException:
+                # Either we or the remote server don't know about this game/version.
+                continue
+            except APIException as e:
+                failures.append((server.id, str(e)))
+        return failures
+
+    def __replicate_server(self, server: Server, game: GameConstants, version: int) -> None:
+        client = APIClient(server.uri, server.token, server.allow_stats, server.allow_scores)
+        now = Time.now()
+        last = self.mirror.get_last_sync(server.id, game, version)
+
+        objects: List[str] = []
+        if server.allow_scores:
+            objects.extend(["profile", "records"])
+        if server.allow_stats:
+            objects.append("statistics")
+
+        # Server-wide records and statistics can't be fetched incrementally, since a "since"
+        # would hide older records, so these are always replaced wholesale.
+        resp = client.get_objects(game, version, APIConstants.ID_TYPE_SERVER, [], objects)
+
+        if server.allow_scores:
+            profiles: List[Dict[str, Any]] = resp["profile"]
+            previous: Dict[Optional[str], Dict[str, Any]] = {}
+            if last is not None:
+                previous = {
+                    self.mirror.owner(profile.get("cards", [])): profile
+                    for _, profile in self.mirror.get_profiles(server.id, game, version)
+                }
+            self.mirror.put_cards(server.id, profiles)
+            self.mirror.replace_profiles(server.id, game, version, profiles, now)
+            self.mirror.replace_charts(server.id, game, version, MirrorData.CHART_TYPE_RECORDS, resp["records"], now)
+
+            # Games save the profile on every play, so a player whose profile is unchanged
+            # since the last sync has no new scores to fetch. Local players who also play
+            # on this server have a profile there too, so they're covered as well.
+            cards: Set[str] = set()
+            for profile in profiles:
+                owner = self.mirror.owner(profile.get("cards", []))
+                if owner is None or previous.get(owner) == profile:
+                    continue
+                cards.update(card.upper() for card in profile.get("cards", []))
+            since = (last - self.SYNC_OVERLAP) if last is not None else None
+
+            batch = sorted(cards)
+            for start in range(0, len(batch), self.CARD_BATCH_SIZE):
+                scores = client.get_objects(
+                    game,
+                    version,
+                    APIConstants.ID_TYPE_CARD,
+                    batch[start : (start + self.CARD_BATCH_SIZE)],
+                    ["records"],
+                    since=since,
+                )["records"]
+                self.mirror.put_cards(server.id, scores)
+                self.mirror.put_scores(server.id, game, version, scores)
+
+        if server.allow_stats:
+            self.mirror.replace_charts(
+                server.id, game, version, MirrorData.CHART_TYPE_STATISTICS, resp["statistics"], now
+            )
+
+        self.mirror.put_last_sync(server.id, game, version, now)
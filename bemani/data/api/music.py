@@ -9,6 +9,7 @@ from bemani.common import (
 )
 from bemani.data.interfaces import APIProviderInterface
 from bemani.data.api.base import BaseGlobalData
+from bemani.data.mysql.mirror import MirrorData
 from bemani.data.mysql.user import UserData
 from bemani.data.mysql.music import MusicData
 from bemani.data.remoteuser import RemoteUser
@@ -16,8 +17,10 @@ from bemani.data.types import UserID, Score, Song
 
 
 class GlobalMusicData(BaseGlobalData):
-    def __init__(self, api: APIProviderInterface, user: UserData, music: MusicData) -> None:
-        super().__init__(api)
+    def __init__(
+        self, api: APIProviderInterface, user: UserData, music: MusicData, mirror: Optional[MirrorData] = None
+    ) -> None:
+        super().__init__(api, mirror)
         self.user = user
         self.music = music
 
@@ -653,15 +656,20 @@ class GlobalMusicData(BaseGlobalData):
 
         return finalscores
 
+    def __get_card_to_id(self, remotescores: List[Dict[str, Any]]) -> Dict[str, UserID]:
+        # Only look up the cards that actually appear in the remote results, so that this
+        # scales with the size of the response and not with the number of local users.
+        cardids = {card.upper() for remotescore in remotescores for card in remotescore.get("cards", [])}
+        return self.user.from_cardids(list(cardids))
+
     def __merge_global_scores(
         self,
         game: GameConstants,
         version: int,
-        localcards: List[Tuple[str, UserID]],
         localscores: List[Tuple[UserID, Score]],
         remotescores: List[Dict[str, Any]],
     ) -> List[Tuple[UserID, Score]]:
-        card_to_id = {cardid: userid for (cardid, userid) in localcards}
+        card_to_id = self.__get_card_to_id(remotescores)
         allscores: Dict[UserID, Dict[int, Dict[int, Score]]] = {}
 
         def add_score(userid: UserID, score: Score) -> None:
@@ -732,9 +740,8 @@ class GlobalMusicData(BaseGlobalData):
             songkey = [songid, songchart]
 
         # Now, fetch all the scores remotely and locally
-        localcards, localscores, remotescores = Parallel.execute(
+        localscores, remotescores = Parallel.execute(
             [
-                self.user.get_all_cards,
                 lambda: self.music.get_all_scores(game, version, userid, songid, songchart, since, until),
                 lambda: Parallel.flatten(
                     Parallel.call(
@@ -750,17 +757,96 @@ class GlobalMusicData(BaseGlobalData):
             ]
         )
 
-        return self.__merge_global_scores(game, version, localcards, localscores, remotescores)
+        return self.__merge_global_scores(game, version, localscores, remotescores)
+
+    def __get_global_leaderboard(
+        self,
+        game: GameConstants,
+        version: Optional[int],
+        songid: int,
+        songchart: int,
+        userlist: Optional[List[UserID]],
+        location: Optional[int],
+        include: Optional[UserID],
+    ) -> List[Tuple[UserID, Score]]:
+        # Remote scores can't be ranked in SQL, so merge them in and rank the whole chart.
+        scores = self.get_all_scores(game, version, songid=songid, songchart=songchart)
+        if userlist is not None or location is not None:
+            users = set(userlist or [])
+            scores = [
+                score for score in scores if score[0] in users or score[1].location == location or score[0] == include
+            ]
+        return sorted(scores, key=lambda s: (s[1].points, s[1].timestamp), reverse=True)
+
+    def get_leaderboard(
+        self,
+        game: GameConstants,
+        version: Optional[int],
+        songid: int,
+        songchart: int,
+        count: Optional[int] = None,
+        offset: int = 0,
+        userlist: Optional[List[UserID]] = None,
+        location: Optional[int] = None,
+    ) -> List[Tuple[UserID, Score]]:
+        if len(self.clients) == 0:
+            return self.music.get_leaderboard(game, version, songid, songchart, count, offset, userlist, location)
+
+        scores = self.__get_global_leaderboard(game, version, songid, songchart, userlist, location, None)
+        if count is None:
+            return scores[offset:]
+        return scores[offset : (offset + count)]
+
+    def get_score_rank(
+        self,
+        game: GameConstants,
+        version: Optional[int],
+        userid: UserID,
+        songid: int,
+        songchart: int,
+        userlist: Optional[List[UserID]] = None,
+        location: Optional[int] = None,
+    ) -> Optional[int]:
+        if len(self.clients) == 0:
+            return self.music.get_score_rank(game, version, userid, songid, songchart, userlist, location)
+
+        scores = self.__get_global_leaderboard(game, version, songid, songchart, userlist, location, userid)
+        for i, (uid, _) in enumerate(scores):
+            if uid == userid:
+                return i + 1
+        return None
+
+    def get_score_neighbors(
+        self,
+        game: GameConstants,
+        version: Optional[int],
+        userid: UserID,
+        songid: int,
+        songchart: int,
+        distance: int,
+        userlist: Optional[List[UserID]] = None,
+        location: Optional[int] = None,
+    ) -> Optional[Tuple[int, List[Tuple[UserID, Score]]]]:
+        if len(self.clients) == 0:
+            return self.music.get_score_neighbors(
+                game, version, userid, songid, songchart, distance, userlist, location
+            )
+
+        scores = self.__get_global_leaderboard(game, version, songid, songchart, userlist, location, userid)
+        for i, (uid, _) in enumerate(scores):
+            if uid == userid:
+                start = max(i - distance, 0)
+                return (start + 1, scores[start : (i + distance + 1)])
+        return None
 
     def __merge_global_records(
         self,
         game: GameConstants,
         version: int,
-        localcards: List[Tuple[str, UserID]],
         localscores: List[Tuple[UserID, Score]],
         remotescores: List[Dict[str, Any]],
     ) -> List[Tuple[UserID, Score]]:
-        card_to_id = {cardid: userid for (cardid, userid) in localcards}
+        card_to_id = self.__get_card_to_id(remotescores)
         allscores: Dict[int, Dict[int, Tuple[UserID, Score]]] = {}
 
         def add_score(userid: UserID, score: Score) -> None:
@@ -825,9 +911,8 @@ class GlobalMusicData(BaseGlobalData):
             return self.music.get_all_records(game, version, userlist, locationlist)
 
         # Now, fetch all records remotely and locally
-        localcards, localscores, remotescores = Parallel.execute(
+        localscores, remotescores = Parallel.execute(
             [
-                self.user.get_all_cards,
                 lambda: self.music.get_all_records(game, version, userlist, locationlist),
                 lambda: Parallel.flatten(
                     Parallel.call(
@@ -841,7 +926,7 @@ class GlobalMusicData(BaseGlobalData):
             ]
         )
 
-        return self.__merge_global_records(game, version, localcards, localscores, remotescores)
+        return self.__merge_global_records(game, version, localscores, remotescores)
 
     def get_clear_rates(
         self,
@@ -3,14 +3,15 @@ from typing import List, Tuple, Optional
 from bemani.common import APIConstants, GameConstants, Profile, Parallel
 from bemani.data.interfaces import APIProviderInterface
 from bemani.data.api.base import BaseGlobalData
+from bemani.data.mysql.mirror import MirrorData
 from bemani.data.mysql.user import UserData
 from bemani.data.remoteuser import RemoteUser
 from bemani.data.types import UserID
 
 
 class GlobalUserData(BaseGlobalData):
-    def __init__(self, api: APIProviderInterface, user: UserData) -> None:
-        super().__init__(api)
+    def __init__(self, api: APIProviderInterface, user: UserData, mirror: Optional[MirrorData] = None) -> None:
+        super().__init__(api, mirror)
         self.user = user
 
     def __format_ddr_profile(self, updates: Profile, profile: Profile) -> None:
@@ -223,9 +224,8 @@ class GlobalUserData(BaseGlobalData):
     def get_all_profiles(self, game: GameConstants, version: int) -> List[Tuple[UserID, Profile]]:
         # Fetch local and remote profiles, and then merge by adding remote profiles to local
         # profiles when we don't have a profile for that user ID yet.
-        local_cards, local_profiles, remote_profiles = Parallel.execute(
+        local_profiles, remote_profiles = Parallel.execute(
             [
-                self.user.get_all_cards,
                 lambda: self.user.get_all_profiles(game, version),
                 lambda: Parallel.flatten(
                     Parallel.call(
@@ -239,7 +239,9 @@ class GlobalUserData(BaseGlobalData):
             ]
         )
 
-        card_to_id = {cardid: userid for (cardid, userid) in local_cards}
+        card_to_id = self.user.from_cardids(
+            list({card.upper() for profile in remote_profiles for card in profile.get("cards", [])})
+        )
         id_to_profile = {userid: profile for (userid, profile) in local_profiles}
 
         for profile in remote_profiles:
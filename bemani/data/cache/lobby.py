@@ -0,0 +1,159 @@
+import copy
+from typing import Optional, Dict, List, Tuple, Any
+from typing_extensions import Final
+
+from bemani.common import GameConstants, ValidatedDict, Time, cache
+from bemani.data.mysql.lobby import LobbyData
+from bemani.data.types import UserID
+
+
+class CachedLobbyData(LobbyData):
+    """
+    A drop-in replacement for LobbyData which keeps lobbies and play sessions in the
+    shared cache instead of MySQL. Lobby and play session info is ephemeral and rewritten
+    on every matching poll, so there is no reason to pay for a durable write. Depending on
+    how the cache is configured this is either an in-process store or a shared memcached
+    instance, so multi-process deployments should configure memcached.
+
+    Every entry is stored under its own key with a TTL of one hour, matching the window
+    that the MySQL implementation filters on. A per-game/version member list lets us find
+    all entries for matching. Updates to that list are not atomic, but a lost update only
+    hides a lobby until its owner's next heartbeat re-adds it.
+    """
+
+    ENTRY_LIFETIME: Final[int] = Time.SECONDS_IN_HOUR
+
+    def __entry_key(self, kind: str, game: GameConstants, version: int, userid: UserID) -> str:
+        return f"lobby.{kind}.{game.value}.{version}.{userid}"
+
+    def __members_key(self, kind: str, game: GameConstants, version: int) -> str:
+        return f"lobby.{kind}.{game.value}.{version}.members"
+
+    def __id_key(self, kind: str, entryid: int) -> str:
+        return f"lobby.{kind}.id.{entryid}"
+
+    def __next_id(self, kind: str) -> int:
+        key = f"lobby.{kind}.counter"
+        newid = cache.cache.inc(key)
+        if not newid:
+            # Counter doesn't exist yet (or was evicted), so seed it and try again.
+            cache.add(key, 0, timeout=0)
+            newid = cache.cache.inc(key)
+        return int(newid)
+
+    def __format_entry(self, entry: Dict[str, Any]) -> ValidatedDict:
+        data = ValidatedDict(copy.deepcopy(entry["data"]))
+        data["id"] = entry["id"]
+        data["time"] = entry["time"]
+        return data
+
+    def __get_entry(
+        self, kind: str, game: GameConstants, version: int, userid: UserID, max_age: int
+    ) -> Optional[Dict[str, Any]]:
+        entry = cache.get(self.__entry_key(kind, game, version, userid))
+        if entry is None or entry["time"] <= Time.now() - max_age:
+            return None
+        return entry
+
+    def __get_all_entries(
+        self, kind: str, game: GameConstants, version: int, max_age: int
+    ) -> List[Tuple[UserID, Dict[str, Any]]]:
+        members: List[UserID] = cache.get(self.__members_key(kind, game, version)) or []
+        if not members:
+            return []
+
+        entries = cache.get_many(*[self.__entry_key(kind, game, version, userid) for userid in members])
+        live = [userid for userid, entry in zip(members, entries) if entry is not None]
+        if len(live) != len(members):
+            # Some entries expired out of the cache, so stop tracking them.
+            cache.set(self.__members_key(kind, game, version), live, timeout=self.ENTRY_LIFETIME)
+
+        oldest = Time.now() - max_age
+        return [
+            (UserID(userid), entry)
+            for userid, entry in zip(members, entries)
+            if entry is not None and entry["time"] > oldest
+        ]
+
+    def __put_entry(self, kind: str, game: GameConstants, version: int, userid: UserID, data: Dict[str, Any]) -> None:
+        data = copy.deepcopy(data)
+        if "id" in data:
+            del data["id"]
+        if "time" in data:
+            del data["time"]
+
+        # Like the ON DUPLICATE KEY UPDATE in MySQL, an existing entry keeps its ID.
+        existing = cache.get(self.__entry_key(kind, game, version, userid))
+        entryid = existing["id"] if existing is not None else self.__next_id(kind)
+
+        cache.set(
+            self.__entry_key(kind, game, version, userid),
+            {"id": entryid, "time": Time.now(), "data": data},
+            timeout=self.ENTRY_LIFETIME,
+        )
+        cache.set(
+            self.__id_key(kind, entryid),
+            (game.value, version, userid),
+            timeout=self.ENTRY_LIFETIME,
+        )
+
+        members: List[UserID] = cache.get(self.__members_key(kind, game, version)) or []
+        if userid not in members:
+            members.append(userid)
+        # Always refresh the member list so it lives at least as long as its newest entry.
+        cache.set(self.__members_key(kind, game, version), members, timeout=self.ENTRY_LIFETIME)
+
+    def __destroy_entry(self, kind: str, game: GameConstants, version: int, userid: UserID) -> None:
+        existing = cache.get(self.__entry_key(kind, game, version, userid))
+        if existing is not None:
+            cache.delete(self.__id_key(kind, existing["id"]))
+        cache.delete(self.__entry_key(kind, game, version, userid))
+
+        members: List[UserID] = cache.get(self.__members_key(kind, game, version)) or []
+        if userid in members:
+            members.remove(userid)
+            cache.set(self.__members_key(kind, game, version), members, timeout=self.ENTRY_LIFETIME)
+
+    def get_play_session_info(self, game: GameConstants, version: int, userid: UserID) -> Optional[ValidatedDict]:
+        entry = self.__get_entry("playsession", game, version, userid, Time.SECONDS_IN_HOUR)
+        if entry is None:
+            return None
+        return self.__format_entry(entry)
+
+    def get_all_play_session_infos(self, game: GameConstants, version: int) -> List[Tuple[UserID, ValidatedDict]]:
+        return [
+            (userid, self.__format_entry(entry))
+            for userid, entry in self.__get_all_entries("playsession", game, version, Time.SECONDS_IN_HOUR)
+        ]
+
+    def put_play_session_info(self, game: GameConstants, version: int, userid: UserID, data: Dict[str, Any]) -> None:
+        self.__put_entry("playsession", game, version, userid, data)
+
+    def destroy_play_session_info(self, game: GameConstants, version: int, userid: UserID) -> None:
+        # No need to prune orphaned sessions here, the cache expires them for us.
+        self.__destroy_entry("playsession", game, version, userid)
+
+    def get_lobby(self, game: GameConstants, version: int, userid: UserID) -> Optional[ValidatedDict]:
+        entry = self.__get_entry("lobby", game, version, userid, Time.SECONDS_IN_HOUR)
+        if entry is None:
+            return None
+        return self.__format_entry(entry)
+
+    def get_all_lobbies(
+        self, game: GameConstants, version: int, max_age: int = Time.SECONDS_IN_HOUR
+    ) -> List[Tuple[UserID, ValidatedDict]]:
+        return [
+            (userid, self.__format_entry(entry))
+            for userid, entry in self.__get_all_entries("lobby", game, version, max_age)
+        ]
+
+    def put_lobby(self, game: GameConstants, version: int, userid: UserID, data: Dict[str, Any]) -> None:
+        self.__put_entry("lobby", game, version, userid, data)
+
+    def destroy_lobby(self, lobbyid: int) -> None:
+        owner = cache.get(self.__id_key("lobby", lobbyid))
+        if owner is None:
+            # Already expired or destroyed.
+            return
+        gamevalue, version, userid = owner
+        self.__destroy_entry("lobby", GameConstants(gamevalue), version, userid)
@@ -0,0 +1,196 @@
+import copy
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple, Union
+from typing_extensions import Final
+
+from sqlalchemy.orm import scoped_session
+
+from bemani.common import GameConstants, Profile, Time, cache
+from bemani.data.config import Config
+from bemani.data.instrumentation import Instrumentation
+from bemani.data.mysql.user import UserData
+from bemani.data.remoteuser import RemoteUser
+from bemani.data.types import UserID
+
+# A cached profile, stored as refid, extid, revision and data.
+CacheEntry = Tuple[str, int, int, Dict[str, Any]]
+
+
+class LocalProfileStore:
+    """
+    A process-wide, size-bounded store for cached profiles that evicts the least recently
+    used profile once full, and forgets profiles after a short while. Entries are copied on
+    the way in, and callers must copy what they are handed before modifying it.
+
+    Other processes, such as the frontend, save profiles without touching this store, so
+    callers should check that a profile hasn't been saved since before trusting it.
+    """
+
+    def __init__(self, size: int, lifetime: int) -> None:
+        self.size = size
+        self.lifetime = lifetime
+        self.__lock = threading.Lock()
+        self.__entries: "OrderedDict[str, Tuple[int, CacheEntry]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        with self.__lock:
+            stored = self.__entries.get(key)
+            if stored is None:
+                return None
+            expiration, entry = stored
+            if expiration <= Time.now():
+                del self.__entries[key]
+                return None
+            self.__entries.move_to_end(key)
+            return entry
+
+    def set(self, key: str, entry: CacheEntry) -> None:
+        entry = copy.deepcopy(entry)
+        with self.__lock:
+            self.__entries[key] = (Time.now() + self.lifetime, entry)
+            self.__entries.move_to_end(key)
+            while len(self.__entries) > self.size:
+                self.__entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self.__lock:
+            self.__entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self.__lock:
+            self.__entries.clear()
+
+
+class SharedProfileStore:
+    """
+    A store for cached profiles backed by the shared cache, so that every process serving
+    game traffic sees the same profiles. Entries expire after a while so that profiles for
+    players who have gone home don't linger.
+    """
+
+    ENTRY_LIFETIME: Final[int] = 30 * Time.SECONDS_IN_MINUTE
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        return cache.get(key)
+
+    def set(self, key: str, entry: CacheEntry) -> None:
+        cache.set(key, entry, timeout=self.ENTRY_LIFETIME)
+
+    def delete(self, key: str) -> None:
+        cache.delete(key)
+
+
+class CachedUserData(UserData):
+    """
+    A drop-in replacement for UserData which serves single profile lookups out of a
+    read-through cache, since a single credit loads the same profile from login, lobby,
+    ranking and game end handlers. Saves write through to the cache, and anything that
+    changes which refid or extid a profile lives under invalidates it.
+
+    Bulk lookups such as get_all_profiles are always served from MySQL. Hits and misses
+    are counted through instrumentation so the cache's effectiveness can be checked.
+
+    Profiles cached locally can go stale when another process saves them, so a local hit
+    is only trusted once a cheap revision lookup shows nobody has saved the profile since.
+    """
+
+    # How long a profile is cached locally before it is loaded from MySQL again.
+    LOCAL_ENTRY_LIFETIME: Final[int] = Time.SECONDS_IN_MINUTE
+
+    # Shared across every CachedUserData in this process, like the profiles it caches.
+    local_store: Optional[LocalProfileStore] = None
+
+    def __init__(self, config: Config, conn: scoped_session) -> None:
+        super().__init__(config, conn)
+        self.__config = config
+        self.__store: Union[LocalProfileStore, SharedProfileStore]
+        if config.profile_cache.backend == "local":
+            if CachedUserData.local_store is None:
+                CachedUserData.local_store = LocalProfileStore(
+                    config.profile_cache.size,
+                    CachedUserData.LOCAL_ENTRY_LIFETIME,
+                )
+            self.__store = CachedUserData.local_store
+        else:
+            self.__store = SharedProfileStore()
+
+    def __key(self, game: GameConstants, version: int, userid: UserID) -> str:
+        return f"profile.{game.value}.{version}.{userid}"
+
+    def get_profile(self, game: GameConstants, version: int, userid: UserID) -> Optional[Profile]:
+        entry = self.__store.get(self.__key(game, version, userid))
+        if entry is not None and isinstance(self.__store, LocalProfileStore) and not self.__is_current(entry):
+            Instrumentation.count(self.__config, "profile_cache.stale")
+            self.__store.delete(self.__key(game, version, userid))
+            entry = None
+        if entry is not None:
+            Instrumentation.count(self.__config, "profile_cache.hits")
+            refid, extid, revision, data = entry
+            profile = Profile(game, version, refid, extid, copy.deepcopy(data))
+            profile.mark_stored(revision, lambda: copy.deepcopy(data))
+            return profile
+
+        Instrumentation.count(self.__config, "profile_cache.misses")
+        profile = super().get_profile(game, version, userid)
+        if profile is not None:
+            self.__cache_profile(game, version, userid, profile)
+        return profile
+
+    def __is_current(self, entry: CacheEntry) -> bool:
+        # Make sure nobody has saved this profile since it was cached, or moved it to another refid.
+        refid, _, revision, _ = entry
+        cursor = self.execute("SELECT revision FROM profile WHERE refid = :refid", {"refid": refid}, primary=True)
+        if cursor.rowcount != 1:
+            return False
+        result = cursor.mappings().fetchone()  # type: ignore
+        return bool(result["revision"] == revision)
+
+    def put_profile(self, game: GameConstants, version: int, userid: UserID, profile: Profile) -> None:
+        try:
+            super().put_profile(game, version, userid, profile)
+        except Exception:
+            # We don't know what made it to the DB, so make sure the next load goes there.
+            self.__store.delete(self.__key(game, version, userid))
+            raise
+        self.__cache_profile(game, version, userid, profile)
+
+    def __cache_profile(self, game: GameConstants, version: int, userid: UserID, profile: Profile) -> None:
+        if profile.revision is None:
+            # We don't know what revision this is, so it can't be saved incrementally later.
+            self.__store.delete(self.__key(game, version, userid))
+            return
+        self.__store.set(
+            self.__key(game, version, userid),
+            (profile.refid, profile.extid, profile.revision, dict(profile)),
+        )
+
+    def delete_profile(self, game: GameConstants, version: int, userid: UserID) -> None:
+        super().delete_profile(game, version, userid)
+        self.__store.delete(self.__key(game, version, userid))
+
+    def create_refid(self, game: GameConstants, version: int, userid: UserID) -> str:
+        refid = super().create_refid(game, version, userid)
+        self.__store.delete(self.__key(game, version, userid))
+        return refid
+
+    def add_card(self, userid: UserID, cardid: str) -> None:
+        # Adding a card that was previously used on a remote network moves that card's
+        # refids and extids over to this account, so drop anything cached for them.
+        keys = self.__remote_keys(cardid)
+        super().add_card(userid, cardid)
+        for key in keys:
+            self.__store.delete(key)
+
+    def create_account(self, cardid: str, pin: str) -> Optional[UserID]:
+        keys = self.__remote_keys(cardid)
+        userid = super().create_account(cardid, pin)
+        for key in keys:
+            self.__store.delete(key)
+        return userid
+
+    def __remote_keys(self, cardid: str) -> List[str]:
+        oldid = RemoteUser.card_to_userid(cardid)
+        if not RemoteUser.is_remote(oldid):
+            return []
+        return [self.__key(game, version, oldid) for game, version in self.get_games_played(oldid)]
@@ -40,6 +40,48 @@ class Database:
     def read_only(self) -> bool:
         return bool(self.__config.get("database", {}).get("read_only", False))
 
+    @property
+    def replica(self) -> Optional["DatabaseReplica"]:
+        if not self.__config.get("database", {}).get("replica"):
+            return None
+        return DatabaseReplica(self.__config)
+
+    @property
+    def replica_engine(self) -> Optional[Engine]:
+        engine = self.__config.get("database", {}).get("replica_engine")
+        if engine is None:
+            return None
+        if not isinstance(engine, Engine):
+            raise Exception(
+                "Config object is not instantiated properly, replica_engine property is not a SQLAlchemy Engine!"
+            )
+        return engine
+
+
+class DatabaseReplica:
+    def __init__(self, parent_config: "Config") -> None:
+        self.__config = parent_config
+
+    def __get(self, key: str, default: str) -> str:
+        database = self.__config.get("database", {})
+        return str(database.get("replica", {}).get(key, database.get(key, default)))
+
+    @property
+    def address(self) -> str:
+        return self.__get("address", "localhost")
+
+    @property
+    def database(self) -> str:
+        return self.__get("database", "bemani")
+
+    @property
+    def user(self) -> str:
+        return self.__get("user", "bemani")
+
+    @property
+    def password(self) -> str:
+        return self.__get("password", "bemani")
+
 
 class Server:
     def __init__(self, parent_config: "Config") -> None:
@@ -138,6 +180,61 @@ class PASELI:
         return bool(self.__config.get("paseli", {}).get("infinite", False))
 
 
+class Lobby:
+    def __init__(self, parent_config: "Config") -> None:
+        self.__config = parent_config
+
+    @property
+    def backend(self) -> str:
+        backend = str(self.__config.get("lobby", {}).get("backend", "mysql")).lower()
+        if backend not in {"mysql", "cache"}:
+            raise Exception(f"Config object is not instantiated properly, unknown lobby backend '{backend}'!")
+        return backend
+
+
+class ProfileCache:
+    def __init__(self, parent_config: "Config") -> None:
+        self.__config = parent_config
+
+    @property
+    def backend(self) -> str:
+        backend = str(self.__config.get("profile_cache", {}).get("backend", "none")).lower()
+        if backend not in {"none", "local", "cache"}:
+            raise Exception(f"Config object is not instantiated properly, unknown profile cache backend '{backend}'!")
+        return backend
+
+    @property
+    def size(self) -> int:
+        return int(self.__config.get("profile_cache", {}).get("size", 1024))
+
+
+class Mirror:
+    def __init__(self, parent_config: "Config") -> None:
+        self.__config = parent_config
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.__config.get("mirror", {}).get("enabled", False))
+
+
+class Instrumentation:
+    def __init__(self, parent_config: "Config") -> None:
+        self.__config = parent_config
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.__config.get("instrumentation", {}).get("enabled", False))
+
+    @property
+    def slow_query_threshold(self) -> float:
+        # Configured in milliseconds, returned in seconds.
+        return float(self.__config.get("instrumentation", {}).get("slow_query_ms", 250)) / 1000
+
+    @property
+    def dump_interval(self) -> int:
+        return int(self.__config.get("instrumentation", {}).get("dump_interval", 300))
+
+
 class WebHooks:
     def __init__(self, parent_config: "Config") -> None:
         self.discord = DiscordWebHooks(parent_config)
@@ -175,6 +272,10 @@ class Config(dict):
         self.server = Server(self)
         self.client = Client(self)
         self.paseli = PASELI(self)
+        self.lobby = Lobby(self)
+        self.profile_cache = ProfileCache(self)
+        self.mirror = Mirror(self)
+        self.instrumentation = Instrumentation(self)
         self.webhooks = WebHooks(self)
         self.assets = Assets(self)
         self.machine = Machine(self)
@@ -182,15 +283,19 @@ class Config(dict):
     def clone(self) -> "Config":
         # Somehow its not possible to clone this object if an instantiated Engine is present,
         # so we do a little shenanigans here.
-        engine = self.get("database", {}).get("engine")
-        if engine is not None:
-            self["database"]["engine"] = None
+        engines = {
+            key: self["database"][key]
+            for key in ["engine", "replica_engine"]
+            if self.get("database", {}).get(key) is not None
+        }
+        for key in engines:
+            self["database"][key] = None
 
         clone = Config(copy.deepcopy(self))
 
-        if engine is not None:
-            self["database"]["engine"] = engine
-            clone["database"]["engine"] = engine
+        for key, engine in engines.items():
+            self["database"][key] = engine
+            clone["database"][key] = engine
 
         return clone
 
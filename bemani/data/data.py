@@ -1,4 +1,5 @@
 import os
+from typing import Optional, Union
 
 import alembic.config
 from alembic.migration import MigrationContext
@@ -13,7 +14,9 @@ from sqlalchemy.exc import ProgrammingError
 from bemani.data.api.user import GlobalUserData
 from bemani.data.api.game import GlobalGameData
 from bemani.data.api.music import GlobalMusicData
-from bemani.data.config import Config
+from bemani.data.cache.lobby import CachedLobbyData
+from bemani.data.cache.user import CachedUserData
+from bemani.data.config import Config, Database, DatabaseReplica
 from bemani.data.mysql.base import metadata
 from bemani.data.mysql.user import UserData
 from bemani.data.mysql.music import MusicData
@@ -22,6 +25,7 @@ from bemani.data.mysql.game import GameData
 from bemani.data.mysql.network import NetworkData
 from bemani.data.mysql.lobby import LobbyData
 from bemani.data.mysql.api import APIData
+from bemani.data.mysql.mirror import MirrorData
 from bemani.data.triggers import Triggers
 
 
@@ -44,6 +48,7 @@ class LocalProvider:
         network: NetworkData,
         lobby: LobbyData,
         api: APIData,
+        mirror: MirrorData,
     ) -> None:
         self.user = user
         self.music = music
@@ -52,6 +57,7 @@ class LocalProvider:
         self.network = network
         self.lobby = lobby
         self.api = api
+        self.mirror = mirror
 
 
 class GlobalProvider:
@@ -64,15 +70,18 @@ class GlobalProvider:
     def __init__(
         self,
         local: LocalProvider,
+        mirror: Optional[MirrorData] = None,
     ) -> None:
         self.user = GlobalUserData(
             local.api,
             local.user,
+            mirror,
         )
         self.music = GlobalMusicData(
             local.api,
             local.user,
             local.music,
+            mirror,
         )
         self.game = GlobalGameData(
             local.api,
@@ -86,13 +95,16 @@ class Data:
     and storing data.
     """
 
-    def __init__(self, config: Config) -> None:
+    def __init__(self, config: Config, use_replica: bool = False) -> None:
         """
         Initializes the data object.
 
         Parameters:
             config - A config structure with a 'database' section which is used
                      to initialize an internal DB connection.
+            use_replica - Whether read-only queries should be sent to the configured
+                          read replica, if there is one. Only pages that can tolerate
+                          replication lag across requests should ask for this.
         """
         session_factory = sessionmaker(
             bind=config.database.engine,
@@ -100,14 +112,26 @@ class Data:
         )
         self.__config = config
         self.__session = scoped_session(session_factory)
+        self.__replica_session: Optional[scoped_session] = None
+        replica_engine = config.database.replica_engine
+        if use_replica and replica_engine is not None:
+            self.__replica_session = scoped_session(sessionmaker(bind=replica_engine))
+            self.__session.info["replica"] = self.__replica_session
         self.__url = Data.sqlalchemy_url(config)
-        self.__user = UserData(config, self.__session)
+        if config.profile_cache.backend == "none":
+            self.__user = UserData(config, self.__session)
+        else:
+            self.__user = CachedUserData(config, self.__session)
         self.__music = MusicData(config, self.__session)
         self.__machine = MachineData(config, self.__session)
         self.__game = GameData(config, self.__session)
         self.__network = NetworkData(config, self.__session)
-        self.__lobby = LobbyData(config, self.__session)
+        if config.lobby.backend == "cache":
+            self.__lobby: LobbyData = CachedLobbyData(config, self.__session)
+        else:
+            self.__lobby = LobbyData(config, self.__session)
         self.__api = APIData(config, self.__session)
+        self.__mirror = MirrorData(config, self.__session)
         self.local = LocalProvider(
             self.__user,
             self.__music,
@@ -116,13 +140,16 @@ class Data:
             self.__network,
             self.__lobby,
             self.__api,
+            self.__mirror,
         )
-        self.remote = GlobalProvider(self.local)
+        # Only serve remote data out of the replicated mirror when it's turned on, since it
+        # is empty until the scheduler has run.
+        self.remote = GlobalProvider(self.local, self.__mirror if config.mirror.enabled else None)
         self.triggers = Triggers(config)
 
     @classmethod
     def sqlalchemy_url(cls, config: Config) -> str:
-        return f"mysql://{config.database.user}:{config.database.password}@{config.database.address}/{config.database.database}?charset=utf8mb4"
+        return Data.__url_for(config.database)
 
     @classmethod
     def create_engine(cls, config: Config) -> Engine:
@@ -131,6 +158,20 @@ class Data:
             pool_recycle=3600,
         )
 
+    @classmethod
+    def create_replica_engine(cls, config: Config) -> Optional[Engine]:
+        replica = config.database.replica
+        if replica is None:
+            return None
+        return create_engine(
+            Data.__url_for(replica),
+            pool_recycle=3600,
+        )
+
+    @staticmethod
+    def __url_for(database: Union[Database, DatabaseReplica]) -> str:
+        return f"mysql://{database.user}:{database.password}@{database.address}/{database.database}?charset=utf8mb4"
+
     def __exists(self) -> bool:
         # See if the DB was already created
         try:
@@ -211,5 +252,12 @@ class Data:
         """
         # Make sure we don't leak connections between web requests
         if self.__session is not None:
+            # Write out buffered audit events once enough have accumulated or they have waited
+            # long enough. Anything left is collapsed with later requests' events, and written
+            # when the process exits.
+            self.__network.flush_events(force=False)
             self.__session.close()
             self.__session = None
+        if self.__replica_session is not None:
+            self.__replica_session.close()
+            self.__replica_session = None
@@ -0,0 +1,150 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from bemani.common import Parallel
+from bemani.data.config import Config
+
+
+class RequestStats:
+    """
+    Timing for a single request that is currently being handled.
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.queries = 0
+        self.dbtime = 0.0
+
+
+class Instrumentation:
+    """
+    Lightweight, always-available instrumentation for finding expensive game handlers in
+    production without attaching a profiler. Requests are timed by name (for game packets,
+    the module and method), every DB query run while handling a request is charged to it,
+    and queries slower than the configured threshold are logged with their SQL and the
+    shape (but never the values) of their parameters. Totals are aggregated per process
+    and periodically dumped to stdout.
+
+    Nothing is recorded unless instrumentation is enabled in the config.
+    """
+
+    __lock = threading.Lock()
+    __local = threading.local()
+    __stats: Dict[str, Dict[str, float]] = {}
+    __counters: Dict[str, int] = {}
+    __last_dump = time.monotonic()
+
+    @classmethod
+    def current(cls) -> Optional[RequestStats]:
+        return getattr(cls.__local, "request", None)
+
+    @classmethod
+    @contextmanager
+    def request(cls, config: Config, name: str) -> Iterator[Optional[RequestStats]]:
+        """
+        Time a request, charging any queries made on this thread while it runs to it.
+        """
+        if not config.instrumentation.enabled:
+            yield None
+            return
+
+        stats = RequestStats(name)
+        cls.__local.request = stats
+        start = time.monotonic()
+        try:
+            yield stats
+        finally:
+            duration = time.monotonic() - start
+            cls.__local.request = None
+
+            with cls.__lock:
+                totals = cls.__stats.setdefault(
+                    name,
+                    {"count": 0, "time": 0.0, "max": 0.0, "dbtime": 0.0, "queries": 0},
+                )
+                totals["count"] += 1
+                totals["time"] += duration
+                totals["max"] = max(totals["max"], duration)
+                totals["dbtime"] += stats.dbtime
+                totals["queries"] += stats.queries
+
+                dump = (time.monotonic() - cls.__last_dump) >= config.instrumentation.dump_interval
+                if dump:
+                    cls.__last_dump = time.monotonic()
+            if dump:
+                cls.dump()
+
+    @classmethod
+    def record_query(cls, config: Config, sql: str, params: Optional[Dict[str, Any]], duration: float) -> None:
+        """
+        Record a single executed query, logging it if it was slow.
+        """
+        stats = cls.current()
+        if stats is not None:
+            stats.queries += 1
+            stats.dbtime += duration
+
+        if duration >= config.instrumentation.slow_query_threshold:
+            shape = {key: cls.__shape(value) for key, value in (params or {}).items()}
+            where = f" during {stats.name}" if stats is not None else ""
+            print(f"Slow query ({duration * 1000:.1f}ms){where}: {' '.join(sql.split())} {shape}")
+
+    @classmethod
+    def count(cls, config: Config, name: str, amount: int = 1) -> None:
+        """
+        Add to a named, process-wide counter, such as the number of bytes written for a table.
+        """
+        if not config.instrumentation.enabled:
+            return
+
+        with cls.__lock:
+            cls.__counters[name] = cls.__counters.get(name, 0) + amount
+
+    @classmethod
+    def counters(cls) -> Dict[str, int]:
+        """
+        Return a copy of the named counters for this process.
+        """
+        with cls.__lock:
+            return dict(cls.__counters)
+
+    @staticmethod
+    def __shape(value: Any) -> str:
+        if isinstance(value, (list, tuple, set)):
+            return f"{type(value).__name__}[{len(value)}]"
+        return type(value).__name__
+
+    @classmethod
+    def snapshot(cls) -> Dict[str, Dict[str, float]]:
+        """
+        Return a copy of the aggregated per-request totals for this process.
+        """
+        with cls.__lock:
+            return {name: dict(totals) for name, totals in cls.__stats.items()}
+
+    @classmethod
+    def dump(cls) -> None:
+        """
+        Print the aggregated per-request totals for this process, most expensive first,
+        followed by any named counters and how saturated the shared parallel pool is.
+        """
+        stats = sorted(cls.snapshot().items(), key=lambda item: item[1]["time"], reverse=True)
+        lines: List[str] = [
+            f"{'request':<40} {'count':>8} {'avg ms':>9} {'max ms':>9} {'db ms':>9} {'queries':>8}",
+        ]
+        for name, totals in stats:
+            count = int(totals["count"])
+            lines.append(
+                f"{name:<40} {count:>8} "
+                f"{totals['time'] * 1000 / count:>9.1f} "
+                f"{totals['max'] * 1000:>9.1f} "
+                f"{totals['dbtime'] * 1000 / count:>9.1f} "
+                f"{totals['queries'] / count:>8.1f}"
+            )
+        for name, value in sorted(cls.counters().items()):
+            lines.append(f"{name:<40} {value:>8}")
+        for name, value in Parallel.stats().items():
+            lines.append(f"{'parallel.' + name:<40} {value:>8}")
+        print("\n".join(lines))
@@ -0,0 +1,30 @@
+"""Index Reflec Beat profile locations for shop score lookups.
+
+Revision ID: 2f6a9c0d4e71
+Revises: 8c41e0d7a93b
+Create Date: 2026-10-19 16:41:09.203714
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '2f6a9c0d4e71'
+down_revision = '8c41e0d7a93b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Backfill the index from existing profiles, mirroring UserData.INDEXED_PROFILE_KEYS.
+    op.execute(
+        "INSERT INTO profile_index (game, version, userid, name, value) "
+        "SELECT refid.game, refid.version, refid.userid, 'lid', CAST(JSON_EXTRACT(profile.data, '$.lid') AS SIGNED) "
+        "FROM refid, profile "
+        "WHERE refid.refid = profile.refid AND refid.game = 'reflec' "
+        "AND JSON_TYPE(JSON_EXTRACT(profile.data, '$.lid')) = 'INTEGER'"
+    )
+
+
+def downgrade():
+    op.execute("DELETE FROM profile_index WHERE game = 'reflec' AND name = 'lid'")
@@ -1,12 +1,18 @@
 import json
-import random
-from typing import Dict, Any, Optional
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Tuple
 from typing_extensions import Final
 
-from bemani.common import Time
+from bemani.common import Time, cache
 from bemani.data.config import Config
+from bemani.data.instrumentation import Instrumentation
 
 from sqlalchemy.engine import CursorResult
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.orm import scoped_session
 from sqlalchemy.sql import text
 from sqlalchemy.types import String, Integer
@@ -24,7 +30,7 @@ session = Table(
     Column("id", Integer, nullable=False),
     Column("type", String(32), nullable=False),
     Column("session", String(32), nullable=False, unique=True),
-    Column("expiration", Integer),
+    Column("expiration", Integer, index=True),
     mysql_charset="utf8mb4",
 )
 
@@ -37,9 +43,66 @@ class _BytesEncoder(json.JSONEncoder):
         return json.JSONEncoder.default(self, obj)
 
 
+class SessionCache:
+    """
+    A process-wide, size-bounded cache of sessions that were recently validated or created
+    by this process, so that a session checked on every request doesn't need a query each
+    time. Entries are only trusted for a short while, and never past the session's own
+    expiration. Sessions destroyed by any process are also recorded in the shared cache,
+    which is checked before trusting an entry here.
+    """
+
+    def __init__(self, size: int, lifetime: int) -> None:
+        self.size = size
+        self.lifetime = lifetime
+        self.__lock = threading.Lock()
+        self.__entries: "OrderedDict[Tuple[str, str], Tuple[int, int]]" = OrderedDict()
+
+    def get(self, session: str, sesstype: str) -> Optional[int]:
+        with self.__lock:
+            entry = self.__entries.get((sesstype, session))
+            if entry is None:
+                return None
+            opid, expiration = entry
+            if expiration <= Time.now():
+                del self.__entries[(sesstype, session)]
+                return None
+            return opid
+
+    def put(self, session: str, sesstype: str, opid: int, expiration: int) -> None:
+        with self.__lock:
+            # Once full, the sessions stored longest ago are forgotten first.
+            self.__entries[(sesstype, session)] = (opid, min(expiration, Time.now() + self.lifetime))
+            self.__entries.move_to_end((sesstype, session))
+            while len(self.__entries) > self.size:
+                self.__entries.popitem(last=False)
+
+    def delete(self, session: str, sesstype: str) -> None:
+        with self.__lock:
+            self.__entries.pop((sesstype, session), None)
+
+    def clear(self) -> None:
+        with self.__lock:
+            self.__entries.clear()
+
+
 class BaseData:
     SESSION_LENGTH: Final[int] = 32
 
+    # How long a validated session is trusted by a process before checking the DB again,
+    # how many sessions each process remembers, and how many expired sessions are deleted
+    # per statement when sweeping.
+    SESSION_CACHE_LIFETIME: Final[int] = 60
+    SESSION_CACHE_SIZE: Final[int] = 4096
+    SESSION_SWEEP_BATCH: Final[int] = 1000
+
+    # Shared by every data object in this process.
+    session_cache: SessionCache = SessionCache(SESSION_CACHE_SIZE, SESSION_CACHE_LIFETIME)
+
+    # How long looked up names stay cached. Renames invalidate the cache directly, so this
+    # only bounds staleness when the cache isn't shared between processes.
+    NAME_CACHE_LIFETIME: Final[int] = 10 * Time.SECONDS_IN_MINUTE
+
     def __init__(self, config: Config, conn: scoped_session) -> None:
         """
         Initialize any DB singleton.
@@ -60,6 +123,7 @@ class BaseData:
         sql: str,
         params: Optional[Dict[str, Any]] = None,
         safe_write_operation: bool = False,
+        primary: bool = False,
     ) -> CursorResult:
         """
         Given a SQL string and some parameters, execute the query and return the result.
@@ -67,28 +131,100 @@ class BaseData:
         Parameters:
             sql - The SQL statement to execute.
             params - Dictionary of parameters which will be substituted into the sql string.
+            safe_write_operation - Allow this write even when read-only mode is active.
+            primary - Always read from the primary, for lookups such as sessions and
+                      credentials that must see writes made by an earlier request.
 
         Returns:
             A SQLAlchemy CursorResult object.
         """
-        if self.__config.database.read_only:
-            # See if this is an insert/update/delete
-            lowered = sql.lower()
-            for write_statement_group in [
-                ["insert into"],
-                ["update", "set"],
-                ["delete from"],
-            ]:
-                includes = all(s in lowered for s in write_statement_group)
-                if includes and not safe_write_operation:
-                    raise Exception("Read-only mode is active!")
-        result = self.__conn.execute(
-            text(sql),
-            params if params is not None else {},
-        )
-        self.__conn.commit()
+        write = self.__is_write(sql)
+        if self.__config.database.read_only and write and not safe_write_operation:
+            raise Exception("Read-only mode is active!")
+
+        info = self.__conn.info
+        start = time.monotonic()
+        result = None
+        if not write and not primary and not info.get("wrote") and not info.get("transaction_depth", 0):
+            result = self.__execute_replica(sql, params)
+        if result is None:
+            if write:
+                # Once we've written something, read it back from the primary for the rest of
+                # this request, since the replica might not have caught up yet.
+                info["wrote"] = True
+            result = self.__conn.execute(
+                text(sql),
+                params if params is not None else {},
+            )
+            if not info.get("transaction_depth", 0):
+                self.__conn.commit()
+        if self.__config.instrumentation.enabled:
+            Instrumentation.record_query(self.__config, sql, params, time.monotonic() - start)
         return result
 
+    def __is_write(self, sql: str) -> bool:
+        """
+        Given a SQL string, guess whether it is an insert/update/delete.
+        """
+        lowered = sql.lower()
+        for write_statement_group in [
+            ["insert into"],
+            ["update", "set"],
+            ["delete from"],
+        ]:
+            if all(s in lowered for s in write_statement_group):
+                return True
+        return False
+
+    def __execute_replica(self, sql: str, params: Optional[Dict[str, Any]]) -> Optional[CursorResult]:
+        """
+        Run a read-only query against the read replica, if one is in use. Returns None if
+        there is no replica or it couldn't run the query, in which case the caller should
+        use the primary instead.
+        """
+        replica = self.__conn.info.get("replica")
+        if replica is None:
+            return None
+        try:
+            result = replica.execute(
+                text(sql),
+                params if params is not None else {},
+            )
+            # Don't hold a snapshot open, so later reads see replicated changes.
+            replica.commit()
+            return result
+        except DBAPIError:
+            # Give up on the replica for the rest of this request and use the primary.
+            Instrumentation.count(self.__config, "database.replica_errors")
+            self.__conn.info["replica"] = None
+            try:
+                replica.rollback()
+            except DBAPIError:
+                pass
+            return None
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """
+        Group every statement executed inside the block into a single transaction. This
+        covers statements run by any data object sharing this connection, so it can be used
+        to make writes to several tables atomic. The transaction is committed when the
+        outermost block exits, or rolled back if it raises.
+        """
+        info = self.__conn.info
+        depth = info.get("transaction_depth", 0)
+        info["transaction_depth"] = depth + 1
+        try:
+            yield
+        except Exception:
+            info["transaction_depth"] = depth
+            if depth == 0:
+                self.__conn.rollback()
+            raise
+        info["transaction_depth"] = depth
+        if depth == 0:
+            self.__conn.commit()
+
     def serialize(self, data: Dict[str, Any]) -> str:
         """
         Given an arbitrary dict, serialize it to JSON.
@@ -125,6 +261,64 @@ class BaseData:
 
         return fix(json.loads(data))
 
+    def _prefix_pattern(self, prefix: str) -> str:
+        """
+        Given a prefix typed by somebody searching, return a LIKE pattern matching
+        anything that starts with it, treating any wildcards in the prefix literally.
+        """
+        return prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+    def __name_key(self, table: str, nameid: int) -> str:
+        return f"names.{table}.{nameid}"
+
+    def _get_names(self, table: str, column: str, ids: Iterable[int]) -> Dict[int, Optional[str]]:
+        """
+        Given a table and the column holding its names, look up the name for every ID that
+        exists. Names are served from the shared cache where possible, and any misses are
+        fetched with a single query.
+
+        Parameters:
+            table - The table to look up names in.
+            column - The column of that table holding the name.
+            ids - The IDs to look up.
+
+        Returns:
+            A dictionary keyed by ID for every ID that was found.
+        """
+        idlist = list(set(ids))
+        if not idlist:
+            return {}
+
+        names: Dict[int, Optional[str]] = {}
+        missing: List[int] = []
+        for nameid, entry in zip(idlist, cache.get_many(*[self.__name_key(table, nameid) for nameid in idlist])):
+            if entry is None:
+                missing.append(nameid)
+            else:
+                names[nameid] = entry["name"]
+
+        if missing:
+            sql = f"SELECT id, `{column}` AS name FROM `{table}` WHERE id IN :ids"
+            cursor = self.execute(sql, {"ids": tuple(missing)})
+            fetched: Dict[str, Any] = {}
+            for result in cursor.mappings():
+                names[result["id"]] = result["name"]
+                # Wrapped so that entries without a name can still be cached.
+                fetched[self.__name_key(table, result["id"])] = {"name": result["name"]}
+            if fetched:
+                cache.set_many(fetched, timeout=self.NAME_CACHE_LIFETIME)
+
+        return names
+
+    def _invalidate_name(self, table: str, nameid: int) -> None:
+        """
+        Drop a cached name looked up by _get_names, after it has been changed.
+        """
+        cache.delete(self.__name_key(table, nameid))
+
+    def __revoked_key(self, session: str, sesstype: str) -> str:
+        return f"sessions.revoked.{sesstype}.{session}"
+
     def _from_session(self, session: str, sesstype: str) -> Optional[int]:
         """
         Given a previously-opened session, look up an ID.
@@ -136,14 +330,24 @@ class BaseData:
         Returns:
             ID as an integer if found, or None if the session is expired or doesn't exist.
         """
-        # Look up the user account, making sure to expire old sessions
-        sql = "SELECT id FROM session WHERE session = :session AND type = :type AND expiration > :timestamp"
-        cursor = self.execute(sql, {"session": session, "type": sesstype, "timestamp": Time.now()})
+        cached = BaseData.session_cache.get(session, sesstype)
+        if cached is not None:
+            # Another process may have destroyed this session since we cached it.
+            if cache.get(self.__revoked_key(session, sesstype)) is None:
+                return cached
+            BaseData.session_cache.delete(session, sesstype)
+            return None
+
+        # Look up the user account, making sure to expire old sessions. This always uses the
+        # primary, since the session was most likely created by the previous request.
+        sql = "SELECT id, expiration FROM session WHERE session = :session AND type = :type AND expiration > :timestamp"
+        cursor = self.execute(sql, {"session": session, "type": sesstype, "timestamp": Time.now()}, primary=True)
         if cursor.rowcount != 1:
             # Couldn't find a user with this session
             return None
 
         result = cursor.mappings().fetchone()  # type: ignore
+        BaseData.session_cache.put(session, sesstype, result["id"], result["expiration"])
         return result["id"]
 
     def _create_session(self, opid: int, optype: str, expiration: int = (30 * 86400)) -> str:
@@ -157,32 +361,30 @@ class BaseData:
         Returns:
             A string that can be used as a session ID.
         """
-        # Create a new session that is unique
-        while True:
-            session = "".join(random.choice("0123456789ABCDEF") for _ in range(BaseData.SESSION_LENGTH))
-            sql = "SELECT session FROM session WHERE session = :session"
-            cursor = self.execute(sql, {"session": session})
-            if cursor.rowcount == 0:
-                # Make sure sessions expire in a reasonable amount of time
-                expiration = Time.now() + expiration
-
-                # Use that session
-                sql = """
-                    INSERT INTO session (id, session, type, expiration)
-                    VALUES (:id, :session, :optype, :expiration)
-                """
-                cursor = self.execute(
-                    sql,
-                    {
-                        "id": opid,
-                        "session": session,
-                        "optype": optype,
-                        "expiration": expiration,
-                    },
-                    safe_write_operation=True,
-                )
-                if cursor.rowcount == 1:
-                    return session
+        # Session IDs are 128 random bits from the OS's secure random source, so they won't
+        # collide and there's no need to check for an existing session first. Should the
+        # impossible happen anyway, the unique key on the session column refuses the insert.
+        session = secrets.token_hex(BaseData.SESSION_LENGTH // 2).upper()
+
+        # Make sure sessions expire in a reasonable amount of time
+        expiration = Time.now() + expiration
+
+        sql = """
+            INSERT INTO session (id, session, type, expiration)
+            VALUES (:id, :session, :optype, :expiration)
+        """
+        self.execute(
+            sql,
+            {
+                "id": opid,
+                "session": session,
+                "optype": optype,
+                "expiration": expiration,
+            },
+            safe_write_operation=True,
+        )
+        BaseData.session_cache.put(session, optype, opid, expiration)
+        return session
 
     def _destroy_session(self, session: str, sesstype: str) -> None:
         """
@@ -191,10 +393,30 @@ class BaseData:
         Parameters:
             session - A session string as returned from create_session.
         """
-        # Remove the session token
+        # Remove the session token, and tell other processes to stop honoring their cached
+        # copy. Those copies lapse on their own after SESSION_CACHE_LIFETIME seconds, so the
+        # revocation doesn't need to be remembered any longer than that.
         sql = "DELETE FROM session WHERE session = :session AND type = :sesstype"
         self.execute(sql, {"session": session, "sesstype": sesstype}, safe_write_operation=True)
+        cache.set(self.__revoked_key(session, sesstype), True, timeout=BaseData.SESSION_CACHE_LIFETIME)
+        BaseData.session_cache.delete(session, sesstype)
 
-        # Also weed out any other defunct sessions
-        sql = "DELETE FROM session WHERE expiration < :timestamp"
-        self.execute(sql, {"timestamp": Time.now()}, safe_write_operation=True)
+    def _delete_expired_sessions(self) -> int:
+        """
+        Delete sessions that have expired, a batch at a time so that the session table
+        isn't locked against logins for long.
+
+        Returns:
+            The number of sessions deleted.
+        """
+        deleted = 0
+        sql = "DELETE FROM session WHERE expiration < :timestamp LIMIT :batch"
+        while True:
+            cursor = self.execute(
+                sql,
+                {"timestamp": Time.now(), "batch": self.SESSION_SWEEP_BATCH},
+                safe_write_operation=True,
+            )
+            deleted += cursor.rowcount
+            if cursor.rowcount < self.SESSION_SWEEP_BATCH:
+                return deleted
@@ -1,7 +1,7 @@
 from sqlalchemy import Table, Column, UniqueConstraint
 from sqlalchemy.types import String, Integer, JSON
 from sqlalchemy.dialects.mysql import BIGINT as BigInteger
-from typing import Optional, Dict, List, Tuple, Any
+from typing import Optional, Dict, Iterable, List, Tuple, Any
 from typing_extensions import Final
 
 from bemani.common import GameConstants, ValidatedDict
@@ -215,6 +215,56 @@ class MachineData(BaseData):
             for result in cursor.mappings()
         ]
 
+    def search_machines(
+        self,
+        pcbid: Optional[str] = None,
+        limit: Optional[int] = None,
+        offset: int = 0,
+    ) -> Tuple[List[Machine], int]:
+        """
+        Look up a page of machines on the network, ordered by PCBID and optionally
+        filtered by the start of the PCBID.
+
+        Parameters:
+            pcbid - Optional prefix that matching PCBIDs must start with.
+            limit - Optional maximum number of machines to return.
+            offset - Number of matching machines to skip before returning any.
+
+        Returns:
+            A tuple of a list of Machine objects, and the total number of matching machines.
+        """
+        condition = " WHERE pcbid LIKE :pcbid" if pcbid else ""
+        params = {
+            "pcbid": self._prefix_pattern(pcbid or ""),
+            "limit": limit if limit is not None else 18446744073709551615,
+            "offset": offset,
+        }
+
+        cursor = self.execute(f"SELECT COUNT(*) AS count FROM machine{condition}", params)
+        total = cursor.mappings().fetchone()["count"]  # type: ignore
+        cursor = self.execute(
+            "SELECT pcbid, name, description, arcadeid, id, port, game, version, data "
+            f"FROM machine{condition} ORDER BY pcbid LIMIT :limit OFFSET :offset",
+            params,
+        )
+        return (
+            [
+                Machine(
+                    result["id"],
+                    result["pcbid"],
+                    result["name"],
+                    result["description"],
+                    result["arcadeid"],
+                    result["port"],
+                    GameConstants(result["game"]) if result["game"] else None,
+                    result["version"],
+                    self.deserialize(result["data"]),
+                )
+                for result in cursor.mappings()
+            ],
+            total,
+        )
+
     def put_machine(self, machine: Machine) -> None:
         """
         Given a Machine object, update the database with new information.
@@ -430,6 +480,7 @@ class MachineData(BaseData):
                 "arcadeid": arcade.id,
             },
         )
+        self._invalidate_name("arcade", arcade.id)
         sql = "DELETE FROM `arcade_owner` WHERE arcadeid = :arcadeid"
         self.execute(sql, {"arcadeid": arcade.id})
         for owner in arcade.owners:
@@ -449,11 +500,26 @@ class MachineData(BaseData):
         """
         sql = "DELETE FROM `arcade` WHERE id = :arcadeid LIMIT 1"
         self.execute(sql, {"arcadeid": arcadeid})
+        self._invalidate_name("arcade", arcadeid)
         sql = "DELETE FROM `arcade_owner` WHERE arcadeid = :arcadeid"
         self.execute(sql, {"arcadeid": arcadeid})
         sql = "UPDATE `machine` SET arcadeid = NULL WHERE arcadeid = :arcadeid"
         self.execute(sql, {"arcadeid": arcadeid})
 
+    def get_arcade_names(self, arcadeids: Iterable[ArcadeID]) -> Dict[ArcadeID, str]:
+        """
+        Given a list of arcade IDs, look up the name of each arcade.
+
+        Parameters:
+            arcadeids - Integer arcade IDs.
+
+        Returns:
+            A dictionary keyed by arcade ID for every arcade that exists.
+        """
+        return {
+            ArcadeID(arcadeid): name or "" for arcadeid, name in self._get_names("arcade", "name", arcadeids).items()
+        }
+
     def get_all_arcades(self) -> List[Arcade]:
         """
         List all known arcades in the system.
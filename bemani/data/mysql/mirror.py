@@ -0,0 +1,384 @@
+from sqlalchemy import Table, Column, UniqueConstraint
+from sqlalchemy.types import String, Integer, JSON
+from typing import Any, Dict, List, Optional, Tuple
+from typing_extensions import Final
+
+from bemani.common import GameConstants
+from bemani.data.mysql.base import BaseData, metadata
+
+"""
+Table for storing profiles replicated from remote BEMAPI servers, exactly as the
+remote server returned them. Each profile is keyed by its owner, which is the
+lowest card ID associated with the remote player.
+"""
+mirror_profile = Table(
+    "mirror_profile",
+    metadata,
+    Column("server", Integer, nullable=False),
+    Column("game", String(32), nullable=False),
+    Column("version", Integer, nullable=False),
+    Column("owner", String(16), nullable=False),
+    Column("synced", Integer, nullable=False),
+    Column("data", JSON, nullable=False),
+    UniqueConstraint("server", "game", "version", "owner", name="server_game_version_owner"),
+    mysql_charset="utf8mb4",
+)
+
+"""
+Table for storing per-player scores replicated from remote BEMAPI servers, exactly
+as the remote server returned them. These are pulled incrementally, so the update
+column mirrors the remote "updated" timestamp for since/until lookups.
+"""
+mirror_score = Table(
+    "mirror_score",
+    metadata,
+    Column("server", Integer, nullable=False),
+    Column("game", String(32), nullable=False),
+    Column("version", Integer, nullable=False),
+    Column("owner", String(16), nullable=False),
+    Column("songid", Integer, nullable=False),
+    Column("chart", Integer, nullable=False),
+    Column("update", Integer, nullable=False, index=True),
+    Column("data", JSON, nullable=False),
+    UniqueConstraint("server", "game", "version", "owner", "songid", "chart", name="server_game_version_owner_song"),
+    mysql_charset="utf8mb4",
+)
+
+"""
+Table for storing per-chart data replicated from remote BEMAPI servers. This holds
+both the server-wide records and the server-wide statistics for each song/chart,
+distinguished by type.
+"""
+mirror_chart = Table(
+    "mirror_chart",
+    metadata,
+    Column("server", Integer, nullable=False),
+    Column("game", String(32), nullable=False),
+    Column("version", Integer, nullable=False),
+    Column("type", String(32), nullable=False),
+    Column("songid", Integer, nullable=False),
+    Column("chart", Integer, nullable=False),
+    Column("synced", Integer, nullable=False),
+    Column("data", JSON, nullable=False),
+    UniqueConstraint("server", "game", "version", "type", "songid", "chart", name="server_game_version_type_song"),
+    mysql_charset="utf8mb4",
+)
+
+"""
+Table mapping every card ID seen on a remote BEMAPI server to the owner key that
+its profile and scores are stored under.
+"""
+mirror_card = Table(
+    "mirror_card",
+    metadata,
+    Column("server", Integer, nullable=False),
+    Column("card", String(16), nullable=False),
+    Column("owner", String(16), nullable=False),
+    UniqueConstraint("server", "card", name="server_card"),
+    mysql_charset="utf8mb4",
+)
+
+"""
+Table remembering when each server/game/version was last replicated, so that
+scores can be pulled incrementally.
+"""
+mirror_sync = Table(
+    "mirror_sync",
+    metadata,
+    Column("server", Integer, nullable=False),
+    Column("game", String(32), nullable=False),
+    Column("version", Integer, nullable=False),
+    Column("timestamp", Integer, nullable=False),
+    UniqueConstraint("server", "game", "version", name="server_game_version"),
+    mysql_charset="utf8mb4",
+)
+
+
+class MirrorData(BaseData):
+    # Number of rows written per INSERT when replicating large responses.
+    CHUNK_SIZE: Final[int] = 250
+
+    CHART_TYPE_RECORDS: Final[str] = "records"
+    CHART_TYPE_STATISTICS: Final[str] = "statistics"
+
+    @staticmethod
+    def owner(cards: List[str]) -> Optional[str]:
+        """
+        Given the card IDs attached to a remote profile or score, return the key that
+        we store it under, or None if it is anonymous.
+        """
+        cards = sorted(card.upper() for card in cards)
+        if not cards:
+            return None
+        return cards[0]
+
+    def __insert(self, sql: str, values: str, update: str, rows: List[Dict[str, Any]]) -> None:
+        for start in range(0, len(rows), self.CHUNK_SIZE):
+            chunk = rows[start : (start + self.CHUNK_SIZE)]
+            params: Dict[str, Any] = {}
+            entries = []
+            for i, row in enumerate(chunk):
+                entries.append("(" + ", ".join(f":{key}{i}" for key in values.split(", ")) + ")")
+                for key in values.split(", "):
+                    params[f"{key}{i}"] = row[key]
+            self.execute(f"{sql} VALUES {', '.join(entries)} ON DUPLICATE KEY UPDATE {update}", params)
+
+    def put_cards(self, serverid: int, entries: List[Dict[str, Any]]) -> None:
+        """
+        Given a list of remote profiles or scores, remember which owner each card maps to.
+
+        Parameters:
+            serverid - The ID of the remote server these came from.
+            entries - Profiles or scores, as returned by BEMAPI.
+        """
+        seen: Dict[str, str] = {}
+        for entry in entries:
+            owner = self.owner(entry.get("cards", []))
+            if owner is None:
+                continue
+            for card in entry["cards"]:
+                seen[card.upper()] = owner
+
+        self.__insert(
+            "INSERT INTO mirror_card (server, card, owner)",
+            "server, card, owner",
+            "owner=VALUES(owner)",
+            [{"server": serverid, "card": card, "owner": owner} for card, owner in seen.items()],
+        )
+
+    def get_owners(self, serverid: int, cards: List[str]) -> List[str]:
+        """
+        Given a list of card IDs, look up the owner keys of any remote players using them.
+        """
+        if not cards:
+            return []
+        sql = "SELECT DISTINCT(owner) AS owner FROM mirror_card WHERE server = :server AND card IN :cards"
+        cursor = self.execute(sql, {"server": serverid, "cards": tuple(card.upper() for card in cards)})
+        return [result["owner"] for result in cursor.mappings()]
+
+    def get_last_sync(self, serverid: int, game: GameConstants, version: int) -> Optional[int]:
+        """
+        Return the timestamp of the last successful replication, or None if there wasn't one.
+        """
+        sql = "SELECT timestamp FROM mirror_sync WHERE server = :server AND game = :game AND version = :version"
+        cursor = self.execute(sql, {"server": serverid, "game": game.value, "version": version})
+        if cursor.rowcount != 1:
+            return None
+        return cursor.mappings().fetchone()["timestamp"]  # type: ignore
+
+    def put_last_sync(self, serverid: int, game: GameConstants, version: int, timestamp: int) -> None:
+        sql = """
+            INSERT INTO mirror_sync (server, game, version, timestamp)
+            VALUES (:server, :game, :version, :timestamp)
+            ON DUPLICATE KEY UPDATE timestamp=VALUES(timestamp)
+        """
+        self.execute(sql, {"server": serverid, "game": game.value, "version": version, "timestamp": timestamp})
+
+    def replace_profiles(
+        self, serverid: int, game: GameConstants, version: int, profiles: List[Dict[str, Any]], timestamp: int
+    ) -> None:
+        """
+        Replace every mirrored profile for a server/game/version with a fresh copy. Profiles
+        are upserted before stale ones are removed, so readers never see an empty mirror.
+        """
+        rows = []
+        for profile in profiles:
+            owner = self.owner(profile.get("cards", []))
+            if owner is None:
+                continue
+            rows.append(
+                {
+                    "server": serverid,
+                    "game": game.value,
+                    "version": version,
+                    "owner": owner,
+                    "synced": timestamp,
+                    "data": self.serialize(profile),
+                }
+            )
+        self.__insert(
+            "INSERT INTO mirror_profile (server, game, version, owner, synced, data)",
+            "server, game, version, owner, synced, data",
+            "synced=VALUES(synced), data=VALUES(data)",
+            rows,
+        )
+        sql = """
+            DELETE FROM mirror_profile
+            WHERE server = :server AND game = :game AND version = :version AND synced < :synced
+        """
+        self.execute(sql, {"server": serverid, "game": game.value, "version": version, "synced": timestamp})
+
+    def get_profiles(
+        self, serverid: int, game: GameConstants, version: Optional[int], owners: Optional[List[str]] = None
+    ) -> List[Tuple[int, Dict[str, Any]]]:
+        """
+        Look up mirrored profiles for a server/game, optionally limited to a version and to
+        a list of owners.
+
+        Returns:
+            A list of (version, profile) tuples, newest version first.
+        """
+        sql = "SELECT version, data FROM mirror_profile WHERE server = :server AND game = :game"
+        if version is not None:
+            sql = sql + " AND version = :version"
+        if owners is not None:
+            if not owners:
+                return []
+            sql = sql + " AND owner IN :owners"
+        sql = sql + " ORDER BY version DESC"
+        cursor = self.execute(
+            sql,
+            {
+                "server": serverid,
+                "game": game.value,
+                "version": version,
+                "owners": tuple(owners) if owners is not None else None,
+            },
+        )
+        return [(result["version"], self.deserialize(result["data"])) for result in cursor.mappings()]
+
+    def put_scores(self, serverid: int, game: GameConstants, version: int, scores: List[Dict[str, Any]]) -> None:
+        """
+        Insert or update mirrored scores for a server/game/version.
+        """
+        rows = []
+        for score in scores:
+            owner = self.owner(score.get("cards", []))
+            if owner is None:
+                continue
+            rows.append(
+                {
+                    "server": serverid,
+                    "game": game.value,
+                    "version": version,
+                    "owner": owner,
+                    "songid": int(score["song"]),
+                    "chart": int(score["chart"]),
+                    "update": int(score.get("updated", 0)),
+                    "data": self.serialize(score),
+                }
+            )
+        self.__insert(
+            "INSERT INTO mirror_score (server, game, version, owner, songid, chart, `update`, data)",
+            "server, game, version, owner, songid, chart, update, data",
+            "`update`=VALUES(`update`), data=VALUES(data)",
+            rows,
+        )
+
+    def get_scores(
+        self,
+        serverid: int,
+        game: GameConstants,
+        version: int,
+        owners: Optional[List[str]] = None,
+        songid: Optional[int] = None,
+        songchart: Optional[int] = None,
+        since: Optional[int] = None,
+        until: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Look up mirrored scores for a server/game/version, filtered the same way a BEMAPI
+        records request for a card, song or instance would be.
+        """
+        sql = "SELECT data FROM mirror_score WHERE server = :server AND game = :game AND version = :version"
+        if owners is not None:
+            if not owners:
+                return []
+            sql = sql + " AND owner IN :owners"
+        if songid is not None:
+            sql = sql + " AND songid = :songid"
+        if songchart is not None:
+            sql = sql + " AND chart = :songchart"
+        if since is not None:
+            sql = sql + " AND `update` >= :since"
+        if until is not None:
+            sql = sql + " AND `update` < :until"
+        cursor = self.execute(
+            sql,
+            {
+                "server": serverid,
+                "game": game.value,
+                "version": version,
+                "owners": tuple(owners) if owners is not None else None,
+                "songid": songid,
+                "songchart": songchart,
+                "since": since,
+                "until": until,
+            },
+        )
+        return [self.deserialize(result["data"]) for result in cursor.mappings()]
+
+    def replace_charts(
+        self,
+        serverid: int,
+        game: GameConstants,
+        version: int,
+        charttype: str,
+        entries: List[Dict[str, Any]],
+        timestamp: int,
+    ) -> None:
+        """
+        Replace every mirrored record or statistic for a server/game/version with a fresh copy.
+        """
+        rows = [
+            {
+                "server": serverid,
+                "game": game.value,
+                "version": version,
+                "type": charttype,
+                "songid": int(entry["song"]),
+                "chart": int(entry["chart"]),
+                "synced": timestamp,
+                "data": self.serialize(entry),
+            }
+            for entry in entries
+            if entry.get("song") is not None and entry.get("chart") is not None
+        ]
+        self.__insert(
+            "INSERT INTO mirror_chart (server, game, version, type, songid, chart, synced, data)",
+            "server, game, version, type, songid, chart, synced, data",
+            "synced=VALUES(synced), data=VALUES(data)",
+            rows,
+        )
+        sql = """
+            DELETE FROM mirror_chart
+            WHERE server = :server AND game = :game AND version = :version AND type = :type AND synced < :synced
+        """
+        self.execute(
+            sql,
+            {"server": serverid, "game": game.value, "version": version, "type": charttype, "synced": timestamp},
+        )
+
+    def get_charts(
+        self,
+        serverid: int,
+        game: GameConstants,
+        version: int,
+        charttype: str,
+        songid: Optional[int] = None,
+        songchart: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Look up mirrored records or statistics for a server/game/version, optionally
+        limited to a song or song/chart.
+        """
+        sql = """
+            SELECT data FROM mirror_chart
+            WHERE server = :server AND game = :game AND version = :version AND type = :type
+        """
+        if songid is not None:
+            sql = sql + " AND songid = :songid"
+        if songchart is not None:
+            sql = sql + " AND chart = :songchart"
+        cursor = self.execute(
+            sql,
+            {
+                "server": serverid,
+                "game": game.value,
+                "version": version,
+                "type": charttype,
+                "songid": songid,
+                "songchart": songchart,
+            },
+        )
+        return [self.deserialize(result["data"]) for result in cursor.mappings()]
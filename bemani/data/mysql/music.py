@@ -1,8 +1,8 @@
-from sqlalchemy import Table, Column, UniqueConstraint
+from sqlalchemy import Table, Column, Index, UniqueConstraint
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.types import String, Integer, JSON
 from sqlalchemy.dialects.mysql import BIGINT as BigInteger
-from typing import Optional, Dict, List, Tuple, Any
+from typing import Optional, Dict, List, Sequence, Tuple, Any
 
 from bemani.common import GameConstants, Time
 from bemani.data.exceptions import ScoreSaveException
@@ -31,6 +31,7 @@ score = Table(
     Column("lid", Integer, nullable=False, index=True),
     Column("data", JSON, nullable=False),
     UniqueConstraint("userid", "musicid", name="userid_musicid"),
+    Index("musicid_points_timestamp", "musicid", "points", "timestamp"),
     mysql_charset="utf8mb4",
 )
 
@@ -524,34 +525,67 @@ class MusicData(BaseData):
         Returns:
             A list of tuples, containing the songid and the number of plays across all charts for that song.
         """
-        sql = """
+        return self.get_hit_charts(game, version, count, [days])[days]
+
+    def get_hit_charts(
+        self,
+        game: GameConstants,
+        version: int,
+        count: int,
+        windows: Sequence[Optional[int]] = (7, 30, 365),
+    ) -> Dict[Optional[int], List[Tuple[int, int]]]:
+        """
+        Look up a game's most played songs over several windows at once. This scans the
+        play history a single time and counts plays for every window in the same pass.
+
+        Parameters:
+            game - Enum value representing a game series.
+            version - Integer representing which version of the game.
+            count - Number of songs to look up per window.
+            windows - A list of window sizes in days, or None for all time.
+
+        Returns:
+            A dictionary keyed by window, where each value is a list of tuples containing the
+            songid and the number of plays across all charts for that song, most played first.
+        """
+        windows = list(dict.fromkeys(windows))
+        if not windows:
+            return {}
+
+        now = Time.now()
+        params: Dict[str, Any] = {"game": game.value, "version": version}
+        columns = []
+        for i, days in enumerate(windows):
+            if days is None:
+                columns.append(f"COUNT(score_history.timestamp) AS plays{i}")
+            else:
+                columns.append(f"SUM(score_history.timestamp > :timestamp{i}) AS plays{i}")
+                params[f"timestamp{i}"] = now - (Time.SECONDS_IN_DAY * days)
+
+        sql = f"""
             SELECT
                 music.songid AS songid,
-                COUNT(score_history.timestamp) AS plays
+                {", ".join(columns)}
             FROM score_history, music
             WHERE
                 score_history.musicid = music.id AND
                 music.game = :game AND
                 music.version = :version
         """
-        timestamp: Optional[int] = None
-        if days is not None:
-            # Only select the last X days of hit chart
-            sql = sql + "AND score_history.timestamp > :timestamp "
-            timestamp = Time.now() - (Time.SECONDS_IN_DAY * days)
-
-        sql = sql + "GROUP BY songid ORDER BY plays DESC LIMIT :count"
-        cursor = self.execute(
-            sql,
-            {
-                "game": game.value,
-                "version": version,
-                "count": count,
-                "timestamp": timestamp,
-            },
-        )
+        if None not in windows:
+            # Nothing outside the widest window can count towards any of them.
+            sql = sql + "AND score_history.timestamp > :oldest "
+            params["oldest"] = now - (Time.SECONDS_IN_DAY * max(days for days in windows if days is not None))
+        sql = sql + "GROUP BY songid"
+        cursor = self.execute(sql, params)
 
-        return [(result["songid"], result["plays"]) for result in cursor.mappings()]
+        results = [result for result in cursor.mappings()]
+        charts: Dict[Optional[int], List[Tuple[int, int]]] = {}
+        for i, days in enumerate(windows):
+            plays = [(result["songid"], int(result[f"plays{i}"])) for result in results if result[f"plays{i}"]]
+            plays.sort(key=lambda entry: entry[1], reverse=True)
+            charts[days] = plays[:count]
+        return charts
 
     def get_song(
         self,
@@ -659,6 +693,9 @@ class MusicData(BaseData):
         songchart: Optional[int] = None,
         since: Optional[int] = None,
         until: Optional[int] = None,
+        userlist: Optional[List[UserID]] = None,
+        limit: Optional[int] = None,
+        songrange: Optional[Tuple[int, int]] = None,
     ) -> List[Tuple[UserID, Score]]:
         """
         Look up all of a game's high scores for all users.
@@ -666,6 +703,9 @@ class MusicData(BaseData):
         Parameters:
             game - Enum value representing a game series.
             version - Integer representing which version of the game.
+            userlist - List of UserIDs to limit the search to.
+            limit - If given, return only this many scores, highest points first.
+            songrange - If given, an inclusive (first, last) range of song IDs to limit the search to.
 
         Returns:
             A list of UserID, Score objects representing all high scores for a game.
@@ -697,6 +737,8 @@ class MusicData(BaseData):
             innerselect = innerselect + " AND songid = :songid"
         if songchart is not None:
             innerselect = innerselect + " AND chart = :songchart"
+        if songrange is not None:
+            innerselect = innerselect + " AND songid BETWEEN :firstsongid AND :lastsongid"
 
         # Finally, construct the full query
         sql = f"""
@@ -721,6 +763,14 @@ class MusicData(BaseData):
             sql = sql + " AND score.update >= :since"
         if until is not None:
             sql = sql + " AND score.update < :until"
+        if userlist is not None:
+            if len(userlist) == 0:
+                # We don't have any users, but SQL will shit the bed, so lets add a fake one.
+                userlist = [UserID(-1)]
+            sql = sql + " AND userid IN :userlist"
+        if limit is not None:
+            # Ties go to the lowest score ID, so the same scores come back every time.
+            sql = sql + " ORDER BY points DESC, id ASC LIMIT :limit"
 
         # Now, query itself
         cursor = self.execute(
@@ -733,6 +783,10 @@ class MusicData(BaseData):
                 "songchart": songchart,
                 "since": since,
                 "until": until,
+                "userlist": tuple(userlist) if userlist is not None else None,
+                "limit": limit,
+                "firstsongid": songrange[0] if songrange is not None else None,
+                "lastsongid": songrange[1] if songrange is not None else None,
             },
         )
 
@@ -755,6 +809,252 @@ class MusicData(BaseData):
             for result in cursor.mappings()
         ]
 
+    def __leaderboard_filter(
+        self,
+        userlist: Optional[List[UserID]],
+        location: Optional[int],
+        include: Optional[UserID],
+    ) -> str:
+        clauses: List[str] = []
+        if userlist is not None:
+            clauses.append("score.userid IN :userlist")
+        if location is not None:
+            clauses.append("score.lid = :location")
+        if not clauses:
+            return ""
+        if include is not None:
+            # The ranked player always appears on their own leaderboard.
+            clauses.append("score.userid = :include")
+        return " AND (" + " OR ".join(clauses) + ")"
+
+    def __leaderboard_version(self, version: Optional[int]) -> str:
+        # Without a version, a chart's leaderboard covers every version it appeared in.
+        return " AND music.version = :version" if version is not None else ""
+
+    def __get_leaderboard(
+        self,
+        game: GameConstants,
+        version: Optional[int],
+        songid: int,
+        songchart: int,
+        count: Optional[int],
+        offset: int,
+        userlist: Optional[List[UserID]],
+        location: Optional[int],
+        include: Optional[UserID],
+    ) -> List[Tuple[UserID, Score]]:
+        if userlist is not None and len(userlist) == 0 and location is None and include is None:
+            return []
+
+        sql = f"""
+            SELECT
+                score.id AS scorekey,
+                score.userid AS userid,
+                score.points AS points,
+                score.timestamp AS timestamp,
+                score.update AS `update`,
+                score.lid AS lid,
+                score.data AS data,
+                (
+                    SELECT COUNT(timestamp) FROM score_history
+                    WHERE score_history.musicid = score.musicid AND score_history.userid = score.userid
+                ) AS plays
+            FROM score, music
+            WHERE music.id = score.musicid AND music.game = :game{self.__leaderboard_version(version)}
+            AND music.songid = :songid AND music.chart = :songchart
+        """
+        sql = sql + self.__leaderboard_filter(userlist, location, include)
+        sql = sql + " ORDER BY score.points DESC, score.timestamp DESC, score.id DESC"
+        if count is not None:
+            sql = sql + " LIMIT :count OFFSET :offset"
+
+        cursor = self.execute(
+            sql,
+            {
+                "game": game.value,
+                "version": version,
+                "songid": songid,
+                "songchart": songchart,
+                "userlist": tuple(userlist) if userlist else (UserID(-1),),
+                "location": location,
+                "include": include,
+                "count": count,
+                "offset": offset,
+            },
+        )
+        scores = [
+            (
+                UserID(result["userid"]),
+                Score(
+                    result["scorekey"],
+                    songid,
+                    songchart,
+                    result["points"],
+                    result["timestamp"],
+                    result["update"],
+                    result["lid"],
+                    result["plays"],
+                    self.deserialize(result["data"]),
+                ),
+            )
+            for result in cursor.mappings()
+        ]
+        if count is None:
+            return scores[offset:]
+        return scores
+
+    def get_leaderboard(
+        self,
+        game: GameConstants,
+        version: Optional[int],
+        songid: int,
+        songchart: int,
+        count: Optional[int] = None,
+        offset: int = 0,
+        userlist: Optional[List[UserID]] = None,
+        location: Optional[int] = None,
+    ) -> List[Tuple[UserID, Score]]:
+        """
+        Look up the high scores for a single chart, in rank order. Scores are ranked by
+        points, with ties going to the most recently earned score. This is served by the
+        musicid/points index on the score table, so it never has to sort every score for
+        the game.
+
+        Parameters:
+            game - Enum value representing a game series.
+            version - Integer representing which version of the game, or None to rank
+                      scores from every version of the chart together.
+            songid - ID of the song according to the game.
+            songchart - Chart number according to the game.
+            count - If given, return at most this many scores.
+            offset - Number of ranked scores to skip before returning any.
+            userlist - If given, only rank scores belonging to these users.
+            location - If given, only rank scores earned on this machine.
+
+        Returns:
+            A list of UserID, Score objects, best score first.
+        """
+        return self.__get_leaderboard(game, version, songid, songchart, count, offset, userlist, location, None)
+
+    def get_score_rank(
+        self,
+        game: GameConstants,
+        version: Optional[int],
+        userid: UserID,
+        songid: int,
+        songchart: int,
+        userlist: Optional[List[UserID]] = None,
+        location: Optional[int] = None,
+    ) -> Optional[int]:
+        """
+        Look up a user's rank on a single chart's leaderboard, as ordered by get_leaderboard.
+        The user's own score is always ranked, even if userlist or location would exclude it.
+
+        Parameters:
+            game - Enum value representing a game series.
+            version - Integer representing which version of the game, or None to rank
+                      against scores from every version of the chart.
+            userid - Integer representing a user. Usually looked up with UserData.
+            songid - ID of the song according to the game.
+            songchart - Chart number according to the game.
+            userlist - If given, only rank against scores belonging to these users.
+            location - If given, only rank against scores earned on this machine.
+
+        Returns:
+            The 1-based rank of the user's score, or None if they have no score on this chart.
+        """
+        # Without a version, the user may have a score on each version of the chart, so
+        # we rank their best one.
+        musicids = (
+            "SELECT id FROM music WHERE music.game = :game"
+            f"{self.__leaderboard_version(version)} AND music.songid = :songid AND music.chart = :songchart"
+        )
+        sql = f"""
+            SELECT (
+                SELECT COUNT(*) FROM score
+                WHERE score.musicid IN ({musicids}) AND (
+                    score.points > mine.points OR (
+                        score.points = mine.points AND (
+                            score.timestamp > mine.timestamp OR (
+                                score.timestamp = mine.timestamp AND score.id > mine.id
+                            )
+                        )
+                    )
+                ){self.__leaderboard_filter(userlist, location, userid)}
+            ) AS ahead
+            FROM (
+                SELECT score.id AS id, score.points AS points, score.timestamp AS timestamp
+                FROM score
+                WHERE score.musicid IN ({musicids}) AND score.userid = :include
+                ORDER BY score.points DESC, score.timestamp DESC, score.id DESC LIMIT 1
+            ) AS mine
+        """
+        cursor = self.execute(
+            sql,
+            {
+                "game": game.value,
+                "version": version,
+                "songid": songid,
+                "songchart": songchart,
+                "userlist": tuple(userlist) if userlist else (UserID(-1),),
+                "location": location,
+                "include": userid,
+            },
+        )
+        if cursor.rowcount != 1:
+            # User doesn't have a score on this chart
+            return None
+        result = cursor.mappings().fetchone()  # type: ignore
+        return result["ahead"] + 1
+
+    def get_score_neighbors(
+        self,
+        game: GameConstants,
+        version: Optional[int],
+        userid: UserID,
+        songid: int,
+        songchart: int,
+        distance: int,
+        userlist: Optional[List[UserID]] = None,
+        location: Optional[int] = None,
+    ) -> Optional[Tuple[int, List[Tuple[UserID, Score]]]]:
+        """
+        Look up the scores ranked around a user on a single chart's leaderboard.
+
+        Parameters:
+            game - Enum value representing a game series.
+            version - Integer representing which version of the game, or None to rank
+                      against scores from every version of the chart.
+            userid - Integer representing a user. Usually looked up with UserData.
+            songid - ID of the song according to the game.
+            songchart - Chart number according to the game.
+            distance - Number of scores to return on either side of the user's score.
+            userlist - If given, only rank against scores belonging to these users.
+            location - If given, only rank against scores earned on this machine.
+
+        Returns:
+            A tuple of the 1-based rank of the first returned score and a list of UserID, Score
+            objects in rank order, or None if the user has no score on this chart.
+        """
+        rank = self.get_score_rank(game, version, userid, songid, songchart, userlist, location)
+        if rank is None:
+            return None
+        offset = max(rank - 1 - distance, 0)
+        return (
+            offset + 1,
+            self.__get_leaderboard(
+                game,
+                version,
+                songid,
+                songchart,
+                rank + distance - offset,
+                offset,
+                userlist,
+                location,
+                userid,
+            ),
+        )
+
     def get_all_records(
         self,
         game: GameConstants,
@@ -923,6 +1223,48 @@ class MusicData(BaseData):
             ),
         )
 
+    def get_attempt_points(
+        self,
+        game: GameConstants,
+        version: int,
+        userlist: List[UserID],
+        since: int,
+        until: int,
+    ) -> Dict[UserID, int]:
+        """
+        Total up the points that each user earned within a time window, counting only their
+        best attempt on each song/chart.
+
+        Parameters:
+            game - Enum value representing a game series.
+            version - Integer representing which version of the game.
+            userlist - List of UserIDs to total points for.
+            since - Unix timestamp of the first attempt to count, inclusive.
+            until - Unix timestamp of the last attempt to count, inclusive.
+
+        Returns:
+            A dictionary of points keyed by UserID. Users without any attempts are omitted.
+        """
+        if not userlist:
+            return {}
+
+        sql = """
+            SELECT userid, SUM(points) AS points FROM (
+                SELECT userid, MAX(points) AS points FROM score_history
+                WHERE
+                    musicid IN (SELECT id FROM music WHERE game = :game AND version = :version) AND
+                    userid IN :userlist AND
+                    timestamp >= :since AND
+                    timestamp <= :until
+                GROUP BY userid, musicid
+            ) AS best GROUP BY userid
+        """
+        cursor = self.execute(
+            sql,
+            {"game": game.value, "version": version, "userlist": tuple(userlist), "since": since, "until": until},
+        )
+        return {UserID(result["userid"]): int(result["points"]) for result in cursor.mappings()}
+
     def get_all_attempts(
         self,
         game: GameConstants,
@@ -933,6 +1275,7 @@ class MusicData(BaseData):
         timelimit: Optional[int] = None,
         limit: Optional[int] = None,
         offset: Optional[int] = None,
+        before: Optional[Tuple[int, int]] = None,
     ) -> List[Tuple[Optional[UserID], Attempt]]:
         """
         Look up all of the attempts to score for a particular game.
@@ -940,6 +1283,10 @@ class MusicData(BaseData):
         Parameters:
             game - Enum value representing a game series.
             version - Integer representing which version of the game.
+            limit - If given, return at most this many attempts.
+            before - If given, a (timestamp, key) cursor taken from the last attempt of a previous
+                     call. Only attempts older than that one are returned, so that callers can page
+                     through attempts without the DB having to skip over every earlier page.
 
         Returns:
             A list of UserID, Attempt objects representing all score attempts for a game, sorted newest to oldest attempts.
@@ -983,7 +1330,9 @@ class MusicData(BaseData):
             sql = sql + " AND userid = :userid"
         if timelimit is not None:
             sql = sql + " AND timestamp >= :timestamp"
-        sql = sql + " ORDER BY timestamp DESC"
+        if before is not None:
+            sql = sql + " AND (timestamp < :beforets OR (timestamp = :beforets AND id < :beforeid))"
+        sql = sql + " ORDER BY timestamp DESC, id DESC"
         if limit is not None:
             sql = sql + " LIMIT :limit"
         if offset is not None:
@@ -1001,6 +1350,8 @@ class MusicData(BaseData):
                 "timestamp": timelimit,
                 "limit": limit,
                 "offset": offset,
+                "beforets": before[0] if before is not None else None,
+                "beforeid": before[1] if before is not None else None,
             },
         )
 
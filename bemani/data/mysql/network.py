@@ -1,12 +1,24 @@
+import atexit
+import threading
 from sqlalchemy import Table, Column, UniqueConstraint
+from sqlalchemy.orm import scoped_session
 from sqlalchemy.types import String, Integer, Text, JSON
 from sqlalchemy.dialects.mysql import BIGINT as BigInteger
-from typing import Optional, Dict, List, Tuple, Any
+from typing import Optional, Dict, List, Set, Tuple, Any
+from typing_extensions import Final
 
 from bemani.common import GameConstants, Time
+from bemani.data.config import Config
 from bemani.data.mysql.base import BaseData, metadata
 from bemani.data.types import News, Event, UserID, ArcadeID
 
+uwsgi: Any
+try:
+    # Only importable when running under uWSGI.
+    import uwsgi  # type: ignore
+except ImportError:
+    uwsgi = None
+
 """
 Table for storing network news, as edited by an admin. This is displayed
 on the front page of the frontend of the network.
@@ -56,7 +68,103 @@ audit = Table(
 )
 
 
+class EventBuffer:
+    """
+    A process-wide holding area for audit events that haven't been written to the DB yet.
+    Identical events (same type, user, arcade and data) that arrive while the buffer is
+    waiting to be flushed are collapsed into one entry with a repeat count, so a cabinet
+    spamming the same unhandled packet doesn't turn into thousands of rows.
+    """
+
+    def __init__(self, max_events: int = 100, max_age: int = 10) -> None:
+        """
+        Initialize the buffer.
+
+        Parameters:
+            max_events - Number of distinct pending events before the buffer should be flushed.
+            max_age - Number of seconds the oldest pending event can wait before the buffer
+                      should be flushed.
+        """
+        self.max_events = max_events
+        self.max_age = max_age
+        self.__lock = threading.Lock()
+        self.__pending: Dict[Tuple[str, Optional[UserID], Optional[ArcadeID], str], List[Any]] = {}
+        self.__oldest: Optional[int] = None
+        self.__atexit_registered = False
+
+    def add(
+        self,
+        event: str,
+        data: Dict[str, Any],
+        serialized: str,
+        timestamp: int,
+        userid: Optional[UserID],
+        arcadeid: Optional[ArcadeID],
+    ) -> None:
+        with self.__lock:
+            key = (event, userid, arcadeid, serialized)
+            if key in self.__pending:
+                # Keep the first occurrence's timestamp, just count the repeat.
+                self.__pending[key][2] += 1
+            else:
+                self.__pending[key] = [timestamp, dict(data), 1]
+            if self.__oldest is None:
+                self.__oldest = Time.now()
+
+    def due(self) -> bool:
+        with self.__lock:
+            if not self.__pending:
+                return False
+            return len(self.__pending) >= self.max_events or (
+                self.__oldest is not None and Time.now() - self.__oldest >= self.max_age
+            )
+
+    def drain(self) -> List[Tuple[str, Dict[str, Any], int, int, Optional[UserID], Optional[ArcadeID]]]:
+        """
+        Remove and return everything pending, as a list of event type, data, timestamp,
+        repeat count, userid and arcadeid tuples.
+        """
+        with self.__lock:
+            pending = self.__pending
+            self.__pending = {}
+            self.__oldest = None
+        return [
+            (event, entry[1], entry[0], entry[2], userid, arcadeid)
+            for (event, userid, arcadeid, _), entry in pending.items()
+        ]
+
+    def register_atexit(self, flush: Any) -> None:
+        # Make sure events buffered by an idle process get written out on a clean shutdown.
+        # uWSGI doesn't always run Python's atexit handlers when it recycles a worker, so
+        # chain onto its own exit callback as well.
+        with self.__lock:
+            if not self.__atexit_registered:
+                atexit.register(flush)
+                if uwsgi is not None:
+                    previous = getattr(uwsgi, "atexit", None)
+
+                    def on_exit() -> None:
+                        flush()
+                        if previous is not None:
+                            previous()
+
+                    uwsgi.atexit = on_exit
+                self.__atexit_registered = True
+
+
 class NetworkData(BaseData):
+    # Events of these types are always written immediately instead of being buffered, since
+    # they are read back by other requests (such as PASELI history) and must not be collapsed.
+    UNBUFFERED_EVENTS: Final[Set[str]] = {"paseli_transaction"}
+
+    # Shared across every NetworkData in this process so that repeated events can be collapsed
+    # across requests, not just within one.
+    event_buffer: EventBuffer = EventBuffer()
+
+    def __init__(self, config: Config, conn: scoped_session) -> None:
+        super().__init__(config, conn)
+        self.__config = config
+
     def get_all_news(self) -> List[News]:
         """
         Grab all news in the system.
@@ -251,19 +359,69 @@ class NetworkData(BaseData):
         userid: Optional[UserID] = None,
         arcadeid: Optional[ArcadeID] = None,
     ) -> None:
+        """
+        Record an audit event. Most events are buffered across requests and written in
+        batches by flush_events(), once enough have accumulated or the oldest has waited
+        long enough, or when the process exits.
+
+        Parameters:
+            event - The type of event.
+            data - A dictionary of data describing the event.
+            timestamp - Optional time the event occurred, defaulting to now.
+            userid - Optional user this event pertains to.
+            arcadeid - Optional arcade this event pertains to.
+        """
         if timestamp is None:
             timestamp = Time.now()
-        sql = "INSERT INTO audit (timestamp, userid, arcadeid, type, data) VALUES (:ts, :uid, :aid, :type, :data)"
-        self.execute(
-            sql,
-            {
-                "ts": timestamp,
-                "type": event,
-                "data": self.serialize(data),
-                "uid": userid,
-                "aid": arcadeid,
-            },
-        )
+
+        if event in self.UNBUFFERED_EVENTS or self.__config.database.read_only:
+            sql = "INSERT INTO audit (timestamp, userid, arcadeid, type, data) VALUES (:ts, :uid, :aid, :type, :data)"
+            self.execute(
+                sql,
+                {
+                    "ts": timestamp,
+                    "type": event,
+                    "data": self.serialize(data),
+                    "uid": userid,
+                    "aid": arcadeid,
+                },
+            )
+            return
+
+        self.event_buffer.add(event, data, self.serialize(data), timestamp, userid, arcadeid)
+        self.event_buffer.register_atexit(self.flush_events)
+        if self.event_buffer.due():
+            self.flush_events()
+
+    def flush_events(self, force: bool = True) -> None:
+        """
+        Write any buffered audit events to the DB in a single multi-row insert. Events
+        that were repeated while buffered get a 'repeats' count added to their data.
+
+        Parameters:
+            force - If False, only flush when the buffer is full or its oldest event is too old.
+        """
+        if not force and not self.event_buffer.due():
+            return
+
+        pending = self.event_buffer.drain()
+        if not pending:
+            return
+
+        values: List[str] = []
+        params: Dict[str, Any] = {}
+        for pos, (event, data, timestamp, repeats, userid, arcadeid) in enumerate(pending):
+            if repeats > 1:
+                data = {**data, "repeats": repeats}
+            values.append(f"(:ts{pos}, :uid{pos}, :aid{pos}, :type{pos}, :data{pos})")
+            params[f"ts{pos}"] = timestamp
+            params[f"uid{pos}"] = userid
+            params[f"aid{pos}"] = arcadeid
+            params[f"type{pos}"] = event
+            params[f"data{pos}"] = self.serialize(data)
+
+        sql = f"INSERT INTO audit (timestamp, userid, arcadeid, type, data) VALUES {', '.join(values)}"
+        self.execute(sql, params)
 
     def get_events(
         self,
@@ -274,6 +432,9 @@ class NetworkData(BaseData):
         since_id: Optional[int] = None,
         until_id: Optional[int] = None,
     ) -> List[Event]:
+        # Make sure we can see anything this process has buffered.
+        self.flush_events()
+
         # Base query
         sql = "SELECT id, timestamp, userid, arcadeid, type, data FROM audit "
 
@@ -327,3 +488,12 @@ class NetworkData(BaseData):
         """
         sql = "DELETE FROM audit WHERE timestamp < :ts"
         self.execute(sql, {"ts": oldest_event_ts})
+
+    def delete_expired_sessions(self) -> int:
+        """
+        Delete all user and arcade sessions that have expired.
+
+        Returns:
+            The number of sessions deleted.
+        """
+        return self._delete_expired_sessions()
@@ -1,16 +1,20 @@
+import json
 import random
-from sqlalchemy import Table, Column, UniqueConstraint
+from sqlalchemy import Table, Column, Index, UniqueConstraint
 from sqlalchemy.types import String, Integer, JSON
 from sqlalchemy.dialects.mysql import BIGINT as BigInteger
 from sqlalchemy.exc import IntegrityError
-from typing import Optional, Dict, List, Tuple, Any
+from sqlalchemy.orm import scoped_session
+from typing import Optional, Dict, List, Set, Tuple, Any, Iterable
 from typing_extensions import Final
 from passlib.hash import pbkdf2_sha512  # type: ignore
 
 from bemani.common import ValidatedDict, Profile, GameConstants, Time
+from bemani.data.config import Config
+from bemani.data.instrumentation import Instrumentation
 from bemani.data.mysql.base import BaseData, metadata
 from bemani.data.remoteuser import RemoteUser
-from bemani.data.types import User, Achievement, Link, UserID, ArcadeID
+from bemani.data.types import User, Achievement, Link, PaseliTransaction, UserID, ArcadeID
 
 """
 Table representing a user. Each user has a unique ID and a pin which
@@ -87,6 +91,7 @@ profile = Table(
     metadata,
     Column("refid", String(16), nullable=False, unique=True),
     Column("data", JSON, nullable=False),
+    Column("revision", Integer, nullable=False, server_default="0"),
     mysql_charset="utf8mb4",
 )
 
@@ -141,6 +146,27 @@ balance = Table(
     mysql_charset="utf8mb4",
 )
 
+"""
+Table for storing a ledger of every PASELI transaction, so that operator menus
+can summarize spending per machine without walking the audit log.
+"""
+paseli_ledger = Table(
+    "paseli_ledger",
+    metadata,
+    Column("id", Integer, nullable=False, primary_key=True),
+    Column("timestamp", Integer, nullable=False),
+    Column("userid", BigInteger(unsigned=True), nullable=False),
+    Column("arcadeid", Integer, nullable=False),
+    Column("pcbid", String(20)),
+    Column("delta", Integer, nullable=False),
+    Column("balance", Integer, nullable=False),
+    Column("service", Integer, nullable=False),
+    Column("reason", String(255)),
+    Index("arcadeid_pcbid_timestamp", "arcadeid", "pcbid", "timestamp"),
+    Index("userid_arcadeid_timestamp", "userid", "arcadeid", "timestamp"),
+    mysql_charset="utf8mb4",
+)
+
 """
 Table for storing links between two users in a game/version, whatever that
 may be. Typically used for rivals.
@@ -166,6 +192,25 @@ link = Table(
     mysql_charset="utf8mb4",
 )
 
+"""
+Table for indexing a handful of integer profile values, such as the arcade a
+user joined or their dan rank, so that games can find every user sharing a
+value without loading every profile. Rows are derived from the profile JSON
+and kept in sync by put_profile, so this should never be written directly.
+"""
+profile_index = Table(
+    "profile_index",
+    metadata,
+    Column("game", String(32), nullable=False),
+    Column("version", Integer, nullable=False),
+    Column("userid", BigInteger(unsigned=True), nullable=False),
+    Column("name", String(32), nullable=False),
+    Column("value", BigInteger, nullable=False),
+    UniqueConstraint("game", "version", "userid", "name", name="game_version_userid_name"),
+    Index("game_version_name_value", "game", "version", "name", "value"),
+    mysql_charset="utf8mb4",
+)
+
 
 class AccountCreationException(Exception):
     pass
@@ -174,6 +219,17 @@ class AccountCreationException(Exception):
 class UserData(BaseData):
     REF_ID_LENGTH: Final[int] = 16
 
+    # Integer profile keys that are mirrored into the profile_index table for each game.
+    # Adding a key here requires backfilling existing profiles with a migration.
+    INDEXED_PROFILE_KEYS: Final[Dict[GameConstants, List[str]]] = {
+        GameConstants.IIDX: ["shop_location", "sgrade", "dgrade"],
+        GameConstants.REFLEC_BEAT: ["lid"],
+    }
+
+    def __init__(self, config: Config, conn: scoped_session) -> None:
+        super().__init__(config, conn)
+        self.__config = config
+
     def from_cardid(self, cardid: str) -> Optional[UserID]:
         """
         Given a 16 digit card ID, look up a user ID.
@@ -208,7 +264,7 @@ class UserData(BaseData):
             User ID as an integer if found, or None if not.
         """
         sql = "SELECT id FROM user WHERE username = :username"
-        cursor = self.execute(sql, {"username": username})
+        cursor = self.execute(sql, {"username": username}, primary=True)
         if cursor.rowcount != 1:
             # Couldn't find this username
             return None
@@ -319,6 +375,58 @@ class UserData(BaseData):
             for result in cursor.mappings()
         ]
 
+    def search_users(
+        self,
+        username: Optional[str] = None,
+        cardid: Optional[str] = None,
+        limit: Optional[int] = None,
+        offset: int = 0,
+    ) -> Tuple[List[User], int]:
+        """
+        Look up a page of users, ordered by user ID, optionally filtered by the start of
+        their username or the start of the internal ID of any card they own.
+
+        Parameters:
+            username - Optional prefix that matching usernames must start with.
+            cardid - Optional prefix that the ID of one of a matching user's cards must start with.
+            limit - Optional maximum number of users to return.
+            offset - Number of matching users to skip before returning any.
+
+        Returns:
+            A tuple of a list of User objects, and the total number of matching users.
+        """
+        where = []
+        if username:
+            where.append("username LIKE :username")
+        if cardid:
+            where.append("id IN (SELECT userid FROM card WHERE id LIKE :cardid)")
+        condition = f" WHERE {' AND '.join(where)}" if where else ""
+        params = {
+            "username": self._prefix_pattern(username or ""),
+            "cardid": self._prefix_pattern(cardid or ""),
+            "limit": limit if limit is not None else 18446744073709551615,
+            "offset": offset,
+        }
+
+        cursor = self.execute(f"SELECT COUNT(*) AS count FROM user{condition}", params)
+        total = cursor.mappings().fetchone()["count"]  # type: ignore
+        cursor = self.execute(
+            f"SELECT id, username, email, admin FROM user{condition} ORDER BY id LIMIT :limit OFFSET :offset",
+            params,
+        )
+        return (
+            [
+                User(
+                    UserID(result["id"]),
+                    result["username"],
+                    result["email"],
+                    result["admin"] == 1,
+                )
+                for result in cursor.mappings()
+            ],
+            total,
+        )
+
     def get_all_usernames(self) -> List[str]:
         """
         Look up all valid usernames in the system.
@@ -333,6 +441,36 @@ class UserData(BaseData):
         cursor = self.execute(sql)
         return [res["username"] for res in cursor.mappings()]
 
+    def get_usernames(self, userids: Iterable[UserID]) -> Dict[UserID, Optional[str]]:
+        """
+        Given a list of user IDs, look up the username of each user.
+
+        Parameters:
+            userids - Integer user IDs, as looked up by one of the above functions.
+
+        Returns:
+            A dictionary keyed by user ID for every user that exists, with a username
+            or None if the user hasn't set up a web login.
+        """
+        return {UserID(userid): name for userid, name in self._get_names("user", "username", userids).items()}
+
+    def from_cardids(self, cardids: List[str]) -> Dict[str, UserID]:
+        """
+        Given a list of 16 digit card IDs, look up the user IDs of any that are registered.
+
+        Parameters:
+            cardids - 16-digit card IDs to look for.
+
+        Returns:
+            A dictionary keyed by upper-case card ID for every card that was found.
+        """
+        if not cardids:
+            return {}
+
+        sql = "SELECT id, userid FROM card WHERE id IN :ids"
+        cursor = self.execute(sql, {"ids": tuple(set(cardids))})
+        return {str(res["id"]).upper(): UserID(res["userid"]) for res in cursor.mappings()}
+
     def get_all_cards(self) -> List[Tuple[str, UserID]]:
         """
         Look up all cards associated with any account.
@@ -344,6 +482,37 @@ class UserData(BaseData):
         cursor = self.execute(sql)
         return [(str(res["id"]).upper(), UserID(res["userid"])) for res in cursor.mappings()]
 
+    def search_cards(
+        self,
+        cardid: Optional[str] = None,
+        limit: Optional[int] = None,
+        offset: int = 0,
+    ) -> Tuple[List[Tuple[str, UserID]], int]:
+        """
+        Look up a page of cards associated with any account, ordered by card ID and
+        optionally filtered by the start of the card ID. Note that this is the internal
+        card ID, not the card number printed on the card.
+
+        Parameters:
+            cardid - Optional prefix that matching internal card IDs must start with.
+            limit - Optional maximum number of cards to return.
+            offset - Number of matching cards to skip before returning any.
+
+        Returns:
+            A tuple of a list of card ID, user ID pairs, and the total number of matching cards.
+        """
+        condition = " WHERE id LIKE :cardid" if cardid else ""
+        params = {
+            "cardid": self._prefix_pattern(cardid or ""),
+            "limit": limit if limit is not None else 18446744073709551615,
+            "offset": offset,
+        }
+
+        cursor = self.execute(f"SELECT COUNT(*) AS count FROM card{condition}", params)
+        total = cursor.mappings().fetchone()["count"]  # type: ignore
+        cursor = self.execute(f"SELECT id, userid FROM card{condition} ORDER BY id LIMIT :limit OFFSET :offset", params)
+        return ([(str(res["id"]).upper(), UserID(res["userid"])) for res in cursor.mappings()], total)
+
     def get_cards(self, userid: UserID) -> List[str]:
         """
         Given a userid, look up all cards associated with the account.
@@ -358,6 +527,27 @@ class UserData(BaseData):
         cursor = self.execute(sql, {"userid": userid})
         return [str(res["id"]).upper() for res in cursor.mappings()]
 
+    def get_cards_for_users(self, userids: Iterable[UserID]) -> Dict[UserID, List[str]]:
+        """
+        Given a list of user IDs, look up all cards associated with each account.
+
+        Parameters:
+            userids - Integer user IDs, as looked up by one of the above functions.
+
+        Returns:
+            A dictionary keyed by user ID, with a list of card IDs for every user that has any.
+        """
+        userids = set(userids)
+        if not userids:
+            return {}
+
+        sql = "SELECT id, userid FROM card WHERE userid IN :userids ORDER BY id"
+        cursor = self.execute(sql, {"userids": tuple(userids)})
+        cards: Dict[UserID, List[str]] = {}
+        for res in cursor.mappings():
+            cards.setdefault(UserID(res["userid"]), []).append(str(res["id"]).upper())
+        return cards
+
     def add_card(self, userid: UserID, cardid: str) -> None:
         """
         Given a user ID and a card ID, link that card with that user.
@@ -419,6 +609,7 @@ class UserData(BaseData):
                 "userid": user.id,
             },
         )
+        self._invalidate_name("user", user.id)
 
     def validate_pin(self, userid: UserID, pin: str) -> bool:
         """
@@ -432,7 +623,7 @@ class UserData(BaseData):
             True if PIN is valid, False otherwise.
         """
         sql = "SELECT pin FROM user WHERE id = :userid"
-        cursor = self.execute(sql, {"userid": userid})
+        cursor = self.execute(sql, {"userid": userid}, primary=True)
         if cursor.rowcount != 1:
             # User doesn't exist, but we have a reference?
             return False
@@ -463,7 +654,7 @@ class UserData(BaseData):
             True if password is valid, False otherwise.
         """
         sql = "SELECT password FROM user WHERE id = :userid"
-        cursor = self.execute(sql, {"userid": userid})
+        cursor = self.execute(sql, {"userid": userid}, primary=True)
         if cursor.rowcount != 1:
             # User doesn't exist, but we have a reference?
             return False
@@ -489,6 +680,12 @@ class UserData(BaseData):
         sql = "UPDATE user SET password = :hash WHERE id = :userid"
         self.execute(sql, {"hash": passhash, "userid": userid})
 
+    def __format_profile(self, game: GameConstants, version: int, result: Any) -> Profile:
+        data = result["data"]
+        profile = Profile(game, version, result["refid"], result["extid"], self.deserialize(data))
+        profile.mark_stored(result["revision"], lambda: self.deserialize(data))
+        return profile
+
     def get_profile(self, game: GameConstants, version: int, userid: UserID) -> Optional[Profile]:
         """
         Given a game/version/userid, look up the associated profile.
@@ -502,7 +699,7 @@ class UserData(BaseData):
             A dictionary previously stored by a game class if found, or None otherwise.
         """
         sql = """
-            SELECT refid.refid AS refid, extid.extid AS extid, profile.data AS data
+            SELECT refid.refid AS refid, extid.extid AS extid, profile.data AS data, profile.revision AS revision
             FROM refid, extid, profile
             WHERE
                 refid.userid = :userid AND
@@ -518,13 +715,7 @@ class UserData(BaseData):
             return None
 
         result = cursor.mappings().fetchone()  # type: ignore
-        return Profile(
-            game,
-            version,
-            result["refid"],
-            result["extid"],
-            self.deserialize(result["data"]),
-        )
+        return self.__format_profile(game, version, result)
 
     def get_any_profile(self, game: GameConstants, version: int, userid: UserID) -> Optional[Profile]:
         """
@@ -554,8 +745,8 @@ class UserData(BaseData):
         self, game: GameConstants, version: int, userids: List[UserID]
     ) -> List[Tuple[UserID, Optional[Profile]]]:
         """
-        Does the exact same thing as get_any_profile but across a list of users instead of one.
-        Provided purely as a convenience function.
+        Does the exact same thing as get_any_profile but across a list of users instead of one,
+        using two queries regardless of how many users are requested.
 
         Parameters:
             game - Enum value identifier of the game looking up the user.
@@ -574,7 +765,7 @@ class UserData(BaseData):
             INNER JOIN profile ON refid.refid = profile.refid
             WHERE refid.game = :game AND refid.userid IN :userids
         """
-        cursor = self.execute(sql, {"game": game.value, "userids": userids})
+        cursor = self.execute(sql, {"game": game.value, "userids": tuple(userids)})
         profilever: Dict[UserID, int] = {}
 
         for result in cursor.mappings():
@@ -594,13 +785,40 @@ class UserData(BaseData):
                 elif profilever[tuid] != version:
                     profilever[tuid] = max(profilever[tuid], tver)
 
-        return [
-            (
-                uid,
-                self.get_profile(game, profilever[uid], uid) if uid in profilever else None,
-            )
-            for uid in userids
-        ]
+        if not profilever:
+            return [(uid, None) for uid in userids]
+
+        # Now, grab the chosen profile for every user in one go. Selecting by user and
+        # version separately can match versions we didn't choose for some users, so
+        # those rows are discarded below.
+        sql = """
+            SELECT refid.userid AS userid, refid.version AS version, refid.refid AS refid, extid.extid AS extid,
+                profile.data AS data, profile.revision AS revision
+            FROM refid, extid, profile
+            WHERE
+                refid.game = :game AND
+                refid.userid IN :userids AND
+                refid.version IN :versions AND
+                extid.userid = refid.userid AND
+                extid.game = refid.game AND
+                profile.refid = refid.refid
+        """
+        cursor = self.execute(
+            sql,
+            {
+                "game": game.value,
+                "userids": tuple(profilever.keys()),
+                "versions": tuple(set(profilever.values())),
+            },
+        )
+        profiles: Dict[UserID, Profile] = {}
+        for result in cursor.mappings():
+            tuid = UserID(result["userid"])
+            if profilever.get(tuid) != result["version"]:
+                continue
+            profiles[tuid] = self.__format_profile(game, result["version"], result)
+
+        return [(uid, profiles.get(uid)) for uid in userids]
 
     def get_games_played(self, userid: UserID, game: Optional[GameConstants] = None) -> List[Tuple[GameConstants, int]]:
         """
@@ -628,19 +846,23 @@ class UserData(BaseData):
         cursor = self.execute(sql, vals)
         return [(GameConstants(result["game"]), result["version"]) for result in cursor.mappings()]
 
-    def get_all_profiles(self, game: GameConstants, version: int) -> List[Tuple[UserID, Profile]]:
+    def get_all_profiles(
+        self, game: GameConstants, version: int, userlist: Optional[List[UserID]] = None
+    ) -> List[Tuple[UserID, Profile]]:
         """
         Given a game/version, look up all user profiles for that game.
 
         Parameters:
             game - Enum value identifier of the game we want all user profiles for.
             version - Integer version of the game we want all user profiles for.
+            userlist - List of UserIDs to limit the search to.
 
         Returns:
             A list of (UserID, dictionaries) previously stored by a game class for each profile.
         """
         sql = """
-            SELECT refid.userid AS userid, refid.refid AS refid, extid.extid AS extid, profile.data AS data
+            SELECT refid.userid AS userid, refid.refid AS refid, extid.extid AS extid, profile.data AS data,
+                profile.revision AS revision
             FROM refid, profile, extid
             WHERE
                 refid.game = :game AND
@@ -649,20 +871,17 @@ class UserData(BaseData):
                 extid.game = refid.game AND
                 extid.userid = refid.userid
         """
-        cursor = self.execute(sql, {"game": game.value, "version": version})
+        if userlist is not None:
+            if len(userlist) == 0:
+                return []
+            sql = sql + " AND refid.userid IN :userlist"
+        cursor = self.execute(
+            sql,
+            {"game": game.value, "version": version, "userlist": tuple(userlist) if userlist is not None else None},
+        )
 
         return [
-            (
-                UserID(result["userid"]),
-                Profile(
-                    game,
-                    version,
-                    result["refid"],
-                    result["extid"],
-                    self.deserialize(result["data"]),
-                ),
-            )
-            for result in cursor.mappings()
+            (UserID(result["userid"]), self.__format_profile(game, version, result)) for result in cursor.mappings()
         ]
 
     def get_all_players(self, game: GameConstants, version: int) -> List[UserID]:
@@ -739,6 +958,10 @@ class UserData(BaseData):
         """
         Given a game/version/userid, save an associated profile.
 
+        Profiles that were loaded from the DB are saved incrementally, writing only the top-level
+        keys that changed since they were loaded. If another writer saved the profile in the
+        meantime, the whole profile is written instead, as it would be for a new profile.
+
         Parameters:
             game - Enum value identifier of the game looking up the user.
             version - Integer version of the game looking up the user.
@@ -747,13 +970,19 @@ class UserData(BaseData):
         """
         refid = self.get_refid(game, version, userid)
 
-        # Add profile json to game profile
-        sql = """
-            INSERT INTO profile (refid, data)
-            VALUES (:refid, :json)
-            ON DUPLICATE KEY UPDATE data=VALUES(data)
-        """
-        self.execute(sql, {"refid": refid, "json": self.serialize(profile)})
+        written = self.__put_profile_changes(refid, profile)
+        if written is None:
+            # Add profile json to game profile
+            data = self.serialize(profile)
+            sql = """
+                INSERT INTO profile (refid, data, revision)
+                VALUES (:refid, :json, LAST_INSERT_ID(0))
+                ON DUPLICATE KEY UPDATE data=VALUES(data), revision=LAST_INSERT_ID(revision + 1)
+            """
+            cursor = self.execute(sql, {"refid": refid, "json": data})
+            profile.mark_stored(cursor.lastrowid, lambda: self.deserialize(data))
+            Instrumentation.count(self.__config, "profile.bytes_written", len(data))
+        self.__put_profile_index(game, version, userid, profile, written)
 
         # Update profile details just in case this was a new profile that was just saved.
         profile.game = game
@@ -762,6 +991,61 @@ class UserData(BaseData):
         if profile.extid == 0:
             profile.extid = self.get_extid(game, version, userid)
 
+    def __put_profile_changes(self, refid: str, profile: Profile) -> Optional[Set[str]]:
+        """
+        Save only the keys of a profile that changed since it was loaded.
+
+        Returns:
+            The set of keys that were written or removed if the profile is now saved, or
+            None if it needs to be written in full.
+        """
+        if profile.refid != refid or profile.revision is None:
+            # New profile, or one that was loaded for a different game/version/user.
+            return None
+        previous = profile.stored
+        dirty = profile.dirty_keys()
+        if dirty is None or previous is None:
+            return None
+        changed, removed = dirty
+        if not changed and not removed:
+            # Nothing to write at all.
+            Instrumentation.count(self.__config, "profile.writes_skipped")
+            return set()
+
+        # Every changed key is serialized once into a patch, and copied into place from there.
+        patch = self.serialize({key: profile[key] for key in changed})
+        params: Dict[str, Any] = {"refid": refid, "revision": profile.revision, "patch": patch}
+        expression = "data"
+        if changed:
+            paths = []
+            for pos, key in enumerate(sorted(changed)):
+                params[f"path{pos}"] = f"$.{json.dumps(key)}"
+                paths.append(f":path{pos}, JSON_EXTRACT(:patch, :path{pos})")
+            expression = f"JSON_SET({expression}, {', '.join(paths)})"
+        if removed:
+            paths = []
+            for pos, key in enumerate(sorted(removed)):
+                params[f"removed{pos}"] = f"$.{json.dumps(key)}"
+                paths.append(f":removed{pos}")
+            expression = f"JSON_REMOVE({expression}, {', '.join(paths)})"
+
+        sql = f"UPDATE profile SET data = {expression}, revision = revision + 1 WHERE refid = :refid AND revision = :revision"
+        cursor = self.execute(sql, params)
+        if cursor.rowcount != 1:
+            # Somebody else saved this profile since we loaded it.
+            Instrumentation.count(self.__config, "profile.write_conflicts")
+            return None
+
+        Instrumentation.count(self.__config, "profile.bytes_written", len(patch))
+
+        def stored() -> Dict[str, Any]:
+            data = {key: value for key, value in previous().items() if key not in removed}
+            data.update(self.deserialize(patch))
+            return data
+
+        profile.mark_stored(profile.revision + 1, stored)
+        return changed | removed
+
     def delete_profile(self, game: GameConstants, version: int, userid: UserID) -> None:
         """
         Given a game/version/userid, delete any associated profile.
@@ -776,6 +1060,73 @@ class UserData(BaseData):
         # Delete profile JSON to unlink the profile for this game/version.
         sql = "DELETE FROM profile WHERE refid = :refid LIMIT 1"
         self.execute(sql, {"refid": refid})
+        sql = "DELETE FROM profile_index WHERE game = :game AND version = :version AND userid = :userid"
+        self.execute(sql, {"game": game.value, "version": version, "userid": userid})
+
+    def __put_profile_index(
+        self,
+        game: GameConstants,
+        version: int,
+        userid: UserID,
+        profile: Profile,
+        written: Optional[Set[str]],
+    ) -> None:
+        keys = self.INDEXED_PROFILE_KEYS.get(game, [])
+        if written is not None:
+            # The profile was saved incrementally, so only the keys it wrote can have changed.
+            keys = [key for key in keys if key in written]
+        if not keys:
+            return
+
+        values = {key: profile.get_int(key) for key in keys if type(profile.get(key)) == int}
+        missing = [key for key in keys if key not in values]
+        if values:
+            rows: List[str] = []
+            params: Dict[str, Any] = {"game": game.value, "version": version, "userid": userid}
+            for pos, (name, value) in enumerate(values.items()):
+                rows.append(f"(:game, :version, :userid, :name{pos}, :value{pos})")
+                params[f"name{pos}"] = name
+                params[f"value{pos}"] = value
+            sql = f"""
+                INSERT INTO profile_index (game, version, userid, name, value)
+                VALUES {', '.join(rows)}
+                ON DUPLICATE KEY UPDATE value=VALUES(value)
+            """
+            self.execute(sql, params)
+        if missing:
+            sql = """
+                DELETE FROM profile_index
+                WHERE game = :game AND version = :version AND userid = :userid AND name IN :names
+            """
+            self.execute(sql, {"game": game.value, "version": version, "userid": userid, "names": tuple(missing)})
+
+    def get_indexed_users(self, game: GameConstants, version: int, name: str, values: Iterable[int]) -> List[UserID]:
+        """
+        Given a game/version and an indexed profile key, look up every user whose profile
+        has one of the given values for that key. Only keys listed in INDEXED_PROFILE_KEYS
+        can be looked up, and profiles missing the key entirely never match.
+
+        Parameters:
+            game - Enum value identifier of the game we want users for.
+            version - Integer version of the game we want users for.
+            name - The profile key to match on.
+            values - Integer values, any of which the profile key can equal.
+
+        Returns:
+            A list of user IDs whose profiles match.
+        """
+        if name not in self.INDEXED_PROFILE_KEYS.get(game, []):
+            raise Exception(f"Profile key {name} is not indexed for {game.value}!")
+        values = list(values)
+        if not values:
+            return []
+
+        sql = """
+            SELECT userid FROM profile_index
+            WHERE game = :game AND version = :version AND name = :name AND value IN :values
+        """
+        cursor = self.execute(sql, {"game": game.value, "version": version, "name": name, "values": tuple(values)})
+        return [UserID(result["userid"]) for result in cursor.mappings()]
 
     def get_achievement(
         self,
@@ -1201,10 +1552,29 @@ class UserData(BaseData):
         else:
             return 0
 
+    def get_balances(self, userid: UserID) -> Dict[ArcadeID, int]:
+        """
+        Given a user, look up the user's PASELI balance at every arcade they have one at.
+
+        Parameters:
+            userid - The user ID in question, as looked up by this class.
+
+        Returns:
+            A dictionary keyed by arcade ID. Arcades the user has never had a balance at
+            are left out, and should be treated as having a balance of zero.
+        """
+        sql = "SELECT arcadeid, balance FROM balance WHERE userid = :userid"
+        cursor = self.execute(sql, {"userid": userid})
+        return {ArcadeID(result["arcadeid"]): result["balance"] for result in cursor.mappings()}
+
     def update_balance(self, userid: UserID, arcadeid: ArcadeID, delta: int) -> Optional[int]:
         """
         Given a user and an arcade ID, update the PASELI balance for that arcade.
 
+        Debits are a single conditional update, so concurrent purchases can never take
+        a balance below zero or observe one that has. The new balance is handed back by
+        MySQL through LAST_INSERT_ID() so that no follow-up select is needed.
+
         Parameters:
             userid - The user ID in question, as looked up by this class.
             arcadeid - The arcade in question.
@@ -1213,18 +1583,221 @@ class UserData(BaseData):
         Returns:
             The new PASELI balance if successful, or None if there wasn't enough to apply the delta.
         """
+        if delta < 0:
+            sql = """
+                UPDATE balance SET balance = LAST_INSERT_ID(balance + :delta)
+                WHERE userid = :userid AND arcadeid = :arcadeid AND balance >= :amount
+            """
+            cursor = self.execute(sql, {"delta": delta, "amount": -delta, "userid": userid, "arcadeid": arcadeid})
+            if cursor.rowcount != 1:
+                # Not enough balance (or no balance at all) to cover this debit.
+                return None
+        else:
+            sql = """
+                INSERT INTO balance (userid, arcadeid, balance) VALUES (:userid, :arcadeid, LAST_INSERT_ID(:delta))
+                ON DUPLICATE KEY UPDATE balance = LAST_INSERT_ID(balance + :delta)
+            """
+            cursor = self.execute(sql, {"delta": delta, "userid": userid, "arcadeid": arcadeid})
+        return cursor.lastrowid
+
+    def put_paseli_transaction(
+        self,
+        userid: UserID,
+        arcadeid: ArcadeID,
+        delta: int,
+        balance: int,
+        service: int = 0,
+        pcbid: Optional[str] = None,
+        reason: Optional[str] = None,
+        timestamp: Optional[int] = None,
+    ) -> None:
+        """
+        Record a PASELI transaction in the ledger.
+
+        Parameters:
+            userid - The user ID whose balance changed.
+            arcadeid - The arcade the balance belongs to.
+            delta - The amount the balance changed by, negative for consumption.
+            balance - The balance after the change was applied.
+            service - Service units the game reported purchasing, if any.
+            pcbid - The PCBID of the machine making the transaction, or None for adjustments.
+            reason - Optional string describing the transaction.
+            timestamp - Optional time the transaction occurred, defaulting to now.
+        """
         sql = """
-            INSERT INTO balance (userid, arcadeid, balance) VALUES (:userid, :arcadeid, :delta)
-            ON DUPLICATE KEY UPDATE balance = balance + :delta
-        """
-        self.execute(sql, {"delta": delta, "userid": userid, "arcadeid": arcadeid})
-        newbalance = self.get_balance(userid, arcadeid)
-        if newbalance < 0:
-            # Went under while grabbing, put the balance back and return nothing
-            sql = "UPDATE balance SET balance = balance - :delta WHERE userid = :userid AND arcadeid = :arcadeid"
-            self.execute(sql, {"delta": delta, "userid": userid, "arcadeid": arcadeid})
-            return None
-        return newbalance
+            INSERT INTO paseli_ledger (timestamp, userid, arcadeid, pcbid, delta, balance, service, reason)
+            VALUES (:timestamp, :userid, :arcadeid, :pcbid, :delta, :balance, :service, :reason)
+        """
+        self.execute(
+            sql,
+            {
+                "timestamp": timestamp if timestamp is not None else Time.now(),
+                "userid": userid,
+                "arcadeid": arcadeid,
+                "pcbid": pcbid,
+                "delta": delta,
+                "balance": balance,
+                "service": service,
+                "reason": reason[:255] if reason is not None else None,
+            },
+        )
+
+    def __paseli_filter(self, pcbid: Optional[str], userid: Optional[UserID]) -> str:
+        sql = ""
+        if pcbid is not None:
+            sql += " AND pcbid = :pcbid"
+        if userid is not None:
+            sql += " AND userid = :userid"
+        return sql
+
+    def get_paseli_transactions(
+        self,
+        arcadeid: ArcadeID,
+        pcbid: Optional[str] = None,
+        userid: Optional[UserID] = None,
+        limit: Optional[int] = None,
+        offset: int = 0,
+    ) -> List[PaseliTransaction]:
+        """
+        Look up PASELI transactions for an arcade, newest first.
+
+        Parameters:
+            arcadeid - The arcade in question.
+            pcbid - Optional PCBID to restrict transactions to a single machine.
+            userid - Optional user ID to restrict transactions to a single user.
+            limit - Optional maximum number of transactions to return.
+            offset - Number of transactions to skip before returning any.
+
+        Returns:
+            A list of PaseliTransaction objects.
+        """
+        sql = (
+            "SELECT id, timestamp, userid, arcadeid, pcbid, delta, balance, service, reason FROM paseli_ledger "
+            f"WHERE arcadeid = :arcadeid{self.__paseli_filter(pcbid, userid)} "
+            "ORDER BY timestamp DESC, id DESC"
+        )
+        if limit is not None:
+            sql += " LIMIT :limit OFFSET :offset"
+        elif offset > 0:
+            # MySQL has no OFFSET without LIMIT, so use the largest possible limit.
+            sql += " LIMIT 18446744073709551615 OFFSET :offset"
+        cursor = self.execute(
+            sql,
+            {"arcadeid": arcadeid, "pcbid": pcbid, "userid": userid, "limit": limit, "offset": offset},
+        )
+        return [
+            PaseliTransaction(
+                result["id"],
+                result["timestamp"],
+                UserID(result["userid"]),
+                ArcadeID(result["arcadeid"]),
+                result["pcbid"],
+                result["delta"],
+                result["balance"],
+                result["service"],
+                result["reason"],
+            )
+            for result in cursor.mappings()
+        ]
+
+    def get_paseli_spend(
+        self,
+        arcadeid: ArcadeID,
+        start: int,
+        width: int,
+        count: int,
+        pcbid: Optional[str] = None,
+        userid: Optional[UserID] = None,
+    ) -> List[Tuple[int, int]]:
+        """
+        Sum up PASELI consumed at an arcade over a series of consecutive, equally
+        sized time buckets.
+
+        Parameters:
+            arcadeid - The arcade in question.
+            start - Unix timestamp of the start of the first bucket.
+            width - Number of seconds in each bucket.
+            count - Number of buckets.
+            pcbid - Optional PCBID to restrict transactions to a single machine.
+            userid - Optional user ID to restrict transactions to a single user.
+
+        Returns:
+            A list of count tuples, one per bucket starting at start, each containing
+            the amount consumed and the number of transactions in that bucket.
+        """
+        sql = (
+            "SELECT FLOOR((timestamp - :start) / :width) AS bucket, SUM(-delta) AS consumed, COUNT(*) AS transactions "
+            "FROM paseli_ledger "
+            f"WHERE arcadeid = :arcadeid AND timestamp >= :start AND timestamp < :end{self.__paseli_filter(pcbid, userid)} "
+            "GROUP BY bucket"
+        )
+        cursor = self.execute(
+            sql,
+            {
+                "arcadeid": arcadeid,
+                "pcbid": pcbid,
+                "userid": userid,
+                "start": start,
+                "width": width,
+                "end": start + (width * count),
+            },
+        )
+        buckets = [(0, 0)] * count
+        for result in cursor.mappings():
+            buckets[int(result["bucket"])] = (int(result["consumed"]), int(result["transactions"]))
+        return buckets
+
+    def get_paseli_spend_cycle(
+        self,
+        arcadeid: ArcadeID,
+        period: int,
+        width: int,
+        offset: int = 0,
+        pcbid: Optional[str] = None,
+        userid: Optional[UserID] = None,
+    ) -> Tuple[List[int], Optional[int]]:
+        """
+        Sum up all PASELI ever consumed at an arcade, folded onto a repeating period,
+        such as the hours of a day or the days of a week.
+
+        Parameters:
+            arcadeid - The arcade in question.
+            period - Number of seconds in the repeating period.
+            width - Number of seconds in each bucket of the period.
+            offset - Seconds to shift timestamps by before folding, so that bucket zero
+                     lines up with the start of the period (the unix epoch was a Thursday).
+            pcbid - Optional PCBID to restrict transactions to a single machine.
+            userid - Optional user ID to restrict transactions to a single user.
+
+        Returns:
+            A tuple of the amount consumed in each bucket of the period, and the timestamp
+            of the oldest transaction found or None if there were no transactions.
+        """
+        sql = (
+            "SELECT FLOOR(MOD(timestamp + :offset, :period) / :width) AS bucket, "
+            "SUM(-delta) AS consumed, MIN(timestamp) AS oldest "
+            "FROM paseli_ledger "
+            f"WHERE arcadeid = :arcadeid{self.__paseli_filter(pcbid, userid)} "
+            "GROUP BY bucket"
+        )
+        cursor = self.execute(
+            sql,
+            {
+                "arcadeid": arcadeid,
+                "pcbid": pcbid,
+                "userid": userid,
+                "offset": offset,
+                "period": period,
+                "width": width,
+            },
+        )
+        buckets = [0] * (period // width)
+        oldest: Optional[int] = None
+        for result in cursor.mappings():
+            buckets[int(result["bucket"])] = int(result["consumed"])
+            if oldest is None or result["oldest"] < oldest:
+                oldest = result["oldest"]
+        return buckets, oldest
 
     def get_refid(self, game: GameConstants, version: int, userid: UserID) -> str:
         """
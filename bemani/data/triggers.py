@@ -1,19 +1,232 @@
+import atexit
+import queue
+import threading
+import time
 from datetime import datetime
+from functools import partial
 from discord_webhook import DiscordWebhook, DiscordEmbed
-from typing import Dict
+from typing import Any, Dict, List, Optional, Tuple
 
 from bemani.common.constants import GameConstants, BroadcastConstants
 from bemani.data.config import Config
 from bemani.data.types import Song
 
+uwsgi: Any
+try:
+    # Only importable when running under uWSGI.
+    import uwsgi  # type: ignore
+except ImportError:
+    uwsgi = None
+
+
+class BroadcastQueue:
+    """
+    A bounded queue of webhook posts serviced by a single background worker thread. Game
+    handlers only ever enqueue, so a slow or unreachable outside service can never stall a
+    cabinet's request. Posts bound for the same URL that are queued together are sent as one
+    message with multiple embeds. Failed posts are retried with exponential backoff and then
+    dropped. If the queue is full, new posts are dropped rather than blocking the caller.
+
+    Under uWSGI the worker thread only gets to run if the server was started with threads
+    enabled (enable-threads = true, or threads greater than one). When it can't run, posts
+    are sent inline by the request that made them instead, so that nothing sits in a queue
+    that never drains.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 1000,
+        batchsize: int = 10,
+        retries: int = 3,
+        backoff: float = 1.0,
+        timeout: float = 10.0,
+        threaded: Optional[bool] = None,
+    ) -> None:
+        """
+        Initialize the queue. The worker thread is started lazily on first enqueue.
+
+        Parameters:
+            maxsize - Maximum number of posts waiting to be sent before we drop new ones.
+            batchsize - Maximum number of embeds to send in one message. Discord allows 10.
+            retries - Number of times to retry a failed post before giving up on it.
+            backoff - Seconds to wait before the first retry, doubling on every retry after.
+            timeout - Seconds to wait for the outside service to respond to a single post.
+            threaded - Whether to send from a worker thread. Defaults to whether the server
+                       we're running under lets background threads run.
+        """
+        self.batchsize = batchsize
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.threaded = threads_available() if threaded is None else threaded
+        self.__queue: "queue.Queue[Tuple[str, DiscordEmbed]]" = queue.Queue(maxsize)
+        self.__lock = threading.Lock()
+        self.__worker: Optional[threading.Thread] = None
+        self.__stats: Dict[str, int] = {
+            "queued": 0,
+            "sent": 0,
+            "batches": 0,
+            "retries": 0,
+            "failed": 0,
+            "dropped": 0,
+        }
+
+    def __count(self, stat: str, amount: int = 1) -> None:
+        with self.__lock:
+            self.__stats[stat] += amount
+
+    def start(self) -> None:
+        """
+        Start the background worker if it isn't already running.
+        """
+        with self.__lock:
+            if self.__worker is None or not self.__worker.is_alive():
+                self.__worker = threading.Thread(target=self.__run, name="broadcast-queue", daemon=True)
+                self.__worker.start()
+
+    def enqueue(self, url: str, embed: DiscordEmbed) -> bool:
+        """
+        Queue an embed to be posted to a webhook URL.
+
+        Returns:
+            True if the embed was queued, or False if it was dropped because the queue is full.
+        """
+        if not self.threaded:
+            # Nothing would ever drain the queue, so send it now.
+            self.__count("queued")
+            self.__send(url, [embed])
+            return True
+
+        try:
+            self.__queue.put_nowait((url, embed))
+        except queue.Full:
+            self.__count("dropped")
+            return False
+
+        self.__count("queued")
+        self.start()
+        return True
+
+    def flush(self, timeout: float) -> bool:
+        """
+        Wait for everything queued so far to be sent or given up on.
+
+        Returns:
+            True if the queue drained before the timeout, False otherwise.
+        """
+        end = time.monotonic() + timeout
+        with self.__queue.all_tasks_done:
+            while self.__queue.unfinished_tasks:
+                remaining = end - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self.__queue.all_tasks_done.wait(remaining)
+        return True
+
+    def close(self, timeout: float) -> None:
+        """
+        Give the worker a chance to drain the queue, and then send whatever it didn't get
+        to from the calling thread. Called when the process exits so that posts queued by
+        a worker that is being recycled aren't lost.
+        """
+        if self.__worker is not None and self.__worker.is_alive() and self.flush(timeout):
+            return
+
+        while True:
+            try:
+                url, embed = self.__queue.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                self.__send(url, [embed])
+            finally:
+                self.__queue.task_done()
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """
+        A snapshot of counters for queued, sent, retried, failed and dropped posts, as well as
+        the number of webhook messages sent and the current queue depth.
+        """
+        with self.__lock:
+            stats = dict(self.__stats)
+        stats["pending"] = self.__queue.qsize()
+        return stats
+
+    def __run(self) -> None:
+        while True:
+            batch = [self.__queue.get()]
+            while len(batch) < self.batchsize:
+                try:
+                    batch.append(self.__queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                byurl: Dict[str, List[DiscordEmbed]] = {}
+                for url, embed in batch:
+                    byurl.setdefault(url, []).append(embed)
+                for url, embeds in byurl.items():
+                    self.__send(url, embeds)
+            finally:
+                for _ in batch:
+                    self.__queue.task_done()
+
+    def __send(self, url: str, embeds: List[DiscordEmbed]) -> None:
+        for attempt in range(self.retries + 1):
+            if attempt > 0:
+                self.__count("retries")
+                time.sleep(self.backoff * (2 ** (attempt - 1)))
+
+            try:
+                webhook = DiscordWebhook(url=url, timeout=self.timeout)
+                for embed in embeds:
+                    webhook.add_embed(embed)
+                response = webhook.execute()
+            except Exception:
+                # Couldn't reach the service or it returned garbage, try again.
+                continue
+
+            if 200 <= response.status_code < 300:
+                self.__count("sent", len(embeds))
+                self.__count("batches")
+                return
+
+        self.__count("failed", len(embeds))
+
+
+def threads_available() -> bool:
+    """
+    Returns whether background threads started by this process will get to run. Under
+    uWSGI that only happens when threads are enabled in the server config, otherwise the
+    GIL is never released to them between requests.
+    """
+    if uwsgi is None:
+        return True
+
+    enabled = uwsgi.opt.get("enable-threads")
+    threads = uwsgi.opt.get("threads")
+    return bool(enabled) or (threads is not None and int(threads) > 1)
+
+
+# A single queue shared by every request in this process, since Triggers is recreated per request.
+broadcast_queue = BroadcastQueue()
+
+# Send anything still queued when the process shuts down cleanly. uWSGI doesn't always run
+# Python's atexit handlers when it recycles a worker, so hook its own exit callback as well.
+atexit.register(broadcast_queue.close, 5.0)
+if uwsgi is not None:
+    uwsgi.atexit = partial(broadcast_queue.close, 5.0)
+
 
 class Triggers:
     """
     Class for broadcasting data to some outside service
     """
 
-    def __init__(self, config: Config) -> None:
+    def __init__(self, config: Config, broadcasts: Optional[BroadcastQueue] = None) -> None:
         self.config = config
+        self.broadcasts = broadcasts if broadcasts is not None else broadcast_queue
 
     def __gameconst_to_series(self, game: GameConstants) -> str:
         return {
@@ -46,7 +259,6 @@ class Triggers:
         if game in {GameConstants.IIDX, GameConstants.POPN_MUSIC}:
             now = datetime.now()
 
-            webhook = DiscordWebhook(url=self.config.webhooks.discord[game])
             scoreembed = DiscordEmbed(title=f"New {self.__gameconst_to_series(game)} Score!", color="fbba08")
             scoreembed.set_footer(text=(now.strftime("Score was recorded on %m/%d/%y at %H:%M:%S")))
 
@@ -68,5 +280,4 @@ class Triggers:
                 }:
                     inline = False
                 scoreembed.add_embed_field(name=item.value, value=value, inline=inline)
-            webhook.add_embed(scoreembed)
-            webhook.execute()
+            self.broadcasts.enqueue(self.config.webhooks.discord[game], scoreembed)
@@ -378,6 +378,52 @@ class Event:
         return f"Event(auditid={self.id}, timestamp={self.timestamp}, userid={self.userid}, arcadeid={self.arcadeid}, event={self.type}, data={self.data})"
 
 
+class PaseliTransaction:
+    """
+    An object representing a single entry in the PASELI ledger, such as a game
+    consuming PASELI or an operator adjusting a user's balance.
+    """
+
+    def __init__(
+        self,
+        transactionid: int,
+        timestamp: int,
+        userid: UserID,
+        arcadeid: ArcadeID,
+        pcbid: Optional[str],
+        delta: int,
+        balance: int,
+        service: int,
+        reason: Optional[str],
+    ) -> None:
+        """
+        Initialize the transaction object.
+
+        Parameters:
+            transactionid - Integer identifier for the ledger entry.
+            timestamp - Integer representing unix timestamp of the transaction.
+            userid - User ID of the user whose balance changed.
+            arcadeid - Arcade ID of the arcade the balance belongs to.
+            pcbid - PCBID of the machine that made the transaction, or None for adjustments.
+            delta - Amount the balance changed by, negative for consumption.
+            balance - The balance after this transaction was applied.
+            service - Service units the game reported purchasing.
+            reason - Optional string describing the transaction.
+        """
+        self.id = transactionid
+        self.timestamp = timestamp
+        self.userid = userid
+        self.arcadeid = arcadeid
+        self.pcbid = pcbid
+        self.delta = delta
+        self.balance = balance
+        self.service = service
+        self.reason = reason
+
+    def __repr__(self) -> str:
+        return f"PaseliTransaction(transactionid={self.id}, timestamp={self.timestamp}, userid={self.userid}, arcadeid={self.arcadeid}, pcbid={self.pcbid}, delta={self.delta}, balance={self.balance}, service={self.service}, reason={self.reason})"
+
+
 class Item:
     """
     An object representing an item from the catalog for a game.
@@ -1,5 +1,5 @@
 import random
-from typing import Dict, Tuple, Any, Optional
+from typing import Dict, List, Set, Tuple, Any, Optional
 from flask import Blueprint, request, Response, render_template, url_for
 
 from bemani.backend.base import Base
@@ -10,7 +10,7 @@ from bemani.common import (
     RegionConstants,
     ValidatedDict,
 )
-from bemani.data import Arcade, Machine, User, UserID, News, Event, Server, Client
+from bemani.data import Arcade, ArcadeID, Machine, User, UserID, News, Event, Server, Client
 from bemani.data.api.client import APIClient, NotAuthorizedAPIException, APIException
 from bemani.frontend.app import (
     adminrequired,
@@ -37,12 +37,12 @@ admin_pages = Blueprint(
 )
 
 
-def format_arcade(arcade: Arcade) -> Dict[str, Any]:
-    owners = []
-    for owner in arcade.owners:
-        user = g.data.local.user.get_user(owner)
-        if user is not None:
-            owners.append(user.username)
+# How many cards, users or PCBIDs the admin pages show at once.
+PAGE_SIZE = 50
+
+
+def format_arcade(arcade: Arcade, usernames: Dict[UserID, Optional[str]]) -> Dict[str, Any]:
+    owners = [usernames[owner] for owner in arcade.owners if owner in usernames]
     return {
         "id": arcade.id,
         "name": arcade.name,
@@ -56,6 +56,11 @@ def format_arcade(arcade: Arcade) -> Dict[str, Any]:
     }
 
 
+def format_arcades(arcades: List[Arcade]) -> List[Dict[str, Any]]:
+    usernames = g.data.local.user.get_usernames(owner for arcade in arcades for owner in arcade.owners)
+    return [format_arcade(arcade, usernames) for arcade in arcades]
+
+
 def format_machine(machine: Machine) -> Dict[str, Any]:
     return {
         "id": machine.id,
@@ -69,21 +74,19 @@ def format_machine(machine: Machine) -> Dict[str, Any]:
     }
 
 
-def format_card(card: Tuple[str, Optional[UserID]]) -> Dict[str, Any]:
-    owner = None
-    if card[1] is not None:
-        user = g.data.local.user.get_user(card[1])
-        if user is not None:
-            owner = user.username
+def format_card(card: Tuple[str, Optional[UserID]], usernames: Dict[UserID, Optional[str]]) -> Dict[str, Any]:
+    owner = usernames.get(card[1]) if card[1] is not None else None
     try:
         return {
             "number": CardCipher.encode(card[0]),
+            "cardid": card[0],
             "owner": owner,
             "id": card[1],
         }
     except CardCipherException:
         return {
             "number": "????????????????",
+            "cardid": card[0],
             "owner": owner,
             "id": card[1],
         }
@@ -98,6 +101,102 @@ def format_user(user: User) -> Dict[str, Any]:
     }
 
 
+def card_prefix(search: str) -> Optional[str]:
+    # A complete card number as printed on the card can be looked up exactly, and anything
+    # else is taken as the start of the internal card ID, which the card list shows next to
+    # the printed number. A partial printed number can't be matched, since the printed
+    # number is an encoding of the whole ID. Returns None for searches that can't match.
+    search = search.replace(" ", "").replace("-", "").upper()
+    try:
+        return CardCipher.decode(search)
+    except CardCipherException:
+        pass
+    if any(c not in "0123456789ABCDEF" for c in search):
+        return None
+    return search
+
+
+def search_details() -> Tuple[str, int]:
+    # Search and paging details, sent with page loads and with changes to the list.
+    if request.method == "GET":
+        details: Dict[str, Any] = dict(request.args)
+    else:
+        details = request.get_json()
+    return str(details.get("search") or ""), max(int(details.get("offset") or 0), 0)
+
+
+def last_page(total: int) -> int:
+    # Removing the only entry on the last page leaves nothing to show, so callers step
+    # back to whatever is now the last page.
+    return max(((total - 1) // PAGE_SIZE) * PAGE_SIZE, 0)
+
+
+def card_page(search: str, offset: int) -> Dict[str, Any]:
+    cardid = card_prefix(search)
+    if cardid is None:
+        cards: List[Tuple[str, UserID]] = []
+        total = 0
+    else:
+        cards, total = g.data.local.user.search_cards(cardid=cardid, limit=PAGE_SIZE, offset=offset)
+        if not cards and offset > 0 and total > 0:
+            return card_page(search, last_page(total))
+    usernames = g.data.local.user.get_usernames(card[1] for card in cards)
+    return {
+        "cards": [format_card(card, usernames) for card in cards],
+        "total": total,
+        "offset": offset,
+    }
+
+
+def user_page(username: str, card: str, offset: int) -> Dict[str, Any]:
+    cardid = card_prefix(card) if card else None
+    if card and cardid is None:
+        users: List[User] = []
+        total = 0
+    else:
+        users, total = g.data.local.user.search_users(
+            username=username or None,
+            cardid=cardid,
+            limit=PAGE_SIZE,
+            offset=offset,
+        )
+        if not users and offset > 0 and total > 0:
+            return user_page(username, card, last_page(total))
+    return {
+        "users": [format_user(user) for user in users],
+        "total": total,
+        "offset": offset,
+    }
+
+
+def machine_page(search: str, offset: int) -> Dict[str, Any]:
+    machines, total = g.data.local.machine.search_machines(pcbid=search.upper() or None, limit=PAGE_SIZE, offset=offset)
+    if not machines and offset > 0 and total > 0:
+        return machine_page(search, last_page(total))
+    return {
+        "machines": [format_machine(machine) for machine in machines],
+        "total": total,
+        "offset": offset,
+    }
+
+
+def arcade_owners(owners: List[Optional[str]]) -> List[UserID]:
+    ownerids: Set[UserID] = set()
+    for owner in owners:
+        if not owner:
+            continue
+        ownerid = g.data.local.user.from_username(owner)
+        if ownerid is None:
+            raise Exception(f"Cannot find user '{owner}' to make an owner!")
+        ownerids.add(ownerid)
+    return list(ownerids)
+
+
+def user_balances(userid: UserID, arcades: List[Arcade]) -> Dict[ArcadeID, int]:
+    balances = g.data.local.user.get_balances(userid)
+    return {arcade.id: balances.get(arcade.id, 0) for arcade in arcades}
+
+
 def format_news(news: News) -> Dict[str, Any]:
     return {
         "id": news.id,
@@ -118,6 +217,25 @@ def format_event(event: Event) -> Dict[str, Any]:
     }
 
 
+def event_names(events: List[Event]) -> Dict[str, Any]:
+    # Only look up names for the users and arcades these events reference, so that
+    # polling for new events stays cheap no matter how large the network is.
+    userids: Set[UserID] = set()
+    arcadeids: Set[ArcadeID] = set()
+    for event in events:
+        if event.userid is not None:
+            userids.add(event.userid)
+        if event.arcadeid is not None:
+            arcadeids.add(event.arcadeid)
+        if isinstance(event.data.get("userid"), int):
+            userids.add(UserID(event.data["userid"]))
+
+    return {
+        "users": g.data.local.user.get_usernames(userids),
+        "arcades": g.data.local.machine.get_arcade_names(arcadeids),
+    }
+
+
 def format_client(client: Client) -> Dict[str, Any]:
     return {
         "id": client.id,
@@ -157,13 +275,13 @@ def viewevents() -> Response:
     iidx = IIDXFrontend(g.data, g.config, g.cache)
     jubeat = JubeatFrontend(g.data, g.config, g.cache)
     pnm = PopnMusicFrontend(g.data, g.config, g.cache)
+    events = g.data.local.network.get_events(limit=100)
     return render_react(
         "Events",
         "admin/events.react.js",
         {
-            "events": [format_event(event) for event in g.data.local.network.get_events(limit=100)],
-            "users": {user.id: user.username for user in g.data.local.user.get_all_users()},
-            "arcades": {arcade.id: arcade.name for arcade in g.data.local.machine.get_all_arcades()},
+            "events": [format_event(event) for event in events],
+            **event_names(events),
             "iidxsongs": iidx.get_all_songs(),
             "jubeatsongs": jubeat.get_all_songs(),
             "pnmsongs": pnm.get_all_songs(),
@@ -194,8 +312,10 @@ def viewevents() -> Response:
 @jsonify
 @adminrequired
 def backfillevents(until: int) -> Dict[str, Any]:
+    events = g.data.local.network.get_events(until_id=until, limit=1000)
     return {
-        "events": [format_event(event) for event in g.data.local.network.get_events(until_id=until, limit=1000)],
+        "events": [format_event(event) for event in events],
+        **event_names(events),
     }
 
 
@@ -203,10 +323,10 @@ def backfillevents(until: int) -> Dict[str, Any]:
 @jsonify
 @adminrequired
 def listevents(since: int) -> Dict[str, Any]:
+    events = g.data.local.network.get_events(since_id=since)
     return {
-        "events": [format_event(event) for event in g.data.local.network.get_events(since_id=since)],
-        "users": {user.id: user.username for user in g.data.local.user.get_all_users()},
-        "arcades": {arcade.id: arcade.name for arcade in g.data.local.machine.get_all_arcades()},
+        "events": [format_event(event) for event in events],
+        **event_names(events),
     }
 
 
@@ -239,9 +359,8 @@ def viewarcades() -> Response:
         "Arcades",
         "admin/arcades.react.js",
         {
-            "arcades": [format_arcade(arcade) for arcade in g.data.local.machine.get_all_arcades()],
+            "arcades": format_arcades(g.data.local.machine.get_all_arcades()),
             "regions": RegionConstants.LUT,
-            "usernames": g.data.local.user.get_all_usernames(),
             "paseli_enabled": g.config.paseli.enabled,
             "paseli_infinite": g.config.paseli.infinite,
             "default_region": g.config.server.region,
@@ -249,6 +368,7 @@ def viewarcades() -> Response:
             "mask_services_url": False,
         },
         {
+            "searchusernames": url_for("admin_pages.searchusernames"),
             "addarcade": url_for("admin_pages.addarcade"),
             "updatearcade": url_for("admin_pages.updatearcade"),
             "removearcade": url_for("admin_pages.removearcade"),
@@ -269,8 +389,9 @@ def viewmachines() -> Response:
         "Machines",
         "admin/machines.react.js",
         {
-            "machines": [format_machine(machine) for machine in g.data.local.machine.get_all_machines()],
+            **machine_page("", 0),
             "arcades": {arcade.id: arcade.name for arcade in g.data.local.machine.get_all_arcades()},
+            "page_size": PAGE_SIZE,
             "series": {
                 GameConstants.BISHI_BASHI.value: "BishiBashi",
                 GameConstants.DDR.value: "DDR",
@@ -302,10 +423,12 @@ def viewcards() -> Response:
         "Cards",
         "admin/cards.react.js",
         {
-            "cards": [format_card(card) for card in g.data.local.user.get_all_cards()],
-            "usernames": g.data.local.user.get_all_usernames(),
+            **card_page("", 0),
+            "page_size": PAGE_SIZE,
         },
         {
+            "listcards": url_for("admin_pages.listcards"),
+            "searchusernames": url_for("admin_pages.searchusernames"),
             "addcard": url_for("admin_pages.addcard"),
             "removecard": url_for("admin_pages.removecard"),
             "viewuser": url_for("admin_pages.viewuser", userid=-1),
@@ -313,6 +436,13 @@ def viewcards() -> Response:
     )
 
 
+@admin_pages.route("/cards/list")
+@jsonify
+@adminrequired
+def listcards() -> Dict[str, Any]:
+    return card_page(*search_details())
+
+
 @admin_pages.route("/users")
 @adminrequired
 def viewusers() -> Response:
@@ -320,7 +450,8 @@ def viewusers() -> Response:
         "Users",
         "admin/users.react.js",
         {
-            "users": [format_user(user) for user in g.data.local.user.get_all_users()],
+            **user_page("", "", 0),
+            "page_size": PAGE_SIZE,
         },
         {
             "searchusers": url_for("admin_pages.searchusers"),
@@ -386,7 +517,7 @@ def viewuser(userid: int) -> Response:
             },
             "cards": cards,
             "arcades": {arcade.id: arcade.name for arcade in arcades},
-            "balances": {arcade.id: g.data.local.user.get_balance(userid, arcade.id) for arcade in arcades},
+            "balances": user_balances(userid, arcades),
             "events": [
                 format_event(event)
                 for event in g.data.local.network.get_events(userid=userid, event="paseli_transaction")
@@ -423,7 +554,7 @@ def listuser(userid: int) -> Dict[str, Any]:
     return {
         "cards": cards,
         "arcades": {arcade.id: arcade.name for arcade in arcades},
-        "balances": {arcade.id: g.data.local.user.get_balance(userid, arcade.id) for arcade in arcades},
+        "balances": user_balances(userid, arcades),
         "events": [
             format_event(event) for event in g.data.local.network.get_events(userid=userid, event="paseli_transaction")
         ],
@@ -435,7 +566,7 @@ def listuser(userid: int) -> Dict[str, Any]:
 @adminrequired
 def listmachines() -> Dict[str, Any]:
     return {
-        "machines": [format_machine(machine) for machine in g.data.local.machine.get_all_machines()],
+        **machine_page(*search_details()),
         "arcades": {arcade.id: arcade.name for arcade in g.data.local.machine.get_all_arcades()},
     }
 
@@ -457,18 +588,12 @@ def updatearcade() -> Dict[str, Any]:
     arcade.data.replace_bool("paseli_enabled", new_values["paseli_enabled"])
     arcade.data.replace_bool("paseli_infinite", new_values["paseli_infinite"])
     arcade.data.replace_bool("mask_services_url", new_values["mask_services_url"])
-    owners = []
-    for owner in new_values["owners"]:
-        ownerid = g.data.local.user.from_username(owner)
-        if ownerid is not None:
-            owners.append(ownerid)
-    owners = list(set(owners))
-    arcade.owners = owners
+    arcade.owners = arcade_owners(new_values["owners"])
     g.data.local.machine.put_arcade(arcade)
 
     # Just return all arcades for ease of updating
     return {
-        "arcades": [format_arcade(arcade) for arcade in g.data.local.machine.get_all_arcades()],
+        "arcades": format_arcades(g.data.local.machine.get_all_arcades()),
     }
 
 
@@ -483,12 +608,7 @@ def addarcade() -> Dict[str, Any]:
         raise Exception("Please name your new arcade!")
     if len(new_values["description"]) == 0:
         raise Exception("Please describe your new arcade!")
-    owners = []
-    for owner in new_values["owners"]:
-        ownerid = g.data.local.user.from_username(owner)
-        if ownerid is not None:
-            owners.append(ownerid)
-    owners = list(set(owners))
+    owners = arcade_owners(new_values["owners"])
 
     g.data.local.machine.create_arcade(
         new_values["name"],
@@ -505,7 +625,7 @@ def addarcade() -> Dict[str, Any]:
 
     # Just return all arcades for ease of updating
     return {
-        "arcades": [format_arcade(arcade) for arcade in g.data.local.machine.get_all_arcades()],
+        "arcades": format_arcades(g.data.local.machine.get_all_arcades()),
     }
 
 
@@ -522,7 +642,7 @@ def removearcade() -> Dict[str, Any]:
 
     # Just return all arcades for ease of updating
     return {
-        "arcades": [format_arcade(arcade) for arcade in g.data.local.machine.get_all_arcades()],
+        "arcades": format_arcades(g.data.local.machine.get_all_arcades()),
     }
 
 
@@ -615,6 +735,8 @@ def queryserver(serverid: int) -> Dict[str, Any]:
             "status": "error",
         }
 
+    # Latency and error counters for this server, as seen by this process.
+    info["stats"] = APIClient.peer_stats().get(server.uri, {})
     return info
 
 
@@ -707,10 +829,8 @@ def generatepcbid() -> Dict[str, Any]:
 
     g.data.local.machine.create_machine(pcbid, name, new_pcbid["description"], new_pcbid["arcade"])
 
-    # Just return all machines for ease of updating
-    return {
-        "machines": [format_machine(machine) for machine in g.data.local.machine.get_all_machines()],
-    }
+    # Just return the page being looked at for ease of updating
+    return machine_page(*search_details())
 
 
 @admin_pages.route("/pcbids/add", methods=["POST"])
@@ -738,10 +858,8 @@ def addpcbid() -> Dict[str, Any]:
     name = "なし"
     g.data.local.machine.create_machine(potential_pcbid, name, new_pcbid["description"], new_pcbid["arcade"])
 
-    # Just return all machines for ease of updating
-    return {
-        "machines": [format_machine(machine) for machine in g.data.local.machine.get_all_machines()],
-    }
+    # Just return the page being looked at for ease of updating
+    return machine_page(*search_details())
 
 
 @admin_pages.route("/pcbids/update", methods=["POST"])
@@ -771,10 +889,8 @@ def updatepcbid() -> Dict[str, Any]:
     current_machine.version = None if machine["game"] == "any" else machine["version"]
     g.data.local.machine.put_machine(current_machine)
 
-    # Just return all machines for ease of updating
-    return {
-        "machines": [format_machine(machine) for machine in g.data.local.machine.get_all_machines()],
-    }
+    # Just return the page being looked at for ease of updating
+    return machine_page(*search_details())
 
 
 @admin_pages.route("/pcbids/remove", methods=["POST"])
@@ -788,10 +904,8 @@ def removepcbid() -> Dict[str, Any]:
 
     g.data.local.machine.destroy_machine(pcbid)
 
-    # Just return all machines for ease of updating
-    return {
-        "machines": [format_machine(machine) for machine in g.data.local.machine.get_all_machines()],
-    }
+    # Just return the page being looked at for ease of updating
+    return machine_page(*search_details())
 
 
 @admin_pages.route("/cards/remove", methods=["POST"])
@@ -811,10 +925,8 @@ def removecard() -> Dict[str, Any]:
     # Remove it from the user's account
     g.data.local.user.destroy_card(userid, cardid)
 
-    # Return new card list
-    return {
-        "cards": [format_card(card) for card in g.data.local.user.get_all_cards()],
-    }
+    # Return the page being looked at for ease of updating
+    return card_page(*search_details())
 
 
 @admin_pages.route("/cards/add", methods=["POST"])
@@ -841,38 +953,29 @@ def addcard() -> Dict[str, Any]:
     # Add it to the user's account
     g.data.local.user.add_card(userid, cardid)
 
-    # Return new card list
-    return {
-        "cards": [format_card(card) for card in g.data.local.user.get_all_cards()],
-    }
+    # Return the page being looked at for ease of updating
+    return card_page(*search_details())
 
 
 @admin_pages.route("/users/search", methods=["POST"])
 @jsonify
 @adminrequired
 def searchusers() -> Dict[str, Any]:
-    # Grab card, convert it
     searchdetails = request.get_json()["user_search"]
-    if len(searchdetails["card"]) > 0:
-        try:
-            cardid = CardCipher.decode(searchdetails["card"])
-            actual_userid = g.data.local.user.from_cardid(cardid)
-            if actual_userid is None:
-                # Force a non-match below
-                actual_userid = UserID(-1)
-        except CardCipherException:
-            actual_userid = UserID(-1)
-    else:
-        actual_userid = None
+    return user_page(
+        searchdetails.get("username", ""),
+        searchdetails.get("card", ""),
+        max(int(searchdetails.get("offset") or 0), 0),
+    )
 
-    def match(user: User) -> bool:
-        if actual_userid is not None:
-            return user.id == actual_userid
-        else:
-            return True
 
+@admin_pages.route("/users/usernames")
+@jsonify
+@adminrequired
+def searchusernames() -> Dict[str, Any]:
+    users, _ = g.data.local.user.search_users(username=request.args.get("search") or None, limit=20)
     return {
-        "users": [format_user(user) for user in g.data.local.user.get_all_users() if match(user)],
+        "usernames": [user.username for user in users if user.username is not None],
     }
 
 
@@ -895,6 +998,13 @@ def updatebalance(userid: int) -> Dict[str, Any]:
     for arcadeid in credits:
         balance = g.data.local.user.update_balance(userid, arcadeid, credits[arcadeid])
         if balance is not None:
+            g.data.local.user.put_paseli_transaction(
+                userid,
+                arcadeid,
+                credits[arcadeid],
+                balance,
+                reason="admin adjustment",
+            )
             g.data.local.network.put_event(
                 "paseli_transaction",
                 {
@@ -908,7 +1018,7 @@ def updatebalance(userid: int) -> Dict[str, Any]:
 
     return {
         "arcades": {arcade.id: arcade.name for arcade in arcades},
-        "balances": {arcade.id: g.data.local.user.get_balance(userid, arcade.id) for arcade in arcades},
+        "balances": user_balances(userid, arcades),
         "events": [
             format_event(event) for event in g.data.local.network.get_events(userid=userid, event="paseli_transaction")
         ],
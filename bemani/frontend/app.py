@@ -47,7 +47,7 @@ def before_request() -> None:
         # This is just serving cached compiled frontends, skip loading from DB
         return
 
-    g.data = Data(config)
+    g.data = Data(config, use_replica=True)
     g.sessionID = None
     g.userID = None
     try:
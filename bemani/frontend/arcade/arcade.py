@@ -198,6 +198,13 @@ def addbalance(arcadeid: int) -> Dict[str, Any]:
     # Update balance
     balance = g.data.local.user.update_balance(userid, arcadeid, credits)
     if balance is not None:
+        g.data.local.user.put_paseli_transaction(
+            userid,
+            arcadeid,
+            credits,
+            balance,
+            reason="arcade operator adjustment",
+        )
         g.data.local.network.put_event(
             "paseli_transaction",
             {
@@ -236,6 +243,13 @@ def updatebalance(arcadeid: int) -> Dict[str, Any]:
     for userid in credits:
         balance = g.data.local.user.update_balance(userid, arcadeid, credits[userid])
         if balance is not None:
+            g.data.local.user.put_paseli_transaction(
+                userid,
+                arcadeid,
+                credits[userid],
+                balance,
+                reason="arcade operator adjustment",
+            )
             g.data.local.network.put_event(
                 "paseli_transaction",
                 {
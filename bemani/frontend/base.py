@@ -1,11 +1,14 @@
 # vim: set fileencoding=utf-8
 import copy
+import random
 from abc import ABC
 from typing import Any, Dict, Iterator, List, Optional, Set, Tuple, cast
+from typing_extensions import Final
 
+from flask import abort
 from flask_caching import Cache
 
-from bemani.common import GameConstants, Profile, ValidatedDict, ID
+from bemani.common import GameConstants, Profile, ValidatedDict, ID, Time
 from bemani.data import Data, Config, Score, Attempt, Link, Song, UserID, RemoteUser
 
 
@@ -34,6 +37,28 @@ class FrontendBase(ABC):
     """
     valid_rival_types: List[str] = []
 
+    """
+    Number of attempts returned per page by the attempt list endpoints.
+    """
+    ATTEMPT_PAGE_SIZE: Final[int] = 100
+
+    """
+    How long a published song list generation stays cached. The scheduler publishes a new
+    generation every run, so this only needs to comfortably outlast the gap between runs.
+    """
+    SONG_CACHE_LIFETIME: Final[int] = Time.SECONDS_IN_DAY
+
+    """
+    How long a single request is given to rebuild a cold song list before another request
+    may try. Only one request can be elected across processes when the cache is shared
+    (such as memcached). With a per-process cache, each process elects its own.
+    """
+    SONG_CACHE_REBUILD_TIMEOUT: Final[int] = 30
+
+    # The last song list each game published or read in this process, served while a
+    # cold list is being rebuilt so that requests never wait on the rebuild.
+    __last_songs: Dict[GameConstants, Dict[int, Dict[str, Any]]] = {}
+
     def __init__(self, data: Data, config: Config, cache: Cache) -> None:
         self.data = data
         self.config = config
@@ -59,6 +84,7 @@ class FrontendBase(ABC):
 
     def format_attempt(self, userid: UserID, attempt: Attempt) -> Dict[str, Any]:
         return {
+            "id": attempt.key,
             "userid": str(userid),
             "songid": attempt.id,
             "chart": attempt.chart,
@@ -104,13 +130,7 @@ class FrontendBase(ABC):
         Override this to return an interator based on a game series factory.
         """
 
-    def get_all_songs(self, force_db_load: bool = False) -> Dict[int, Dict[str, Any]]:
-        if not force_db_load:
-            cached_songs = self.cache.get(f"{self.game.value}.sorted_songs")
-            if cached_songs is not None:
-                # Not sure why mypy insists that this is a str instead of Any.
-                return cast(Dict[int, Dict[str, Any]], cached_songs)
-
+    def __build_all_songs(self) -> Dict[int, Dict[str, Any]]:
         # Find all songs in the game, process notecounts and difficulties
         songs: Dict[int, Dict[str, Any]] = {}
         for song in self.data.local.music.get_all_songs(self.game, self.version):
@@ -121,10 +141,61 @@ class FrontendBase(ABC):
                 songs[song.id] = self.format_song(song)
             else:
                 songs[song.id] = self.merge_song(songs[song.id], song)
+        return songs
+
+    def __publish_all_songs(self) -> Dict[int, Dict[str, Any]]:
+        songs = self.__build_all_songs()
+        generation = f"{Time.now()}.{random.randint(0, 0xFFFFFFFF):08x}"
+        self.cache.set(f"{self.game.value}.songs.{generation}", songs, timeout=self.SONG_CACHE_LIFETIME)
 
-        self.cache.set(f"{self.game.value}.sorted_songs", songs, timeout=600)
+        # Only point readers at the new generation once it has been fully written, so
+        # nobody ever sees a half-built song list. The old generation simply expires.
+        self.cache.set(f"{self.game.value}.songs.generation", generation, timeout=0)
+        FrontendBase.__last_songs[self.game] = songs
         return songs
 
+    def __get_published_songs(self) -> Optional[Dict[int, Dict[str, Any]]]:
+        generation = self.cache.get(f"{self.game.value}.songs.generation")
+        if generation is None:
+            return None
+        # Not sure why mypy insists that this is a str instead of Any.
+        songs = cast(Optional[Dict[int, Dict[str, Any]]], self.cache.get(f"{self.game.value}.songs.{generation}"))
+        if songs is not None:
+            FrontendBase.__last_songs[self.game] = songs
+        return songs
+
+    def get_all_songs(self, force_db_load: bool = False) -> Dict[int, Dict[str, Any]]:
+        """
+        Look up every song in this game, formatted for the frontend. Song lists are built
+        by the scheduler and published as a new cache generation every time it runs, so
+        requests only ever read them. Pass force_db_load to build and publish a new generation.
+
+        If nothing is published, one request rebuilds the list while the rest are served this
+        process's last copy, or a 503 if there isn't one. Electing a single rebuilder across
+        processes requires a shared cache backend such as memcached.
+        """
+        if force_db_load:
+            return self.__publish_all_songs()
+
+        songs = self.__get_published_songs()
+        if songs is not None:
+            return songs
+
+        # Nothing has been published yet (or it expired without the scheduler running), so
+        # elect a single request to publish it.
+        if self.cache.add(f"{self.game.value}.songs.rebuild", True, timeout=self.SONG_CACHE_REBUILD_TIMEOUT):
+            try:
+                return self.__publish_all_songs()
+            finally:
+                self.cache.delete(f"{self.game.value}.songs.rebuild")
+
+        # Somebody else is rebuilding it. Rather than tie up this request waiting, serve the
+        # last copy this process saw, or ask the browser to come back shortly.
+        songs = FrontendBase.__last_songs.get(self.game)
+        if songs is not None:
+            return songs
+        abort(503, description="Song list is being rebuilt, try again shortly.")
+
     def get_all_player_info(
         self,
         userids: List[UserID],
@@ -181,13 +252,28 @@ class FrontendBase(ABC):
 
         return self.get_latest_player_info(list(userids))
 
-    def get_network_scores(self, limit: Optional[int] = None) -> Dict[str, Any]:
+    def parse_cursor(self, cursor: Optional[str]) -> Optional[Tuple[int, int]]:
+        """
+        Parse a "timestamp-id" cursor from the last attempt a client has, as handed to
+        the attempt list endpoints when paging back through older attempts.
+        """
+        if cursor is None:
+            return None
+        try:
+            timestamp, key = cursor.split("-", 1)
+            return (int(timestamp), int(key))
+        except ValueError:
+            return None
+
+    def get_network_scores(self, limit: Optional[int] = None, before: Optional[str] = None) -> Dict[str, Any]:
         userids: List[UserID] = []
 
-        # Find all attempts across all games
+        # Find all attempts across all games, newest first
         attempts = [
             attempt
-            for attempt in self.data.local.music.get_all_attempts(game=self.game, version=self.version, limit=limit)
+            for attempt in self.data.local.music.get_all_attempts(
+                game=self.game, version=self.version, limit=limit, before=self.parse_cursor(before)
+            )
             if attempt[0] is not None
         ]
         for attempt in attempts:
@@ -195,15 +281,7 @@ class FrontendBase(ABC):
                 userids.append(attempt[0])
 
         return {
-            "attempts": sorted(
-                [self.format_attempt(attempt[0], attempt[1]) for attempt in attempts],
-                reverse=True,
-                key=lambda attempt: (
-                    attempt["timestamp"],
-                    attempt["songid"],
-                    attempt["chart"],
-                ),
-            ),
+            "attempts": [self.format_attempt(attempt[0], attempt[1]) for attempt in attempts],
             "players": self.get_latest_player_info(userids),
         }
 
@@ -235,25 +313,19 @@ class FrontendBase(ABC):
             "players": self.get_latest_player_info(userids),
         }
 
-    def get_scores(self, userid: UserID, limit: Optional[int] = None) -> List[Dict[str, Any]]:
-        # Find all attempts across all games
+    def get_scores(
+        self, userid: UserID, limit: Optional[int] = None, before: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        # Find all attempts across all games, newest first
         attempts = [
             attempt
             for attempt in self.data.local.music.get_all_attempts(
-                game=self.game, version=self.version, userid=userid, limit=limit
+                game=self.game, version=self.version, userid=userid, limit=limit, before=self.parse_cursor(before)
             )
             if attempt[0] is not None
         ]
 
-        return sorted(
-            [self.format_attempt(None, attempt[1]) for attempt in attempts],
-            reverse=True,
-            key=lambda attempt: (
-                attempt["timestamp"],
-                attempt["songid"],
-                attempt["chart"],
-            ),
-        )
+        return [self.format_attempt(None, attempt[1]) for attempt in attempts]
 
     def get_records(self, userid: UserID) -> List[Dict[str, Any]]:
         records: Dict[str, Tuple[UserID, Score]] = {}
@@ -291,12 +363,14 @@ class FrontendBase(ABC):
         return [self.format_score(None, records[index][1]) for index in records]
 
     def get_top_scores(self, musicid: int) -> Dict[str, Any]:
-        scores = self.data.local.music.get_all_scores(game=self.game, version=self.version, songid=musicid)
+        # Only look up charts we support (no beginner chart support), already in rank order.
+        scores = [
+            score
+            for chart in self.valid_charts
+            for score in self.data.local.music.get_leaderboard(self.game, self.version, musicid, chart)
+        ]
         userids: List[UserID] = []
         for score in scores:
-            if score[1].chart not in self.valid_charts:
-                # No beginner chart support
-                continue
             if score[0] not in userids:
                 userids.append(score[0])
 
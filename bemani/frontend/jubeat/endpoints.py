@@ -23,9 +23,9 @@ jubeat_pages = Blueprint(
 @jubeat_pages.route("/scores")
 @loginrequired
 def viewnetworkscores() -> Response:
-    # Only load the last 100 results for the initial fetch, so we can render faster
+    # Only load the newest page of results for the initial fetch, older pages load on demand
     frontend = JubeatFrontend(g.data, g.config, g.cache)
-    network_scores = frontend.get_network_scores(limit=100)
+    network_scores = frontend.get_network_scores(limit=frontend.ATTEMPT_PAGE_SIZE)
     if len(network_scores["attempts"]) > 10:
         network_scores["attempts"] = frontend.round_to_ten(network_scores["attempts"])
 
@@ -53,7 +53,7 @@ def viewnetworkscores() -> Response:
 @loginrequired
 def listnetworkscores() -> Dict[str, Any]:
     frontend = JubeatFrontend(g.data, g.config, g.cache)
-    return frontend.get_network_scores()
+    return frontend.get_network_scores(limit=frontend.ATTEMPT_PAGE_SIZE, before=request.args.get("before"))
 
 
 @jubeat_pages.route("/scores/<int:userid>")
@@ -64,7 +64,7 @@ def viewscores(userid: UserID) -> Response:
     if info is None:
         abort(404)
 
-    scores = frontend.get_scores(userid, limit=100)
+    scores = frontend.get_scores(userid, limit=frontend.ATTEMPT_PAGE_SIZE)
     if len(scores) > 10:
         scores = frontend.round_to_ten(scores)
 
@@ -93,7 +93,7 @@ def viewscores(userid: UserID) -> Response:
 def listscores(userid: UserID) -> Dict[str, Any]:
     frontend = JubeatFrontend(g.data, g.config, g.cache)
     return {
-        "attempts": frontend.get_scores(userid),
+        "attempts": frontend.get_scores(userid, limit=frontend.ATTEMPT_PAGE_SIZE, before=request.args.get("before")),
         "players": {},
     }
 
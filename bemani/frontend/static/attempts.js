@@ -0,0 +1,37 @@
+// Helpers shared by the score list pages, which page back through attempts using a
+// "timestamp-id" cursor taken from the oldest attempt they have loaded so far.
+var Attempts = {
+    // Returns a function that merges pages of attempts by ID and sorts them newest first,
+    // breaking timestamp ties by ID the same way the server does.
+    merger: function() {
+        var mergehandler = new MergeManager(function(attempt) { return attempt.id; }, MergeManager.MERGE_POLICY_DROP);
+
+        return function(attempts) {
+            return mergehandler.add(attempts).sort(function(a, b) {
+                if (a.timestamp != b.timestamp) { return b.timestamp - a.timestamp; }
+                return b.id - a.id;
+            });
+        };
+    },
+
+    // Fetches the page of attempts older than the oldest one a score list component has,
+    // merging it into the component's attempts and players.
+    loadOlder: function(component, merge) {
+        var state = component.state;
+        if (state.loading || !state.more || state.attempts.length == 0) { return; }
+
+        var oldest = state.attempts[state.attempts.length - 1];
+        component.setState({loading: true});
+        AJAX.get(
+            Link.get('refresh') + '?before=' + oldest.timestamp + '-' + oldest.id,
+            function(response) {
+                component.setState({
+                    attempts: merge(response.attempts),
+                    players: Object.assign({}, component.state.players, response.players),
+                    loading: false,
+                    more: response.attempts.length > 0,
+                });
+            }
+        );
+    },
+};
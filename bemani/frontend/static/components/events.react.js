@@ -408,3 +408,32 @@ var DDRProfilePurge = createReactClass({
         );
     },
 });
+
+var ScheduledJobEvent = createReactClass({
+    render: function() {
+        var event = this.props.event;
+        return (
+            <tr key={event.id}>
+                <td><Timestamp timestamp={event.timestamp} /></td>
+                <td className={event.data.success ? 'scheduled' : 'exception'}>
+                    <div className="circle" />
+                    Scheduled Job
+                </td>
+                <td className="details">
+                    <div>
+                        <div className="inline">Job:</div>
+                        <pre className="inline">{event.data.job}</pre>
+                    </div>
+                    <div>
+                        <div className="inline">Duration:</div>
+                        <pre className="inline">{event.data.duration}s</pre>
+                    </div>
+                    <div>
+                        <div className="inline">Result:</div>
+                        <pre className="inline">{event.data.success ? 'Succeeded' : 'Failed'}</pre>
+                    </div>
+                </td>
+            </tr>
+        );
+    },
+});
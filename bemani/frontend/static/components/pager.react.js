@@ -0,0 +1,29 @@
+/** @jsx React.DOM */
+
+var Pager = createReactClass({
+    render: function() {
+        if (this.props.total <= this.props.pagesize && this.props.offset == 0) {
+            return null;
+        }
+
+        var first = this.props.total > 0 ? this.props.offset + 1 : 0;
+        var last = Math.min(this.props.offset + this.props.pagesize, this.props.total);
+        return (
+            <div className="pager">
+                { this.props.offset > 0 ?
+                    <Prev onClick={function(event) {
+                        var page = this.props.offset - this.props.pagesize;
+                        if (page < 0) { page = 0; }
+                        this.props.onChange(page);
+                    }.bind(this)}/> : null
+                }
+                <span className="placeholder">showing {first} to {last} of {this.props.total}</span>
+                { last < this.props.total ?
+                    <Next style={ {float: 'right'} } onClick={function(event) {
+                        this.props.onChange(this.props.offset + this.props.pagesize);
+                    }.bind(this)}/> : null
+                }
+            </div>
+        );
+    },
+});
@@ -1,27 +1,51 @@
 /** @jsx React.DOM */
 
 var SelectUser = createReactClass({
+    getInitialState: function(props) {
+        return {
+            suggestions: [],
+            listid: 'usernames' + Math.floor(Math.random() * 573573573),
+        };
+    },
+
+    lookupUsernames: function(search) {
+        // There can be far too many users to list them all, so suggest matching ones as we go.
+        AJAX.get(
+            Link.get('searchusernames') + '?' + $.param({search: search}),
+            function(response) {
+                this.setState({suggestions: response.usernames});
+            }.bind(this)
+        );
+    },
+
     render: function() {
         return (
-            <select
-                name={this.props.name}
-                disabled={this.props.disabled}
-                value={this.props.value ? this.props.value : "__NOBODY_VALUE__"}
-                onChange={function(event) {
-                    var owner = event.target.value;
-                    if (owner == "__NOBODY_VALUE__") {
-                        owner = null;
-                    }
-                    if (this.props.onChange) {
-                        this.props.onChange(owner);
-                    }
-                }.bind(this)}
-            >
-                <option className="placeholder" value="__NOBODY_VALUE__">nobody</option>
-                {this.props.usernames.map(function(username) {
-                    return <option value={username}>{ username }</option>;
-                }.bind(this))}
-            </select>
+            <>
+                <input
+                    type="text"
+                    name={this.props.name}
+                    disabled={this.props.disabled}
+                    placeholder="nobody"
+                    list={this.state.listid}
+                    value={this.props.value ? this.props.value : ''}
+                    onChange={function(event) {
+                        var owner = event.target.value;
+                        if (owner.length > 0) {
+                            this.lookupUsernames(owner);
+                        } else {
+                            owner = null;
+                        }
+                        if (this.props.onChange) {
+                            this.props.onChange(owner);
+                        }
+                    }.bind(this)}
+                />
+                <datalist id={this.state.listid}>
+                    {this.state.suggestions.map(function(username) {
+                        return <option value={username} />;
+                    }.bind(this))}
+                </datalist>
+            </>
         );
     },
 });
@@ -14,7 +14,6 @@ var card_management = createReactClass({
                 owners: [null],
             },
             arcades: window.arcades,
-            usernames: window.usernames,
             editing_arcade: null,
         };
     },
@@ -243,7 +242,6 @@ var card_management = createReactClass({
                             name="owner"
                             key={index}
                             value={ this.state.editing_arcade.owners[index] }
-                            usernames={ this.state.usernames }
                             onChange={function(owner) {
                                 var arcade = this.state.editing_arcade;
                                 if (owner) {
@@ -469,7 +467,6 @@ var card_management = createReactClass({
                                                         name="owner"
                                                         key={index}
                                                         value={ this.state.new_arcade.owners[index] }
-                                                        usernames={ this.state.usernames }
                                                         onChange={function(owner) {
                                                             var arcade = this.state.new_arcade;
                                                             if (owner) {
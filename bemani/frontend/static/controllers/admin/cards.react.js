@@ -4,7 +4,11 @@ var card_management = createReactClass({
     getInitialState: function(props) {
         return {
             cards: window.cards,
-            usernames: window.usernames,
+            total: window.total,
+            offset: window.offset,
+            search: '',
+            query: '',
+            searching: false,
             new_card: {
                 number: '',
                 owner: null,
@@ -12,16 +16,39 @@ var card_management = createReactClass({
         };
     },
 
+    loadCards: function(search, offset) {
+        this.setState({searching: true});
+        AJAX.get(
+            Link.get('listcards') + '?' + $.param({search: search, offset: offset}),
+            function(response) {
+                this.setState({
+                    cards: response.cards,
+                    total: response.total,
+                    offset: response.offset,
+                    query: search,
+                    searching: false,
+                });
+            }.bind(this)
+        );
+    },
+
+    searchCards: function(event) {
+        this.loadCards(this.state.search, 0);
+        event.preventDefault();
+    },
+
     addNewCard: function(event) {
         if (!this.state.new_card.owner) {
             Messages.error('You must select an owner for new cards!');
         } else {
             AJAX.post(
                 Link.get('addcard'),
-                {card: this.state.new_card},
+                {card: this.state.new_card, search: this.state.query, offset: this.state.offset},
                 function(response) {
                     this.setState({
                         cards: response.cards,
+                        total: response.total,
+                        offset: response.offset,
                         new_card: {
                             number: '',
                             owner: null,
@@ -46,10 +73,12 @@ var card_management = createReactClass({
                     action: function() {
                         AJAX.post(
                             Link.get('removecard'),
-                            {card: card},
+                            {card: card, search: this.state.query, offset: this.state.offset},
                             function(response) {
                                 this.setState({
                                     cards: response.cards,
+                                    total: response.total,
+                                    offset: response.offset,
                                 });
                             }.bind(this)
                         );
@@ -69,6 +98,14 @@ var card_management = createReactClass({
         return a.number.localeCompare(b.number);
     },
 
+    renderCardID: function(card) {
+        return <span>{ card.cardid }</span>;
+    },
+
+    sortCardID: function(a, b) {
+        return a.cardid.localeCompare(b.cardid);
+    },
+
     renderOwner: function(card) {
         if (card.owner) {
             return (
@@ -106,6 +143,27 @@ var card_management = createReactClass({
     render: function() {
         return (
             <div>
+                <div className="section">
+                    <h3>Card Search</h3>
+                    <form onSubmit={this.searchCards}>
+                        <label htmlFor="search">Full Card Number, or Start of Card ID:</label>
+                        <br />
+                        <input
+                            type="text"
+                            className="inline"
+                            value={this.state.search}
+                            onChange={function(event) {
+                                this.setState({search: event.target.value});
+                            }.bind(this)}
+                            name="search"
+                        />
+                        <input type="submit" value="search" />
+                        { this.state.searching ?
+                            <img className="loading" src={Link.get('static', window.assets + 'loading-16.gif')} /> :
+                            null
+                        }
+                    </form>
+                </div>
                 <div className="section">
                     <h3>All cards</h3>
                     <Table
@@ -116,6 +174,11 @@ var card_management = createReactClass({
                                 render: this.renderNumber,
                                 sort: this.sortNumber,
                             },
+                            {
+                                name: 'Card ID',
+                                render: this.renderCardID,
+                                sort: this.sortCardID,
+                            },
                             {
                                 name: 'Owner',
                                 render: this.renderOwner,
@@ -128,7 +191,15 @@ var card_management = createReactClass({
                             },
                         ]}
                         rows={this.state.cards}
-                        emptymessage="There are no cards in use on this network."
+                        emptymessage="There are no matching cards in use on this network."
+                    />
+                    <Pager
+                        offset={this.state.offset}
+                        total={this.state.total}
+                        pagesize={window.page_size}
+                        onChange={function(offset) {
+                            this.loadCards(this.state.query, offset);
+                        }.bind(this)}
                     />
                 </div>
                 <div className="section">
@@ -158,7 +229,6 @@ var card_management = createReactClass({
                                         <SelectUser
                                             name="owner"
                                             value={ this.state.new_card.owner }
-                                            usernames={ this.state.usernames }
                                             onChange={function(owner) {
                                                 var card = this.state.new_card;
                                                 card.owner = owner;
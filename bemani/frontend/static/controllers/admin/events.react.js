@@ -12,6 +12,7 @@ var possible_events = [
     'paseli_transaction',
     'pnm_course',
     'ddr_profile_purge',
+    'scheduled_job',
 ];
 
 var event_names = {
@@ -26,6 +27,7 @@ var event_names = {
     'pcbevent': 'PCB Events',
     'paseli_transaction': 'PASELI Transactions',
     'ddr_profile_purge': 'DDR Ace Profile Purge',
+    'scheduled_job': 'Scheduled Jobs',
 };
 
 var mergehandler = new MergeManager(function(evt) { return evt.id; }, MergeManager.MERGE_POLICY_DROP);
@@ -65,6 +67,8 @@ var audit_events = createReactClass({
             function(response) {
                 this.setState({
                     events: mergehandler.add(response.events),
+                    users: Object.assign({}, this.state.users, response.users),
+                    arcades: Object.assign({}, this.state.arcades, response.arcades),
                 });
                 // Keep loading until we grab all events
                 if (response.events.length > 0) {
@@ -84,8 +88,8 @@ var audit_events = createReactClass({
             function(response) {
                 this.setState({
                     events: mergehandler.add(response.events),
-                    users: response.users,
-                    arcades: response.arcades,
+                    users: Object.assign({}, this.state.users, response.users),
+                    arcades: Object.assign({}, this.state.arcades, response.arcades),
                 });
                 // Refresh every 15 seconds
                 setTimeout(this.refreshEvents, 5000);
@@ -184,6 +188,8 @@ var audit_events = createReactClass({
                                     return <PopnMusicCourseEvent event={event} versions={this.state.pnmversions} songs={this.state.pnmsongs} />;
                                 } else if(event.type == 'ddr_profile_purge') {
                                     return <DDRProfilePurge event={event} users={this.state.users} />;
+                                } else if(event.type == 'scheduled_job') {
+                                    return <ScheduledJobEvent event={event} />;
                                 } else {
                                     return <UnknownEvent event={event} />;
                                 }
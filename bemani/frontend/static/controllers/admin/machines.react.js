@@ -4,6 +4,11 @@ var machine_management = createReactClass({
     getInitialState: function(props) {
         return {
             machines: window.machines,
+            total: window.total,
+            offset: window.offset,
+            search: '',
+            query: '',
+            searching: false,
             arcades: window.arcades,
             editing_machine: null,
             add_machine: {
@@ -33,10 +38,12 @@ var machine_management = createReactClass({
 
     refreshMachines: function() {
         AJAX.get(
-            Link.get('refresh'),
+            Link.get('refresh') + '?' + $.param({search: this.state.query, offset: this.state.offset}),
             function(response) {
                 this.setState({
                     machines: response.machines,
+                    total: response.total,
+                    offset: response.offset,
                     arcade: response.arcades,
                 });
                 // Refresh every 5 seconds
@@ -45,13 +52,36 @@ var machine_management = createReactClass({
         );
     },
 
+    loadMachines: function(search, offset) {
+        this.setState({searching: true});
+        AJAX.get(
+            Link.get('refresh') + '?' + $.param({search: search, offset: offset}),
+            function(response) {
+                this.setState({
+                    machines: response.machines,
+                    total: response.total,
+                    offset: response.offset,
+                    query: search,
+                    searching: false,
+                });
+            }.bind(this)
+        );
+    },
+
+    searchMachines: function(event) {
+        this.loadMachines(this.state.search, 0);
+        event.preventDefault();
+    },
+
     generateNewMachine: function(event) {
         AJAX.post(
             Link.get('generatepcbid'),
-            {machine: this.state.random_pcbid},
+            {machine: this.state.random_pcbid, search: this.state.query, offset: this.state.offset},
             function(response) {
                 this.setState({
                     machines: response.machines,
+                    total: response.total,
+                    offset: response.offset,
                     random_pcbid: {
                         name: '',
                         description: '',
@@ -66,10 +96,12 @@ var machine_management = createReactClass({
     addNewMachine: function(event) {
         AJAX.post(
             Link.get('addpcbid'),
-            {machine: this.state.add_machine},
+            {machine: this.state.add_machine, search: this.state.query, offset: this.state.offset},
             function(response) {
                 this.setState({
                     machines: response.machines,
+                    total: response.total,
+                    offset: response.offset,
                     add_machine: {
                         pcbid: '',
                         name: '',
@@ -90,10 +122,12 @@ var machine_management = createReactClass({
 
         AJAX.post(
             Link.get('updatepcbid'),
-            {machine: this.state.editing_machine},
+            {machine: this.state.editing_machine, search: this.state.query, offset: this.state.offset},
             function(response) {
                 this.setState({
                     machines: response.machines,
+                    total: response.total,
+                    offset: response.offset,
                     editing_machine: null,
                 });
             }.bind(this)
@@ -114,10 +148,12 @@ var machine_management = createReactClass({
                     action: function() {
                         AJAX.post(
                             Link.get('removepcbid'),
-                            {pcbid: pcbid},
+                            {pcbid: pcbid, search: this.state.query, offset: this.state.offset},
                             function(response) {
                                 this.setState({
                                     machines: response.machines,
+                                    total: response.total,
+                                    offset: response.offset,
                                 });
                             }.bind(this)
                         );
@@ -443,6 +479,27 @@ var machine_management = createReactClass({
     render: function() {
         return (
             <div>
+                <div className="section">
+                    <h3>PCBID Search</h3>
+                    <form onSubmit={this.searchMachines}>
+                        <label htmlFor="search">PCBID:</label>
+                        <br />
+                        <input
+                            type="text"
+                            className="inline"
+                            value={this.state.search}
+                            onChange={function(event) {
+                                this.setState({search: event.target.value});
+                            }.bind(this)}
+                            name="search"
+                        />
+                        <input type="submit" value="search" />
+                        { this.state.searching ?
+                            <img className="loading" src={Link.get('static', window.assets + 'loading-16.gif')} /> :
+                            null
+                        }
+                    </form>
+                </div>
                 <div className="section">
                     <form className="inline" onSubmit={this.saveMachine}>
                         <Table
@@ -486,9 +543,17 @@ var machine_management = createReactClass({
                                 },
                             ]}
                             rows={this.state.machines}
-                            emptymessage="There are no PCBIDs assigned to this network."
+                            emptymessage="There are no matching PCBIDs assigned to this network."
                         />
                     </form>
+                    <Pager
+                        offset={this.state.offset}
+                        total={this.state.total}
+                        pagesize={window.page_size}
+                        onChange={function(offset) {
+                            this.loadMachines(this.state.query, offset);
+                        }.bind(this)}
+                    />
                 </div>
                 <div className="section">
                     <h3>Add PCBID</h3>
@@ -4,25 +4,39 @@ var card_management = createReactClass({
     getInitialState: function(props) {
         return {
             users: window.users,
+            total: window.total,
+            offset: window.offset,
             user_search: {
                 card: '',
+                username: '',
+            },
+            query: {
+                card: '',
+                username: '',
             },
             searching: false,
         };
     },
 
-    searchUsers: function(event) {
+    loadUsers: function(query, offset) {
         this.setState({searching: true});
         AJAX.post(
             Link.get('searchusers'),
-            {user_search: this.state.user_search},
+            {user_search: {card: query.card, username: query.username, offset: offset}},
             function(response) {
                 this.setState({
                     users: response.users,
+                    total: response.total,
+                    offset: response.offset,
+                    query: query,
                     searching: false,
                 });
             }.bind(this)
         );
+    },
+
+    searchUsers: function(event) {
+        this.loadUsers(jQuery.extend(true, {}, this.state.user_search), 0);
         event.preventDefault();
     },
 
@@ -75,7 +89,7 @@ var card_management = createReactClass({
                 <div className="section">
                     <h3>User Search</h3>
                     <form onSubmit={this.searchUsers}>
-                        <label htmlFor="card">Card Number:</label>
+                        <label htmlFor="card">Full Card Number, or Start of Card ID (as listed on the cards page):</label>
                         <br />
                         <input
                             type="text"
@@ -88,6 +102,20 @@ var card_management = createReactClass({
                             }.bind(this)}
                             name="card"
                         />
+                        <br />
+                        <label htmlFor="username">Username:</label>
+                        <br />
+                        <input
+                            type="text"
+                            className="inline"
+                            value={this.state.user_search.username}
+                            onChange={function(event) {
+                                var user = this.state.user_search;
+                                user.username = event.target.value;
+                                this.setState({user_search: user});
+                            }.bind(this)}
+                            name="username"
+                        />
                         <input type="submit" value="search" />
                         { this.state.searching ?
                             <img className="loading" src={Link.get('static', window.assets + 'loading-16.gif')} /> :
@@ -124,6 +152,14 @@ var card_management = createReactClass({
                         rows={this.state.users}
                         emptymessage="There are no users to display."
                     />
+                    <Pager
+                        offset={this.state.offset}
+                        total={this.state.total}
+                        pagesize={window.page_size}
+                        onChange={function(offset) {
+                            this.loadUsers(this.state.query, offset);
+                        }.bind(this)}
+                    />
                 </div>
             </div>
         );
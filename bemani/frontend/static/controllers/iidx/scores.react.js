@@ -1,13 +1,16 @@
 /*** @jsx React.DOM */
 
+var merge_attempts = Attempts.merger();
+
 var network_scores = createReactClass({
     getInitialState: function(props) {
         return {
             songs: window.songs,
-            attempts: window.attempts,
+            attempts: merge_attempts(window.attempts),
             players: window.players,
             versions: window.versions,
             loading: true,
+            more: true,
             offset: 0,
             limit: 10,
         };
@@ -18,12 +21,13 @@ var network_scores = createReactClass({
     },
 
     refreshScores: function() {
+        // Only the newest page is fetched, older pages are loaded as they're paged to
         AJAX.get(
             Link.get('refresh'),
             function(response) {
                 this.setState({
-                    attempts: response.attempts,
-                    players: response.players,
+                    attempts: merge_attempts(response.attempts),
+                    players: Object.assign({}, this.state.players, response.players),
                     loading: false,
                 });
                 // Refresh every 15 seconds
@@ -32,6 +36,10 @@ var network_scores = createReactClass({
         );
     },
 
+    loadOlderScores: function() {
+        Attempts.loadOlder(this, merge_attempts);
+    },
+
     convertChart: function(chart) {
         switch(chart) {
             case 0:
@@ -167,6 +175,10 @@ var network_scores = createReactClass({
                                     <Next style={ {float: 'right'} } onClick={function(event) {
                                          var page = this.state.offset + this.state.limit;
                                          if (page >= this.state.attempts.length) { return }
+                                         // Fetch the next page from the server before we run out
+                                         if (page + this.state.limit * 2 >= this.state.attempts.length) {
+                                             this.loadOlderScores();
+                                         }
                                          this.setState({offset: page});
                                     }.bind(this)}/> :
                                     this.state.loading ?
@@ -175,7 +187,11 @@ var network_scores = createReactClass({
                                                 className="loading"
                                                 src={Link.get('static', window.assets + 'loading-16.gif')}
                                             /> loading more scores...
-                                        </span> : null
+                                        </span> :
+                                    this.state.more ?
+                                        <Next style={ {float: 'right'} } onClick={function(event) {
+                                             this.loadOlderScores();
+                                        }.bind(this)}/> : null
                                 }
                             </td>
                         </tr>
@@ -24,6 +24,7 @@ class FakeCursor:
     def __init__(self, rows: List[Dict[str, Any]]) -> None:
         self.__rows = rows
         self.rowcount = len(rows)
+        self.lastrowid = 0
         self.pos = -1
 
     def mappings(self) -> "FakeCursor":
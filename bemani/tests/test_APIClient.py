@@ -1,10 +1,22 @@
 # vim: set fileencoding=utf-8
+import threading
+import time
 import unittest
+from typing import Any, Dict, List
+from unittest.mock import Mock, patch
+from freezegun import freeze_time
 
-from bemani.data.api.client import APIClient
+from bemani.common import APIConstants, GameConstants, cache
+from bemani.data.api.base import BaseGlobalData
+from bemani.data.api.client import APIClient, Peer
+from bemani.data.api.mirror import MirrorClient
+from bemani.data.types import Server
 
 
 class TestAPIClient(unittest.TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+
     def test_content_type(self) -> None:
         client = APIClient("https://127.0.0.1", "token", False, False)
         self.assertFalse(client._content_type_valid("application/text"))
@@ -18,3 +30,133 @@ class TestAPIClient(unittest.TestCase):
         self.assertTrue(client._content_type_valid("application/json;charset=UTF-8"))
         self.assertTrue(client._content_type_valid("application/json;charset = UTF-8"))
         self.assertTrue(client._content_type_valid("application/json; charset = UTF-8"))
+
+    def make_response(self, status: int, body: Dict[str, Any]) -> Mock:
+        response = Mock()
+        response.status_code = status
+        response.headers = {"content-type": "application/json; charset=utf-8"}
+        response.json = Mock(return_value=body)
+        return response
+
+    def test_circuit_breaker(self) -> None:
+        client = APIClient("https://breaker.example", "token", True, True)
+        session = Mock()
+        session.request = Mock(side_effect=Exception("Connection refused"))
+        APIClient.peer(client.base_uri).session = session
+
+        for _ in range(Peer.FAILURE_THRESHOLD + 2):
+            self.assertEqual(client.get_statistics(GameConstants.IIDX, 25, APIConstants.ID_TYPE_SERVER, []), [])
+
+        # Only the requests before the breaker tripped hit the network.
+        self.assertEqual(session.request.call_count, Peer.FAILURE_THRESHOLD)
+        stats = APIClient.peer_stats()[client.base_uri]
+        self.assertTrue(stats["open"])
+        self.assertEqual(stats["errors"], Peer.FAILURE_THRESHOLD)
+        self.assertEqual(stats["skipped"], 2)
+
+        # After the cooldown a single probe is let through, and success closes the breaker.
+        session.request = Mock(return_value=self.make_response(200, {"statistics": [{"song": "1"}]}))
+        with patch("bemani.data.api.client.time.monotonic", return_value=time.monotonic() + Peer.COOLDOWN + 1):
+            self.assertEqual(
+                client.get_statistics(GameConstants.IIDX, 25, APIConstants.ID_TYPE_SERVER, []),
+                [{"song": "1"}],
+            )
+            self.assertFalse(APIClient.peer_stats()[client.base_uri]["open"])
+
+    def test_stale_while_revalidate(self) -> None:
+        client = APIClient("https://stale.example", "token", True, True)
+        session = Mock()
+        session.request = Mock(return_value=self.make_response(200, {"catalog": {"songs": [1]}}))
+        APIClient.peer(client.base_uri).session = session
+
+        with freeze_time("2022-01-01 00:00:00"):
+            self.assertEqual(client.get_catalog(GameConstants.IIDX, 25), {"songs": [1]})
+            self.assertEqual(client.get_catalog(GameConstants.IIDX, 25), {"songs": [1]})
+            self.assertEqual(session.request.call_count, 1)
+
+        # Once expired, a failed refresh keeps serving the stale copy.
+        session.request = Mock(return_value=self.make_response(500, {"error": "oops"}))
+        with freeze_time("2022-01-01 02:00:00"):
+            self.assertEqual(client.get_catalog(GameConstants.IIDX, 25), {"songs": [1]})
+            self.assertEqual(session.request.call_count, 1)
+
+        # And a successful refresh replaces it.
+        session.request = Mock(return_value=self.make_response(200, {"catalog": {"songs": [2]}}))
+        with freeze_time("2022-01-01 02:00:01"):
+            self.assertEqual(client.get_catalog(GameConstants.IIDX, 25), {"songs": [2]})
+            self.assertEqual(client.get_catalog(GameConstants.IIDX, 25), {"songs": [2]})
+            self.assertEqual(session.request.call_count, 1)
+
+    def test_single_flight(self) -> None:
+        client = APIClient("https://flight.example", "token", True, True)
+        release = threading.Event()
+
+        def slow_request(*args: Any, **kwargs: Any) -> Mock:
+            release.wait(5)
+            return self.make_response(200, {"profile": [{"name": "REMOTE"}]})
+
+        session = Mock()
+        session.request = Mock(side_effect=slow_request)
+        APIClient.peer(client.base_uri).session = session
+
+        results: List[List[Dict[str, Any]]] = []
+
+        def fetch() -> None:
+            results.append(client.get_profiles(GameConstants.IIDX, 25, APIConstants.ID_TYPE_CARD, ["AAAA"]))
+
+        threads = [threading.Thread(target=fetch) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.1)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, [[{"name": "REMOTE"}]] * 5)
+        self.assertEqual(session.request.call_count, 1)
+
+    def test_single_flight_failure(self) -> None:
+        client = APIClient("https://malformed.example", "token", True, True)
+        release = threading.Event()
+
+        def slow_request(*args: Any, **kwargs: Any) -> Mock:
+            release.wait(5)
+            return self.make_response(200, {"unexpected": []})
+
+        session = Mock()
+        session.request = Mock(side_effect=slow_request)
+        APIClient.peer(client.base_uri).session = session
+
+        errors: List[Exception] = []
+
+        def fetch() -> None:
+            try:
+                client.get_profiles(GameConstants.IIDX, 25, APIConstants.ID_TYPE_CARD, ["AAAA"])
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=fetch) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.1)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        # A malformed response fails every waiting caller the same way, instead of handing
+        # them nothing.
+        self.assertEqual(len(errors), 5)
+        self.assertTrue(all(isinstance(e, KeyError) for e in errors))
+        self.assertEqual(session.request.call_count, 1)
+
+    def test_global_data_clients(self) -> None:
+        api = Mock()
+        api.get_all_servers = Mock(return_value=[Server(1, 0, "https://live.example", "token", True, True)])
+
+        # Without a mirror, game requests go through the cached live client.
+        clients = BaseGlobalData(api).clients
+        self.assertEqual([type(client) for client in clients], [APIClient])
+
+        # With one, they're answered out of the mirror instead.
+        clients = BaseGlobalData(api, Mock()).clients
+        self.assertEqual([type(client) for client in clients], [MirrorClient])
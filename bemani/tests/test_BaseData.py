@@ -1,8 +1,14 @@
 # vim: set fileencoding=utf-8
 import unittest
+from typing import Any, Dict, List, Tuple
 from unittest.mock import Mock
 
-from bemani.data.mysql.base import BaseData
+from sqlalchemy.exc import DBAPIError
+
+from bemani.common import Time, cache
+
+from bemani.data.mysql.base import BaseData, SessionCache
+from bemani.tests.helpers import FakeCursor
 
 
 class TestBaseData(unittest.TestCase):
@@ -46,3 +52,141 @@ class TestBaseData(unittest.TestCase):
         }
 
         self.assertEqual(data.deserialize(data.serialize(testdict)), testdict)
+
+    def test_transaction(self) -> None:
+        conn = Mock()
+        conn.info = {}
+        config = Mock()
+        config.database.read_only = False
+        config.instrumentation.enabled = False
+        data = BaseData(config, conn)
+
+        with data.transaction():
+            data.execute("UPDATE balance SET balance = 0")
+            with data.transaction():
+                data.execute("UPDATE balance SET balance = 1")
+            conn.commit.assert_not_called()
+        conn.commit.assert_called_once()
+
+        # Statements outside of a transaction commit immediately, and failures roll back.
+        data.execute("UPDATE balance SET balance = 2")
+        self.assertEqual(conn.commit.call_count, 2)
+
+        def fail() -> None:
+            with data.transaction():
+                data.execute("UPDATE balance SET balance = 3")
+                raise Exception("Failed!")
+
+        self.assertRaises(Exception, fail)
+        conn.rollback.assert_called_once()
+        self.assertEqual(conn.commit.call_count, 2)
+        self.assertEqual(conn.info["transaction_depth"], 0)
+
+    def test_replica(self) -> None:
+        conn = Mock()
+        replica = Mock()
+        conn.info = {"replica": replica}
+        config = Mock()
+        config.database.read_only = False
+        config.instrumentation.enabled = False
+        data = BaseData(config, conn)
+
+        # Reads go to the replica until something is written.
+        data.execute("SELECT * FROM user")
+        self.assertEqual(replica.execute.call_count, 1)
+        conn.execute.assert_not_called()
+
+        # Reads inside a transaction always use the primary.
+        with data.transaction():
+            data.execute("SELECT * FROM user")
+        self.assertEqual(conn.execute.call_count, 1)
+        self.assertEqual(replica.execute.call_count, 1)
+
+        # After a write, reads stick to the primary so they see it.
+        data.execute("UPDATE user SET name = 'NAME'")
+        data.execute("SELECT * FROM user")
+        self.assertEqual(conn.execute.call_count, 3)
+        self.assertEqual(replica.execute.call_count, 1)
+
+        # A failing replica falls back to the primary.
+        conn.info = {"replica": replica}
+        replica.execute.side_effect = DBAPIError("SELECT", {}, Exception("Gone away!"))
+        data.execute("SELECT * FROM user")
+        self.assertEqual(conn.execute.call_count, 4)
+        self.assertIsNone(conn.info["replica"])
+
+        # Lookups that must see writes from earlier requests can insist on the primary.
+        conn.info = {"replica": replica}
+        replica.execute.reset_mock(side_effect=True)
+        data.execute("SELECT * FROM session", primary=True)
+        self.assertEqual(conn.execute.call_count, 5)
+        replica.execute.assert_not_called()
+
+    def test_sessions(self) -> None:
+        BaseData.session_cache.clear()
+        cache.clear()
+        data = BaseData(Mock(), None)
+        queries: List[Tuple[str, Dict[str, Any]]] = []
+
+        def execute(
+            sql: str, params: Dict[str, Any], safe_write_operation: bool = False, primary: bool = False
+        ) -> FakeCursor:
+            queries.append((" ".join(sql.split()), params))
+            if sql.startswith("SELECT"):
+                # Sessions are often created by the previous request, so a replica may not have them yet.
+                self.assertTrue(primary)
+                return FakeCursor([{"id": 7, "expiration": params["timestamp"] + 3600}])
+            return FakeCursor([])
+
+        data.execute = execute  # type: ignore
+
+        # Creating a session is a single insert, and validating it afterwards needs no query.
+        session = data._create_session(5, "userid")
+        self.assertEqual(len(session), BaseData.SESSION_LENGTH)
+        self.assertEqual(len(queries), 1)
+        self.assertTrue(queries[0][0].startswith("INSERT INTO session"))
+        self.assertEqual(data._from_session(session, "userid"), 5)
+        self.assertEqual(len(queries), 1)
+        self.assertNotEqual(data._create_session(5, "userid"), session)
+
+        # Sessions from elsewhere are looked up once, then remembered.
+        self.assertEqual(data._from_session("0123456789ABCDEF0123456789ABCDEF", "arcadeid"), 7)
+        self.assertEqual(data._from_session("0123456789ABCDEF0123456789ABCDEF", "arcadeid"), 7)
+        self.assertEqual(len(queries), 3)
+
+        # Destroying a session forgets it.
+        data._destroy_session(session, "userid")
+        self.assertEqual(data._from_session(session, "userid"), 7)
+        self.assertEqual(queries[-1][1]["session"], session)
+
+        # Sessions destroyed by another process stop working here right away.
+        other = data._create_session(5, "userid")
+        self.assertEqual(data._from_session(other, "userid"), 5)
+        BaseData.session_cache.clear()
+        data._destroy_session(other, "userid")
+        BaseData.session_cache.put(other, "userid", 5, Time.now() + 3600)
+        self.assertIsNone(data._from_session(other, "userid"))
+        self.assertIsNone(BaseData.session_cache.get(other, "userid"))
+
+    def test_session_cache(self) -> None:
+        cache = SessionCache(2, 60)
+        cache.put("A", "userid", 1, Time.now() + 3600)
+        cache.put("B", "userid", 2, Time.now() - 1)
+        cache.put("C", "userid", 3, Time.now() + 3600)
+
+        # Expired sessions are never returned, and the oldest entries are evicted once full.
+        self.assertIsNone(cache.get("A", "userid"))
+        self.assertIsNone(cache.get("B", "userid"))
+        self.assertEqual(cache.get("C", "userid"), 3)
+        self.assertIsNone(cache.get("C", "arcadeid"))
+
+    def test_delete_expired_sessions(self) -> None:
+        data = BaseData(Mock(), None)
+        rowcounts = [BaseData.SESSION_SWEEP_BATCH, 5]
+
+        def execute(sql: str, params: Dict[str, Any], safe_write_operation: bool = False) -> Mock:
+            return Mock(rowcount=rowcounts.pop(0))
+
+        data.execute = execute  # type: ignore
+        self.assertEqual(data._delete_expired_sessions(), BaseData.SESSION_SWEEP_BATCH + 5)
+        self.assertEqual(rowcounts, [])
@@ -0,0 +1,66 @@
+# vim: set fileencoding=utf-8
+import unittest
+from unittest.mock import Mock
+from freezegun import freeze_time
+
+from bemani.common import GameConstants, Time, cache
+from bemani.data.cache.lobby import CachedLobbyData
+from bemani.data.types import UserID
+
+
+class TestCachedLobbyData(unittest.TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+
+    def test_lobby_roundtrip(self) -> None:
+        lobby = CachedLobbyData(Mock(), None)
+
+        self.assertIsNone(lobby.get_lobby(GameConstants.REFLEC_BEAT, 1, UserID(5)))
+        lobby.put_lobby(GameConstants.REFLEC_BEAT, 1, UserID(5), {"mid": 123, "id": 999})
+        lobby.put_lobby(GameConstants.REFLEC_BEAT, 1, UserID(6), {"mid": 456})
+        lobby.put_lobby(GameConstants.REFLEC_BEAT, 2, UserID(7), {"mid": 789})
+
+        first = lobby.get_lobby(GameConstants.REFLEC_BEAT, 1, UserID(5))
+        self.assertIsNotNone(first)
+        self.assertEqual(first.get_int("mid"), 123)
+        self.assertNotEqual(first.get_int("id"), 999)
+
+        # Updating an existing lobby keeps its ID.
+        lobby.put_lobby(GameConstants.REFLEC_BEAT, 1, UserID(5), {"mid": 124})
+        second = lobby.get_lobby(GameConstants.REFLEC_BEAT, 1, UserID(5))
+        self.assertEqual(second.get_int("id"), first.get_int("id"))
+        self.assertEqual(second.get_int("mid"), 124)
+
+        lobbies = lobby.get_all_lobbies(GameConstants.REFLEC_BEAT, 1)
+        self.assertEqual({uid for uid, _ in lobbies}, {UserID(5), UserID(6)})
+
+        # Destroying by ID only removes that lobby.
+        lobby.destroy_lobby(first.get_int("id"))
+        self.assertIsNone(lobby.get_lobby(GameConstants.REFLEC_BEAT, 1, UserID(5)))
+        lobbies = lobby.get_all_lobbies(GameConstants.REFLEC_BEAT, 1)
+        self.assertEqual([uid for uid, _ in lobbies], [UserID(6)])
+
+    def test_play_session_expiry(self) -> None:
+        lobby = CachedLobbyData(Mock(), None)
+
+        with freeze_time("2016-01-01 12:00"):
+            lobby.put_play_session_info(GameConstants.REFLEC_BEAT, 1, UserID(5), {"status": 1})
+            info = lobby.get_play_session_info(GameConstants.REFLEC_BEAT, 1, UserID(5))
+            self.assertEqual(info.get_int("status"), 1)
+            self.assertEqual(info.get_int("time"), Time.now())
+            self.assertEqual(len(lobby.get_all_play_session_infos(GameConstants.REFLEC_BEAT, 1)), 1)
+
+        with freeze_time("2016-01-01 13:30"):
+            self.assertIsNone(lobby.get_play_session_info(GameConstants.REFLEC_BEAT, 1, UserID(5)))
+            self.assertEqual(lobby.get_all_play_session_infos(GameConstants.REFLEC_BEAT, 1), [])
+
+    def test_destroy_play_session(self) -> None:
+        lobby = CachedLobbyData(Mock(), None)
+
+        lobby.put_play_session_info(GameConstants.REFLEC_BEAT, 1, UserID(5), {"status": 1})
+        lobby.put_play_session_info(GameConstants.REFLEC_BEAT, 1, UserID(6), {"status": 2})
+        lobby.destroy_play_session_info(GameConstants.REFLEC_BEAT, 1, UserID(5))
+
+        self.assertIsNone(lobby.get_play_session_info(GameConstants.REFLEC_BEAT, 1, UserID(5)))
+        infos = lobby.get_all_play_session_infos(GameConstants.REFLEC_BEAT, 1)
+        self.assertEqual([uid for uid, _ in infos], [UserID(6)])
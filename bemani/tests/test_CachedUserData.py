@@ -0,0 +1,114 @@
+# vim: set fileencoding=utf-8
+import unittest
+from typing import Any, Dict, List
+from unittest.mock import Mock, patch
+
+from bemani.common import GameConstants, Time, cache
+from bemani.data.cache.user import CachedUserData, LocalProfileStore
+from bemani.data.instrumentation import Instrumentation
+from bemani.data.types import UserID
+
+
+class TestCachedUserData(unittest.TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        CachedUserData.local_store = None
+
+    def make_user(self, backend: str) -> CachedUserData:
+        config = Mock()
+        config.profile_cache.backend = backend
+        config.profile_cache.size = 2
+        config.instrumentation.enabled = True
+        user = CachedUserData(config, None)
+        self.revision = 3
+        self.queries: List[str] = []
+
+        def execute(sql: str, params: Dict[str, Any], primary: bool = False) -> Mock:
+            self.queries.append(" ".join(sql.split()))
+            if sql.startswith("UPDATE profile"):
+                self.revision += 1
+            cursor = Mock(rowcount=1, lastrowid=0)
+            cursor.mappings.return_value.fetchone.return_value = {
+                "refid": "0123456789ABCDEF",
+                "extid": 12345678,
+                "data": '{"name": "TEST", "list": [1, 2]}',
+                "revision": self.revision,
+            }
+            return cursor
+
+        user.execute = execute  # type: ignore
+        user.get_refid = Mock(return_value="0123456789ABCDEF")  # type: ignore
+        return user
+
+    def test_read_through(self) -> None:
+        for backend in ["local", "cache"]:
+            user = self.make_user(backend)
+            before = Instrumentation.counters()
+
+            profile = user.get_profile(GameConstants.IIDX, 25, UserID(5))
+            self.assertEqual(len(self.queries), 1)
+            profile.get_int_array("list", 2).append(3)
+
+            # The second load comes from the cache, unaffected by changes to the first. Locally
+            # cached profiles only need their revision checked.
+            again = user.get_profile(GameConstants.IIDX, 25, UserID(5))
+            if backend == "local":
+                self.assertEqual(self.queries[1], "SELECT revision FROM profile WHERE refid = :refid")
+                self.assertEqual(len(self.queries), 2)
+            else:
+                self.assertEqual(len(self.queries), 1)
+            self.assertEqual(again.get_str("name"), "TEST")
+            self.assertEqual(again.get_int_array("list", 2), [1, 2])
+            self.assertEqual(again.revision, 3)
+            self.assertEqual(again.extid, 12345678)
+
+            counters = Instrumentation.counters()
+            self.assertEqual(counters["profile_cache.hits"] - before.get("profile_cache.hits", 0), 1)
+            self.assertEqual(counters["profile_cache.misses"] - before.get("profile_cache.misses", 0), 1)
+
+            # Saves write through, only writing what changed against the cached copy.
+            again.replace_str("name", "NEW")
+            count = len(self.queries)
+            user.put_profile(GameConstants.IIDX, 25, UserID(5), again)
+            self.assertTrue(self.queries[count].startswith("UPDATE profile SET data = JSON_SET"))
+            third = user.get_profile(GameConstants.IIDX, 25, UserID(5))
+            self.assertEqual(third.get_str("name"), "NEW")
+            self.assertEqual(third.revision, 4)
+
+            # Deleting the profile invalidates it.
+            count = len(self.queries)
+            user.delete_profile(GameConstants.IIDX, 25, UserID(5))
+            user.get_profile(GameConstants.IIDX, 25, UserID(5))
+            self.assertTrue(any(q.startswith("SELECT refid.refid") for q in self.queries[count:]))
+
+    def test_local_stale(self) -> None:
+        user = self.make_user("local")
+        user.get_profile(GameConstants.IIDX, 25, UserID(5))
+
+        # Another process saved the profile, so our copy is thrown away and loaded again.
+        self.revision = 4
+        before = Instrumentation.counters()
+        profile = user.get_profile(GameConstants.IIDX, 25, UserID(5))
+        self.assertEqual(profile.revision, 4)
+        self.assertTrue(self.queries[-1].startswith("SELECT refid.refid"))
+        counters = Instrumentation.counters()
+        self.assertEqual(counters["profile_cache.stale"] - before.get("profile_cache.stale", 0), 1)
+        self.assertEqual(counters.get("profile_cache.hits", 0), before.get("profile_cache.hits", 0))
+
+        # Entries also expire on their own.
+        store = LocalProfileStore(2, 60)
+        store.set("a", ("A", 1, 0, {}))
+        with patch("bemani.common.Time.now", return_value=Time.now() + 61):
+            self.assertIsNone(store.get("a"))
+
+    def test_lru(self) -> None:
+        store = LocalProfileStore(2, 60)
+        store.set("a", ("A", 1, 0, {}))
+        store.set("b", ("B", 2, 0, {}))
+        self.assertIsNotNone(store.get("a"))
+        store.set("c", ("C", 3, 0, {}))
+
+        # The least recently used entry is evicted.
+        self.assertIsNone(store.get("b"))
+        self.assertIsNotNone(store.get("a"))
+        self.assertIsNotNone(store.get("c"))
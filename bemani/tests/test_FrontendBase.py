@@ -0,0 +1,101 @@
+# vim: set fileencoding=utf-8
+import unittest
+from typing import Any, Dict, List
+from unittest.mock import Mock
+
+from werkzeug.exceptions import ServiceUnavailable
+
+from bemani.common import GameConstants, cache
+from bemani.data import Song, UserID
+from bemani.data.mysql.music import MusicData
+from bemani.tests.helpers import FakeCursor
+
+try:
+    from bemani.frontend.base import FrontendBase
+except ImportError:
+    # The frontend needs pyreact, which can't always be installed.
+    raise unittest.SkipTest("Frontend dependencies are not installed")
+
+
+class FakeFrontend(FrontendBase):
+    game = GameConstants.SDVX
+    valid_charts = [0]
+
+
+class TestFrontendBase(unittest.TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        FrontendBase._FrontendBase__last_songs.clear()  # type: ignore
+
+    def make_frontend(self) -> FakeFrontend:
+        data = Mock()
+        self.get_all_songs = Mock(return_value=[Song(GameConstants.SDVX, 4, 1, 0, "Song", "Artist", "Genre", {})])
+        data.local.music.get_all_songs = self.get_all_songs
+        return FakeFrontend(data, Mock(), cache)
+
+    def test_song_cache_cold(self) -> None:
+        frontend = self.make_frontend()
+
+        # Another request is rebuilding a cold list, and we have nothing to fall back on.
+        cache.add(f"{GameConstants.SDVX.value}.songs.rebuild", True)
+        with self.assertRaises(ServiceUnavailable):
+            frontend.get_all_songs()
+        self.get_all_songs.assert_not_called()
+
+        # Once this process has seen a list, it serves that instead of waiting.
+        songs = frontend.get_all_songs(force_db_load=True)
+        self.assertEqual(songs, {1: {"name": "Song", "artist": "Artist", "genre": "Genre"}})
+        cache.delete(f"{GameConstants.SDVX.value}.songs.generation")
+        self.assertEqual(frontend.get_all_songs(), songs)
+        self.assertEqual(self.get_all_songs.call_count, 1)
+
+        # With nobody else rebuilding, this request publishes a new list itself.
+        cache.delete(f"{GameConstants.SDVX.value}.songs.rebuild")
+        self.assertEqual(frontend.get_all_songs(), songs)
+        self.assertEqual(self.get_all_songs.call_count, 2)
+        self.assertIsNone(cache.get(f"{GameConstants.SDVX.value}.songs.rebuild"))
+
+    def test_parse_cursor(self) -> None:
+        frontend = self.make_frontend()
+        self.assertEqual(frontend.parse_cursor("1650000000-12345"), (1650000000, 12345))
+        self.assertIsNone(frontend.parse_cursor(None))
+
+        # Anything malformed is treated as no cursor at all, starting from the newest attempt.
+        for cursor in ["", "1650000000", "1650000000-", "-12345", "abc-12345", "1650000000-abc", "1-2-3"]:
+            self.assertIsNone(frontend.parse_cursor(cursor))
+
+    def test_top_scores_without_version(self) -> None:
+        frontend = self.make_frontend()
+        frontend.get_latest_player_info = Mock(return_value={UserID(5): {}})  # type: ignore
+        music = MusicData(Mock(), None)
+        queries: List[str] = []
+
+        def execute(sql: str, params: Dict[str, Any]) -> FakeCursor:
+            queries.append(" ".join(sql.split()))
+            return FakeCursor(
+                [
+                    {
+                        "scorekey": 3,
+                        "userid": 5,
+                        "points": 1000,
+                        "timestamp": 1,
+                        "update": 1,
+                        "lid": 1,
+                        "data": "{}",
+                        "plays": 2,
+                    }
+                ]
+            )
+
+        music.execute = execute  # type: ignore
+        frontend.data.local.music = music
+
+        # Games without a version rank scores from every version of the chart.
+        self.assertIsNone(frontend.version)
+        top = frontend.get_top_scores(1)
+        self.assertEqual(
+            top["topscores"],
+            [{"userid": "5", "songid": 1, "chart": 0, "plays": 2, "points": 1000}],
+        )
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn("music.version", queries[0])
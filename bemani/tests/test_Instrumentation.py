@@ -0,0 +1,42 @@
+# vim: set fileencoding=utf-8
+import io
+import unittest
+from contextlib import redirect_stdout
+
+from bemani.data import Config
+from bemani.data.instrumentation import Instrumentation
+
+
+class TestInstrumentation(unittest.TestCase):
+    def test_disabled(self) -> None:
+        with Instrumentation.request(Config(), "test.disabled") as stats:
+            self.assertIsNone(stats)
+            self.assertIsNone(Instrumentation.current())
+        self.assertNotIn("test.disabled", Instrumentation.snapshot())
+
+    def test_request_timing(self) -> None:
+        config = Config({"instrumentation": {"enabled": True, "slow_query_ms": 100, "dump_interval": 3600}})
+        output = io.StringIO()
+        with redirect_stdout(output):
+            for _ in range(2):
+                with Instrumentation.request(config, "test.timing"):
+                    Instrumentation.record_query(config, "SELECT 1", None, 0.01)
+                    Instrumentation.record_query(
+                        config,
+                        "SELECT *\n    FROM score WHERE userid IN :userlist",
+                        {"userlist": (1, 2, 3), "game": "iidx"},
+                        0.2,
+                    )
+            Instrumentation.record_query(config, "SELECT 2", None, 0.01)
+
+        totals = Instrumentation.snapshot()["test.timing"]
+        self.assertEqual(totals["count"], 2)
+        self.assertEqual(totals["queries"], 4)
+        self.assertAlmostEqual(totals["dbtime"], 0.42)
+
+        # Slow queries are logged with the shape of their parameters but never the values.
+        self.assertIn(
+            "during test.timing: SELECT * FROM score WHERE userid IN :userlist {'userlist': 'tuple[3]', 'game': 'str'}",
+            output.getvalue(),
+        )
+        self.assertNotIn("SELECT 1", output.getvalue())
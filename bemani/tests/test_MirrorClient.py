@@ -0,0 +1,135 @@
+# vim: set fileencoding=utf-8
+import unittest
+from typing import Any, Dict, List, Tuple
+from unittest.mock import Mock, patch
+
+from bemani.common import APIConstants, GameConstants
+from bemani.data.api.client import RemoteServerErrorAPIException, UnsupportedRequestAPIException
+from bemani.data.api.mirror import MirrorClient, Replicator
+from bemani.data.mysql.mirror import MirrorData
+from bemani.data.types import Server
+from bemani.tests.helpers import FakeCursor
+
+
+class TestMirrorClient(unittest.TestCase):
+    def make_server(self, serverid: int = 1) -> Server:
+        return Server(serverid, 0, "http://127.0.0.1/", "token", True, True)
+
+    def test_profile_partial_match(self) -> None:
+        mirror = Mock()
+        mirror.owner = MirrorData.owner
+        mirror.get_owners = Mock(return_value=["AAAA", "BBBB"])
+        mirror.get_profiles = Mock(
+            return_value=[
+                (26, {"name": "NEWER", "cards": ["aaaa"], "match": "exact"}),
+                (25, {"name": "EXACT", "cards": ["AAAA"], "match": "exact"}),
+                (24, {"name": "OLDER", "cards": ["BBBB", "CCCC"], "match": "exact"}),
+            ]
+        )
+        client = MirrorClient(self.make_server(), mirror)
+
+        profiles = client.get_profiles(GameConstants.IIDX, 25, APIConstants.ID_TYPE_CARD, ["aaaa", "cccc"])
+        self.assertEqual(
+            sorted((p["name"], p["match"]) for p in profiles),
+            [("EXACT", "exact"), ("OLDER", "partial")],
+        )
+
+        # Lookups we don't mirror behave like an empty remote response.
+        self.assertEqual(client.get_profiles(GameConstants.IIDX, 25, APIConstants.ID_TYPE_SONG, ["1"]), [])
+        self.assertEqual(client.get_statistics(GameConstants.IIDX, 25, APIConstants.ID_TYPE_CARD, ["AAAA"]), [])
+
+    def test_disabled_server(self) -> None:
+        mirror = Mock()
+        client = MirrorClient(Server(1, 0, "http://127.0.0.1/", "token", False, False), mirror)
+        self.assertEqual(client.get_profiles(GameConstants.IIDX, 25, APIConstants.ID_TYPE_SERVER, []), [])
+        self.assertEqual(client.get_records(GameConstants.IIDX, 25, APIConstants.ID_TYPE_SERVER, []), [])
+        self.assertEqual(client.get_statistics(GameConstants.IIDX, 25, APIConstants.ID_TYPE_SERVER, []), [])
+        self.assertEqual(mirror.method_calls, [])
+
+    def test_replicate(self) -> None:
+        api = Mock()
+        api.get_all_servers = Mock(return_value=[self.make_server(1), self.make_server(2), self.make_server(3)])
+        mirror = Mock()
+        mirror.owner = MirrorData.owner
+        mirror.get_last_sync = Mock(return_value=10000)
+        mirror.get_profiles = Mock(
+            return_value=[
+                (25, {"name": "REMOTE", "cards": ["REMOTE"], "plays": 1}),
+                (25, {"name": "IDLE", "cards": ["IDLE"], "plays": 1}),
+            ]
+        )
+
+        def get_objects(
+            game: GameConstants,
+            version: int,
+            idtype: APIConstants,
+            ids: List[str],
+            objects: List[str],
+            since: Any = None,
+        ) -> Dict[str, Any]:
+            if idtype == APIConstants.ID_TYPE_SERVER:
+                return {
+                    "profile": [
+                        {"name": "REMOTE", "cards": ["REMOTE"], "plays": 2},
+                        {"name": "IDLE", "cards": ["IDLE"], "plays": 1},
+                        {"name": "NEW", "cards": ["NEW"], "plays": 1},
+                    ],
+                    "records": [],
+                    "statistics": [],
+                }
+            return {"records": [{"cards": ids, "song": "1", "chart": "0", "updated": 5}]}
+
+        clients: Dict[str, Mock] = {}
+
+        def make_client(uri: str, token: str, allow_stats: bool, allow_scores: bool) -> Mock:
+            client = Mock()
+            if uri == "down":
+                client.get_objects = Mock(side_effect=RemoteServerErrorAPIException("boom"))
+            elif uri == "unsupported":
+                client.get_objects = Mock(side_effect=UnsupportedRequestAPIException("nope"))
+            else:
+                client.get_objects = Mock(side_effect=get_objects)
+            clients[uri] = client
+            return client
+
+        # The second server is down, and the third doesn't know about this version.
+        for server, uri in zip(api.get_all_servers(), ["good", "down", "unsupported"]):
+            server.uri = uri
+        with patch("bemani.data.api.mirror.APIClient", side_effect=make_client):
+            failures = Replicator(api, mirror).replicate(GameConstants.IIDX, 25)
+
+        self.assertEqual([serverid for serverid, _ in failures], [2])
+
+        # Scores are pulled incrementally, and only for players whose profile changed.
+        card_calls = [c for c in clients["good"].get_objects.call_args_list if c[0][2] == APIConstants.ID_TYPE_CARD]
+        self.assertEqual(len(card_calls), 1)
+        self.assertEqual(card_calls[0][0][3], ["NEW", "REMOTE"])
+        self.assertEqual(card_calls[0][1]["since"], 10000 - Replicator.SYNC_OVERLAP)
+
+        mirror.replace_profiles.assert_called_once()
+        mirror.put_scores.assert_called_once()
+        mirror.put_last_sync.assert_called_once()
+        self.assertEqual(mirror.put_last_sync.call_args[0][0], 1)
+
+
+class TestMirrorData(unittest.TestCase):
+    def test_replace_profiles_chunked(self) -> None:
+        mirror = MirrorData(Mock(), None)
+        queries: List[Tuple[str, Dict[str, Any]]] = []
+
+        def execute(sql: str, params: Dict[str, Any]) -> FakeCursor:
+            queries.append((" ".join(sql.split()), params))
+            return FakeCursor([])
+
+        mirror.execute = execute  # type: ignore
+        profiles = [{"name": f"P{i}", "cards": [f"{i:016X}"]} for i in range(MirrorData.CHUNK_SIZE + 1)]
+        profiles.append({"name": "ANONYMOUS", "cards": []})
+        mirror.replace_profiles(1, GameConstants.IIDX, 25, profiles, 12345)
+
+        inserts = [q for q in queries if q[0].startswith("INSERT INTO mirror_profile")]
+        self.assertEqual(len(inserts), 2)
+        self.assertEqual(sum(len(q[1]) // 6 for q in inserts), MirrorData.CHUNK_SIZE + 1)
+
+        # Stale rows are only removed after the new copy is in place.
+        self.assertTrue(queries[-1][0].startswith("DELETE FROM mirror_profile"))
+        self.assertEqual(queries[-1][1]["synced"], 12345)
@@ -0,0 +1,145 @@
+# vim: set fileencoding=utf-8
+import sqlite3
+import unittest
+from typing import Any, Dict, List, Tuple
+from unittest.mock import Mock
+
+from bemani.common import GameConstants
+from bemani.data.mysql.music import MusicData
+from bemani.data.types import UserID
+from bemani.tests.helpers import FakeCursor
+
+
+class TestMusicData(unittest.TestCase):
+    def test_get_hit_charts(self) -> None:
+        music = MusicData(Mock(), None)
+        queries: List[Tuple[str, Dict[str, Any]]] = []
+
+        def execute(sql: str, params: Dict[str, Any]) -> FakeCursor:
+            queries.append((sql, params))
+            return FakeCursor(
+                [
+                    {"songid": 1, "plays0": 0, "plays1": 2, "plays2": 9},
+                    {"songid": 2, "plays0": 3, "plays1": 3, "plays2": 3},
+                    {"songid": 3, "plays0": 1, "plays1": 5, "plays2": 5},
+                ]
+            )
+
+        music.execute = execute  # type: ignore
+        charts = music.get_hit_charts(GameConstants.REFLEC_BEAT, 5, 2, [7, 30, 365])
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(
+            charts,
+            {
+                7: [(2, 3), (3, 1)],
+                30: [(3, 5), (2, 3)],
+                365: [(1, 9), (3, 5)],
+            },
+        )
+
+        # The single-window lookup is the same query.
+        self.assertEqual(music.get_hit_chart(GameConstants.REFLEC_BEAT, 5, 1, 7), [(2, 3)])
+
+    def test_get_score_neighbors(self) -> None:
+        music = MusicData(Mock(), None)
+        queries: List[Tuple[str, Dict[str, Any]]] = []
+
+        def execute(sql: str, params: Dict[str, Any]) -> FakeCursor:
+            queries.append((" ".join(sql.split()), params))
+            if "AS ahead" in sql:
+                return FakeCursor([{"ahead": 2}] if params["include"] == 5 else [])
+            return FakeCursor(
+                [
+                    {
+                        "scorekey": key,
+                        "userid": key,
+                        "points": 1000 - key,
+                        "timestamp": 1,
+                        "update": 1,
+                        "lid": 1,
+                        "data": "{}",
+                        "plays": 1,
+                    }
+                    for key in range(params["offset"] + 1, params["offset"] + params["count"] + 1)
+                ]
+            )
+
+        music.execute = execute  # type: ignore
+
+        # A user without a score on this chart has no rank.
+        self.assertIsNone(music.get_score_neighbors(GameConstants.IIDX, 25, UserID(6), 1000, 2, 4))
+
+        # We're third, so the window starts at the top and runs four past us.
+        neighbors = music.get_score_neighbors(GameConstants.IIDX, 25, UserID(5), 1000, 2, 4, userlist=[])
+        assert neighbors is not None
+        first, scores = neighbors
+        self.assertEqual(first, 1)
+        self.assertEqual([uid for uid, _ in scores], [1, 2, 3, 4, 5, 6, 7])
+        self.assertEqual([score.id for _, score in scores], [1000] * 7)
+
+        # Our own score is always ranked, even when filtering by users or location.
+        self.assertIn("AND score.userid = :include ORDER BY", queries[-2][0])
+        self.assertIn("AND (score.userid IN :userlist OR score.userid = :include)", queries[-2][0])
+        self.assertIn("AND (score.userid IN :userlist OR score.userid = :include)", queries[-1][0])
+        self.assertEqual(queries[-1][1]["userlist"], (-1,))
+        self.assertEqual((queries[-1][1]["offset"], queries[-1][1]["count"]), (0, 7))
+
+    def test_get_leaderboard(self) -> None:
+        music = MusicData(Mock(), None)
+        queries: List[Tuple[str, Dict[str, Any]]] = []
+
+        def execute(sql: str, params: Dict[str, Any]) -> FakeCursor:
+            queries.append((" ".join(sql.split()), params))
+            return FakeCursor([])
+
+        music.execute = execute  # type: ignore
+        self.assertEqual(music.get_leaderboard(GameConstants.IIDX, 25, 1000, 2, userlist=[]), [])
+        self.assertEqual(queries, [])
+
+        music.get_leaderboard(GameConstants.IIDX, 25, 1000, 2, count=10, offset=20, location=7)
+        self.assertIn("AND (score.lid = :location) ORDER BY", queries[0][0])
+        self.assertTrue(queries[0][0].endswith("LIMIT :count OFFSET :offset"))
+        self.assertIn("music.version = :version", queries[0][0])
+
+        # Without a version, every version of the chart is ranked together.
+        music.get_leaderboard(GameConstants.IIDX, None, 1000, 2)
+        self.assertNotIn("music.version", queries[1][0])
+        music.get_score_rank(GameConstants.IIDX, None, UserID(5), 1000, 2)
+        self.assertNotIn("music.version", queries[2][0])
+
+    def test_get_all_attempts_cursor(self) -> None:
+        music = MusicData(Mock(), None)
+        queries: List[Tuple[str, Dict[str, Any]]] = []
+
+        def execute(sql: str, params: Dict[str, Any]) -> FakeCursor:
+            queries.append((" ".join(sql.split()), params))
+            return FakeCursor([])
+
+        music.execute = execute  # type: ignore
+        music.get_all_attempts(GameConstants.SDVX, 4, limit=100)
+        self.assertFalse(":beforets" in queries[0][0])
+        self.assertTrue(queries[0][0].endswith("ORDER BY timestamp DESC, id DESC LIMIT :limit"))
+
+        # Attempts sharing the cursor's timestamp are ordered by ID, so paging can't skip or repeat them.
+        music.get_all_attempts(GameConstants.SDVX, 4, limit=2, before=(1000, 55))
+        sql, params = queries[1]
+        paging = sql[sql.index(" AND (timestamp < :beforets") :]
+        self.assertEqual(
+            paging,
+            " AND (timestamp < :beforets OR (timestamp = :beforets AND id < :beforeid)) "
+            "ORDER BY timestamp DESC, id DESC LIMIT :limit",
+        )
+        self.assertEqual((params["beforets"], params["beforeid"]), (1000, 55))
+
+        # Run the same paging clause against real rows to check where the next page starts.
+        db = sqlite3.connect(":memory:")
+        db.execute("CREATE TABLE score_history (id INTEGER, timestamp INTEGER)")
+        db.executemany(
+            "INSERT INTO score_history VALUES (?, ?)",
+            [(54, 1000), (55, 1000), (56, 1000), (57, 999), (40, 999), (10, 1001)],
+        )
+        rows = db.execute(
+            f"SELECT id FROM score_history WHERE 1 = 1{paging}",
+            {"beforets": 1000, "beforeid": 55, "limit": 2},
+        ).fetchall()
+        self.assertEqual(rows, [(54,), (57,)])
@@ -1,10 +1,14 @@
 # vim: set fileencoding=utf-8
 import unittest
-from unittest.mock import Mock
+from unittest.mock import Mock, patch
 from freezegun import freeze_time
+from sqlalchemy import create_engine
 
 from bemani.common import GameConstants
-from bemani.data.mysql.network import NetworkData
+from bemani.data import Data
+from bemani.data.config import Config
+from bemani.data.mysql.network import EventBuffer, NetworkData
+from bemani.data.types import ArcadeID
 from bemani.tests.helpers import FakeCursor
 
 
@@ -49,3 +53,62 @@ class TestNetworkData(unittest.TestCase):
 
             network.execute = Mock(return_value=FakeCursor([{"year": None, "day": 16790}]))  # type: ignore
             self.assertTrue(network.should_schedule(GameConstants.BISHI_BASHI, 1, "work", "weekly"))
+
+    def test_buffered_events(self) -> None:
+        network = NetworkData(Config({}), None)
+        network.event_buffer = EventBuffer(max_events=3, max_age=10)
+        network.execute = Mock(return_value=FakeCursor([]))  # type: ignore
+
+        with freeze_time("2016-01-01 12:00:00"):
+            # Buffered events don't hit the DB until the buffer is full.
+            network.put_event("unhandled_packet", {"request": "foo"})
+            network.put_event("unhandled_packet", {"request": "foo"})
+            network.put_event("unhandled_packet", {"request": "foo"}, arcadeid=ArcadeID(5))
+            network.put_event("unhandled_packet", {"request": "bar"})
+            network.execute.assert_called_once()
+
+            sql, params = network.execute.call_args[0]
+            self.assertEqual(sql.count("(:ts"), 3)
+            self.assertEqual(params["data0"], '{"request": "foo", "repeats": 2}')
+            self.assertEqual(params["aid1"], 5)
+            self.assertEqual(params["data1"], '{"request": "foo"}')
+            self.assertEqual(params["data2"], '{"request": "bar"}')
+
+        # PASELI transactions are never buffered.
+        network.execute.reset_mock()
+        network.put_event("paseli_transaction", {"delta": -100})
+        network.execute.assert_called_once()
+
+        # Request-end flushes only write once events have waited long enough.
+        with freeze_time("2016-01-01 12:01:00"):
+            network.put_event("exception", {"traceback": "..."})
+        network.execute.reset_mock()
+        with freeze_time("2016-01-01 12:01:05"):
+            network.flush_events(force=False)
+            network.execute.assert_not_called()
+        with freeze_time("2016-01-01 12:01:10"):
+            network.flush_events(force=False)
+            network.execute.assert_called_once()
+
+    def test_events_collapse_across_requests(self) -> None:
+        config = Config({"database": {"engine": create_engine("sqlite://")}})
+        execute = Mock(return_value=FakeCursor([]))
+
+        with patch.object(NetworkData, "event_buffer", EventBuffer(max_events=100, max_age=10)):
+            with patch.object(NetworkData, "execute", execute):
+                # A cabinet repeating the same packet sends it in separate requests.
+                with freeze_time("2016-01-01 12:00:00"):
+                    for _ in range(2):
+                        data = Data(config)
+                        data.local.network.put_event("unhandled_packet", {"request": "foo"})
+                        data.close()
+                execute.assert_not_called()
+
+                # The first request to finish once they've waited long enough writes one row.
+                with freeze_time("2016-01-01 12:00:10"):
+                    data = Data(config)
+                    data.close()
+                execute.assert_called_once()
+                sql, params = execute.call_args[0]
+                self.assertEqual(sql.count("(:ts"), 1)
+                self.assertEqual(params["data0"], '{"request": "foo", "repeats": 2}')
@@ -1,6 +1,10 @@
 # vim: set fileencoding=utf-8
 from abc import ABC
+import concurrent.futures
+import threading
+import time
 import unittest
+from typing import List
 
 from bemani.common import Parallel
 
@@ -100,3 +104,43 @@ class TestParallel(unittest.TestCase):
     def test_flatten(self) -> None:
         results = Parallel.flatten([[1, 2, 3], [4, 5, 6], [7, 8, 9], []])
         self.assertEqual(results, [1, 2, 3, 4, 5, 6, 7, 8, 9])
+
+    def test_nested(self) -> None:
+        # Nesting more work than the pool has threads must not deadlock.
+        def inner(x: int) -> List[int]:
+            return Parallel.map(lambda y: x * y, list(range(Parallel.MAX_WORKERS)))
+
+        results = Parallel.map(inner, list(range(Parallel.MAX_WORKERS * 2)))
+        self.assertEqual(results[3][2], 6)
+        self.assertEqual(len(results), Parallel.MAX_WORKERS * 2)
+
+    def test_exception(self) -> None:
+        def fun(x: int) -> int:
+            if x == 3:
+                raise ValueError("Bad value!")
+            return x
+
+        with self.assertRaises(ValueError):
+            Parallel.map(fun, [1, 2, 3, 4, 5])
+
+    def test_timeout(self) -> None:
+        event = threading.Event()
+        before = Parallel.stats()["timeouts"]
+
+        def slow() -> int:
+            event.wait(5)
+            return 1
+
+        start = time.monotonic()
+        with self.assertRaises(concurrent.futures.TimeoutError):
+            Parallel.execute([slow, lambda: 2], timeout=0.1)
+        event.set()
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertEqual(Parallel.stats()["timeouts"], before + 1)
+
+    def test_stats(self) -> None:
+        before = Parallel.stats()
+        Parallel.execute([lambda: 1, lambda: 2])
+        stats = Parallel.stats()
+        self.assertEqual(stats["workers"], Parallel.MAX_WORKERS)
+        self.assertEqual(stats["submitted"], before["submitted"] + 2)
@@ -0,0 +1,52 @@
+# vim: set fileencoding=utf-8
+import unittest
+from unittest.mock import Mock
+
+from bemani.backend.reflec.volzza import ReflecBeatVolzza
+from bemani.common import GameConstants, Model, Profile
+from bemani.data.types import Score, UserID
+from bemani.protocol import Node
+
+
+class TestReflecBeatVolzza(unittest.TestCase):
+    def test_shop_ranking(self) -> None:
+        data = Mock()
+        data.local.music.get_all_scores = Mock(
+            return_value=[
+                (UserID(1), Score(1, 10, 0, 500, 100, 100, 0, 1, {"clear_type": ReflecBeatVolzza.CLEAR_TYPE_CLEARED})),
+                (UserID(2), Score(2, 10, 0, 900, 100, 100, 0, 1, {"clear_type": ReflecBeatVolzza.CLEAR_TYPE_CLEARED})),
+                (UserID(1), Score(3, 10, 2, 700, 100, 100, 0, 1, {"clear_type": ReflecBeatVolzza.CLEAR_TYPE_CLEARED})),
+                (UserID(2), Score(4, 11, 0, 300, 100, 100, 0, 1, {"clear_type": ReflecBeatVolzza.CLEAR_TYPE_CLEARED})),
+            ]
+        )
+        data.remote.user.get_any_profiles = Mock(
+            side_effect=lambda game, version, userids: [
+                (uid, Profile(GameConstants.REFLEC_BEAT, 5, "", 10000000 + uid, {"name": f"P{uid}"})) for uid in userids
+            ]
+        )
+        game = ReflecBeatVolzza(data, Mock(), Model.from_modelstring("MBR:J:B:A:2016100400"))
+
+        request = Node.void("info")
+        request.add_child(Node.s16("min", 10))
+        request.add_child(Node.s16("max", 11))
+        root = game.handle_info_rb5_info_read_shop_ranking_request(request)
+
+        ranking = [
+            (
+                entry.child_value("music_id"),
+                entry.child_value("note_grade"),
+                entry.child_value("rank"),
+                entry.child_value("name"),
+            )
+            for entry in root.child("shop_score").children
+            if entry.name == "data"
+        ]
+        self.assertEqual(
+            ranking,
+            [(10, 0, 1, "P2"), (10, 0, 2, "P1"), (10, 2, 1, "P1"), (11, 0, 1, "P2")],
+        )
+
+        # The whole range is fetched with one query, and profiles in one bulk lookup.
+        self.assertEqual(data.local.music.get_all_scores.call_count, 1)
+        self.assertEqual(data.local.music.get_all_scores.call_args[1]["songrange"], (10, 11))
+        self.assertEqual(data.remote.user.get_any_profiles.call_count, 1)
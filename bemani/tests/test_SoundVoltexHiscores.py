@@ -0,0 +1,73 @@
+# vim: set fileencoding=utf-8
+import unittest
+from unittest.mock import Mock
+
+from bemani.backend.sdvx.heavenlyhaven import SoundVoltexHeavenlyHaven
+from bemani.common import GameConstants, Model, Profile, cache
+from bemani.data.types import Score, UserID
+
+
+class TestSoundVoltexHiscores(unittest.TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+
+    def make_game(self) -> SoundVoltexHeavenlyHaven:
+        data = Mock()
+        data.local.music.get_hit_chart = Mock(return_value=[(1, 5)])
+        data.local.music.get_all_attempts = Mock(return_value=[])
+        data.local.music.get_score = Mock(return_value=None)
+        data.remote.music.get_clear_rates = Mock(return_value={})
+        self.global_records = Mock(return_value=[(UserID(1), Score(1, 1, 2, 9000000, 0, 0, 0, 1, {}))])
+        self.area_records = Mock(return_value=[(UserID(2), Score(2, 1, 2, 8000000, 0, 0, 0, 1, {}))])
+        data.remote.music.get_all_records = self.global_records
+        data.local.music.get_all_records = self.area_records
+        profiles = {
+            UserID(1): Profile(GameConstants.SDVX, 4, "", 12345678, {"name": "GLOBAL", "loc": 5}),
+            UserID(2): Profile(GameConstants.SDVX, 4, "", 87654321, {"name": "LOCAL", "loc": 6}),
+        }
+        data.local.user.get_all_profiles = Mock(return_value=list(profiles.items()))
+        data.local.user.get_profile = Mock(side_effect=lambda game, version, userid: profiles[userid])
+        data.remote.user.get_any_profiles = Mock(
+            side_effect=lambda game, version, userids: [(uid, profiles[uid]) for uid in userids],
+        )
+        return SoundVoltexHeavenlyHaven(data, Mock(), Model.from_modelstring("KFC:J:A:A:2019020600"))
+
+    def test_snapshot_cached(self) -> None:
+        game = self.make_game()
+
+        hiscores = game.get_hiscores(6)
+        self.assertEqual(hiscores["hitchart"], [(1, 5)])
+        self.assertEqual(hiscores["global"][(1, 2)]["name"], "GLOBAL")
+        self.assertEqual(hiscores["global"][(1, 2)]["extid"], 12345678)
+        self.assertEqual(hiscores["area"][(1, 2)]["name"], "LOCAL")
+        self.assertEqual(hiscores["area"][(1, 2)]["points"], 8000000)
+
+        # A second boot should not touch the DB at all.
+        self.assertEqual(game.get_hiscores(6), hiscores)
+        self.assertEqual(self.global_records.call_count, 1)
+        self.assertEqual(self.area_records.call_count, 1)
+
+        # The scheduler knows which areas to keep warm.
+        self.assertEqual(cache.get(f"{GameConstants.SDVX.value}.4.hiscores.areas"), {str(game.model): [6]})
+
+    def test_snapshot_invalidated_by_record(self) -> None:
+        game = self.make_game()
+        game.get_hiscores(6)
+
+        # A score below both records leaves the snapshot alone.
+        game.update_score(UserID(2), 1, 2, 7000000, game.CLEAR_TYPE_CLEAR, game.GRADE_A, 100)
+        game.get_hiscores(6)
+        self.assertEqual(self.global_records.call_count, 1)
+        self.assertEqual(self.area_records.call_count, 1)
+
+        # Beating the area record only evicts the area snapshot.
+        game.update_score(UserID(2), 1, 2, 8500000, game.CLEAR_TYPE_CLEAR, game.GRADE_A, 100)
+        game.get_hiscores(6)
+        self.assertEqual(self.global_records.call_count, 1)
+        self.assertEqual(self.area_records.call_count, 2)
+
+        # Beating the global record evicts the global snapshot as well.
+        game.update_score(UserID(2), 1, 2, 9500000, game.CLEAR_TYPE_CLEAR, game.GRADE_A, 100)
+        game.get_hiscores(6)
+        self.assertEqual(self.global_records.call_count, 2)
+        self.assertEqual(self.area_records.call_count, 3)
@@ -0,0 +1,141 @@
+# vim: set fileencoding=utf-8
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import Any, Dict, List
+
+from discord_webhook import DiscordEmbed
+
+from bemani.data.triggers import BroadcastQueue
+
+
+class FakeWebhookServer:
+    def __init__(self, failures: int = 0) -> None:
+        self.posts: List[Dict[str, Any]] = []
+        self.failures = failures
+        parent = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self) -> None:
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                if parent.failures > 0:
+                    parent.failures -= 1
+                    self.send_response(500)
+                    self.end_headers()
+                    self.wfile.write(b"{}")
+                    return
+
+                parent.posts.append(json.loads(body))
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.end_headers()
+                self.wfile.write(b"{}")
+
+            def log_message(self, format: str, *args: Any) -> None:
+                pass
+
+        self.server = HTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/webhook"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class TestBroadcastQueue(unittest.TestCase):
+    def embed(self, title: str) -> DiscordEmbed:
+        return DiscordEmbed(title=title)
+
+    def test_batches_embeds(self) -> None:
+        server = FakeWebhookServer()
+        try:
+            broadcasts = BroadcastQueue(batchsize=10, backoff=0.01)
+            for i in range(3):
+                broadcasts.enqueue(server.url, self.embed(f"Score {i}"))
+            self.assertTrue(broadcasts.flush(5.0))
+
+            titles = [embed["title"] for post in server.posts for embed in post["embeds"]]
+            self.assertEqual(titles, ["Score 0", "Score 1", "Score 2"])
+            self.assertLessEqual(len(server.posts), 3)
+            stats = broadcasts.stats
+            self.assertEqual(stats["queued"], 3)
+            self.assertEqual(stats["sent"], 3)
+            self.assertEqual(stats["batches"], len(server.posts))
+            self.assertEqual(stats["pending"], 0)
+        finally:
+            server.close()
+
+    def test_retries_failures(self) -> None:
+        server = FakeWebhookServer(failures=2)
+        try:
+            broadcasts = BroadcastQueue(retries=3, backoff=0.01)
+            broadcasts.enqueue(server.url, self.embed("Score"))
+            self.assertTrue(broadcasts.flush(5.0))
+
+            self.assertEqual(len(server.posts), 1)
+            self.assertEqual(broadcasts.stats["retries"], 2)
+            self.assertEqual(broadcasts.stats["failed"], 0)
+        finally:
+            server.close()
+
+    def test_gives_up(self) -> None:
+        server = FakeWebhookServer(failures=10)
+        try:
+            broadcasts = BroadcastQueue(retries=1, backoff=0.01)
+            broadcasts.enqueue(server.url, self.embed("Score"))
+            self.assertTrue(broadcasts.flush(5.0))
+
+            self.assertEqual(server.posts, [])
+            self.assertEqual(broadcasts.stats["retries"], 1)
+            self.assertEqual(broadcasts.stats["failed"], 1)
+        finally:
+            server.close()
+
+    def test_drops_on_overflow(self) -> None:
+        # Never start the worker, so that nothing drains the queue.
+        class StoppedQueue(BroadcastQueue):
+            def start(self) -> None:
+                pass
+
+        broadcasts = StoppedQueue(maxsize=2)
+        self.assertTrue(broadcasts.enqueue("http://127.0.0.1:1/", self.embed("1")))
+        self.assertTrue(broadcasts.enqueue("http://127.0.0.1:1/", self.embed("2")))
+        self.assertFalse(broadcasts.enqueue("http://127.0.0.1:1/", self.embed("3")))
+        self.assertEqual(broadcasts.stats["dropped"], 1)
+        self.assertEqual(broadcasts.stats["pending"], 2)
+
+    def test_sends_inline_without_threads(self) -> None:
+        server = FakeWebhookServer()
+        try:
+            broadcasts = BroadcastQueue(backoff=0.01, threaded=False)
+            self.assertTrue(broadcasts.enqueue(server.url, self.embed("Score")))
+
+            # Should have gone out before enqueue returned, without a worker.
+            self.assertEqual(len(server.posts), 1)
+            self.assertEqual(broadcasts.stats["sent"], 1)
+            self.assertEqual(broadcasts.stats["pending"], 0)
+        finally:
+            server.close()
+
+    def test_close_sends_leftovers(self) -> None:
+        # Never start the worker, so that close has to send everything itself.
+        class StoppedQueue(BroadcastQueue):
+            def start(self) -> None:
+                pass
+
+        server = FakeWebhookServer()
+        try:
+            broadcasts = StoppedQueue(backoff=0.01)
+            broadcasts.enqueue(server.url, self.embed("1"))
+            broadcasts.enqueue(server.url, self.embed("2"))
+            broadcasts.close(0.1)
+
+            titles = [embed["title"] for post in server.posts for embed in post["embeds"]]
+            self.assertEqual(titles, ["1", "2"])
+            self.assertEqual(broadcasts.stats["pending"], 0)
+            self.assertTrue(broadcasts.flush(0.1))
+        finally:
+            server.close()
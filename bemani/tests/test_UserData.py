@@ -0,0 +1,383 @@
+# vim: set fileencoding=utf-8
+import os
+import unittest
+from typing import Any, Dict, List, Optional, Tuple
+from unittest.mock import Mock
+
+from bemani.common import GameConstants, Parallel, Profile, cache
+from bemani.data import Config, Data
+from bemani.data.mysql.user import UserData
+from bemani.data.types import ArcadeID, User, UserID
+from bemani.tests.helpers import FakeCursor
+
+
+class TestUserData(unittest.TestCase):
+    def make_user(self) -> Tuple[UserData, List[Tuple[str, Dict[str, Any]]]]:
+        user = UserData(Mock(), None)
+        queries: List[Tuple[str, Dict[str, Any]]] = []
+
+        def execute(sql: str, params: Dict[str, Any]) -> FakeCursor:
+            queries.append((" ".join(sql.split()), params))
+            return FakeCursor([{"userid": 5}, {"userid": 7}])
+
+        user.execute = execute  # type: ignore
+        user.get_refid = Mock(return_value="0123456789ABCDEF")  # type: ignore
+        user.get_extid = Mock(return_value=12345678)  # type: ignore
+        return user, queries
+
+    def test_put_profile_index(self) -> None:
+        user, queries = self.make_user()
+        user.put_profile(
+            GameConstants.IIDX,
+            25,
+            UserID(5),
+            Profile(GameConstants.IIDX, 25, "", 0, {"name": "TEST", "sgrade": 7, "shop_location": 1}),
+        )
+
+        # Every indexed key goes out in a single upsert.
+        upserts = [q for q in queries if q[0].startswith("INSERT INTO profile_index")]
+        self.assertEqual(len(upserts), 1)
+        self.assertEqual(
+            {upserts[0][1][f"name{pos}"]: upserts[0][1][f"value{pos}"] for pos in range(2)},
+            {"sgrade": 7, "shop_location": 1},
+        )
+        deletes = [q[1]["names"] for q in queries if q[0].startswith("DELETE FROM profile_index")]
+        self.assertEqual(deletes, [("dgrade",)])
+
+        # Incremental saves only touch the index when an indexed key changed.
+        user, queries = self.make_user()
+        user.execute = Mock(return_value=Mock(rowcount=1))  # type: ignore
+        profile = Profile(GameConstants.IIDX, 25, "0123456789ABCDEF", 12345678, {"name": "TEST", "sgrade": 7})
+        profile.mark_stored(4, lambda: {"name": "TEST", "sgrade": 7})
+        user.put_profile(GameConstants.IIDX, 25, UserID(5), profile)
+        profile.replace_str("name", "NEW")
+        user.put_profile(GameConstants.IIDX, 25, UserID(5), profile)
+        self.assertEqual([c for c in user.execute.call_args_list if "profile_index" in c[0][0]], [])
+        profile.replace_int("sgrade", 8)
+        user.put_profile(GameConstants.IIDX, 25, UserID(5), profile)
+        sql, params = user.execute.call_args[0]
+        self.assertTrue("INSERT INTO profile_index" in sql)
+        self.assertEqual((params["name0"], params["value0"]), ("sgrade", 8))
+
+        # Games without indexed keys never touch the index.
+        user, queries = self.make_user()
+        user.put_profile(
+            GameConstants.DDR,
+            16,
+            UserID(5),
+            Profile(GameConstants.DDR, 16, "", 0, {"name": "TEST", "sgrade": 7}),
+        )
+        self.assertEqual([q for q in queries if "profile_index" in q[0]], [])
+
+    def test_get_indexed_users(self) -> None:
+        user, queries = self.make_user()
+        self.assertEqual(user.get_indexed_users(GameConstants.IIDX, 25, "sgrade", []), [])
+        self.assertEqual(queries, [])
+
+        self.assertEqual(
+            user.get_indexed_users(GameConstants.IIDX, 25, "sgrade", [7, 8]),
+            [UserID(5), UserID(7)],
+        )
+        self.assertEqual(queries[0][1]["values"], (7, 8))
+
+        with self.assertRaises(Exception) as context:
+            user.get_indexed_users(GameConstants.IIDX, 25, "name", [1])
+        self.assertTrue("Profile key name is not indexed for iidx!" in str(context.exception))
+
+    def test_from_cardids(self) -> None:
+        user = UserData(Mock(), None)
+        queries: List[Tuple[str, Dict[str, Any]]] = []
+
+        def execute(sql: str, params: Dict[str, Any]) -> FakeCursor:
+            queries.append((sql, params))
+            return FakeCursor([{"id": "e004000000000001", "userid": 5}])
+
+        user.execute = execute  # type: ignore
+        self.assertEqual(user.from_cardids([]), {})
+        self.assertEqual(queries, [])
+
+        self.assertEqual(
+            user.from_cardids(["E004000000000001", "E004000000000001", "E004000000000002"]),
+            {"E004000000000001": UserID(5)},
+        )
+        self.assertEqual(sorted(queries[0][1]["ids"]), ["E004000000000001", "E004000000000002"])
+
+    def test_get_paseli_spend(self) -> None:
+        user = UserData(Mock(), None)
+        queries: List[Tuple[str, Dict[str, Any]]] = []
+
+        def execute(sql: str, params: Dict[str, Any]) -> FakeCursor:
+            queries.append((" ".join(sql.split()), params))
+            return FakeCursor(
+                [
+                    {"bucket": 0, "consumed": 300, "transactions": 2, "oldest": 1000},
+                    {"bucket": 2, "consumed": 100, "transactions": 1, "oldest": 500},
+                ]
+            )
+
+        user.execute = execute  # type: ignore
+        self.assertEqual(
+            user.get_paseli_spend(ArcadeID(1), 86400, 3600, 4, pcbid="PCBID"),
+            [(300, 2), (0, 0), (100, 1), (0, 0)],
+        )
+        self.assertEqual(queries[0][1]["end"], 86400 + (3600 * 4))
+        self.assertTrue("pcbid = :pcbid" in queries[0][0])
+        self.assertFalse("userid = :userid" in queries[0][0])
+
+        self.assertEqual(
+            user.get_paseli_spend_cycle(ArcadeID(1), 86400 * 7, 86400, userid=UserID(5)),
+            ([300, 0, 100, 0, 0, 0, 0], 500),
+        )
+        self.assertTrue("userid = :userid" in queries[1][0])
+
+    def test_get_cards_for_users(self) -> None:
+        user = UserData(Mock(), None)
+        queries: List[Tuple[str, Dict[str, Any]]] = []
+
+        def execute(sql: str, params: Dict[str, Any]) -> FakeCursor:
+            queries.append((sql, params))
+            return FakeCursor(
+                [
+                    {"id": "e004000000000001", "userid": 5},
+                    {"id": "e004000000000002", "userid": 5},
+                    {"id": "e004000000000003", "userid": 7},
+                ]
+            )
+
+        user.execute = execute  # type: ignore
+        self.assertEqual(user.get_cards_for_users([]), {})
+        self.assertEqual(queries, [])
+
+        self.assertEqual(
+            user.get_cards_for_users([UserID(5), UserID(7), UserID(5)]),
+            {
+                UserID(5): ["E004000000000001", "E004000000000002"],
+                UserID(7): ["E004000000000003"],
+            },
+        )
+        self.assertEqual(sorted(queries[0][1]["userids"]), [5, 7])
+
+    def test_update_balance(self) -> None:
+        user = UserData(Mock(), None)
+        queries: List[Tuple[str, Dict[str, Any]]] = []
+        cursor = Mock(rowcount=1, lastrowid=400)
+
+        def execute(sql: str, params: Dict[str, Any]) -> Mock:
+            queries.append((" ".join(sql.split()), params))
+            return cursor
+
+        user.execute = execute  # type: ignore
+
+        # Debits are a single conditional update.
+        self.assertEqual(user.update_balance(UserID(5), ArcadeID(1), -100), 400)
+        self.assertEqual(len(queries), 1)
+        self.assertTrue(queries[0][0].startswith("UPDATE balance"))
+        self.assertEqual(queries[0][1]["amount"], 100)
+
+        # Not enough balance means nothing was updated.
+        cursor.rowcount = 0
+        self.assertIsNone(user.update_balance(UserID(5), ArcadeID(1), -500))
+        self.assertEqual(len(queries), 2)
+
+        # Credits create the balance if needed.
+        self.assertEqual(user.update_balance(UserID(5), ArcadeID(1), 100), 400)
+        self.assertTrue(queries[2][0].startswith("INSERT INTO balance"))
+
+    def test_get_any_profiles(self) -> None:
+        user = UserData(Mock(), None)
+        queries: List[Tuple[str, Dict[str, Any]]] = []
+
+        def execute(sql: str, params: Dict[str, Any]) -> FakeCursor:
+            queries.append((" ".join(sql.split()), params))
+            if len(queries) == 1:
+                return FakeCursor(
+                    [
+                        {"userid": 5, "version": 24},
+                        {"userid": 5, "version": 25},
+                        {"userid": 5, "version": 26},
+                        {"userid": 7, "version": 23},
+                        {"userid": 7, "version": 24},
+                    ]
+                )
+            return FakeCursor(
+                [
+                    {"userid": 5, "version": 24, "refid": "A", "extid": 1, "data": '{"name": "OLD"}', "revision": 0},
+                    {"userid": 5, "version": 25, "refid": "B", "extid": 1, "data": '{"name": "EXACT"}', "revision": 0},
+                    {"userid": 7, "version": 24, "refid": "C", "extid": 2, "data": '{"name": "NEWEST"}', "revision": 0},
+                ]
+            )
+
+        user.execute = execute  # type: ignore
+        self.assertEqual(user.get_any_profiles(GameConstants.IIDX, 25, []), [])
+        self.assertEqual(queries, [])
+
+        # The exact version is preferred, otherwise the newest version is used.
+        profiles = user.get_any_profiles(GameConstants.IIDX, 25, [UserID(5), UserID(7), UserID(9)])
+        self.assertEqual(len(queries), 2)
+        self.assertEqual(sorted(queries[1][1]["versions"]), [24, 25])
+        self.assertEqual([uid for uid, _ in profiles], [UserID(5), UserID(7), UserID(9)])
+        self.assertEqual(profiles[0][1].get_str("name"), "EXACT")
+        self.assertEqual(profiles[0][1].version, 25)
+        self.assertEqual(profiles[1][1].get_str("name"), "NEWEST")
+        self.assertEqual(profiles[1][1].version, 24)
+        self.assertIsNone(profiles[2][1])
+
+    def test_get_usernames(self) -> None:
+        cache.clear()
+        user = UserData(Mock(), None)
+        queries: List[Tuple[str, Dict[str, Any]]] = []
+
+        def execute(sql: str, params: Dict[str, Any]) -> FakeCursor:
+            queries.append((sql, params))
+            if sql.startswith("UPDATE"):
+                return FakeCursor([])
+            return FakeCursor(
+                [{"id": userid, "name": f"USER{userid}" if userid != 7 else None} for userid in params["ids"]]
+            )
+
+        user.execute = execute  # type: ignore
+        self.assertEqual(user.get_usernames([]), {})
+        self.assertEqual(user.get_usernames([UserID(5), UserID(7)]), {UserID(5): "USER5", UserID(7): None})
+        self.assertEqual(len(queries), 1)
+
+        # Cached names, including missing ones, aren't looked up again.
+        self.assertEqual(
+            user.get_usernames([UserID(5), UserID(7), UserID(9)]),
+            {UserID(5): "USER5", UserID(7): None, UserID(9): "USER9"},
+        )
+        self.assertEqual(len(queries), 2)
+        self.assertEqual(queries[1][1]["ids"], (9,))
+
+        # Renaming a user drops their cached name.
+        user.put_user(User(UserID(5), "NEWNAME", None, False))
+        user.get_usernames([UserID(5), UserID(7)])
+        self.assertEqual(queries[-1][1]["ids"], (5,))
+
+    def test_put_profile_incremental(self) -> None:
+        user = UserData(Mock(), None)
+        queries: List[Tuple[str, Dict[str, Any]]] = []
+        cursor = Mock(rowcount=1, lastrowid=0)
+
+        def execute(sql: str, params: Dict[str, Any]) -> Mock:
+            queries.append((" ".join(sql.split()), params))
+            return cursor
+
+        user.execute = execute  # type: ignore
+        user.get_refid = Mock(return_value="0123456789ABCDEF")  # type: ignore
+        profile = Profile(GameConstants.DDR, 16, "0123456789ABCDEF", 12345678, {"name": "TEST", "old": 1, "sp": 5})
+        profile.mark_stored(4, lambda: {"name": "TEST", "old": 1, "sp": 5})
+
+        # Saving an unmodified profile doesn't write anything.
+        user.put_profile(GameConstants.DDR, 16, UserID(5), profile)
+        self.assertEqual(queries, [])
+
+        # Only changed keys are written, guarded by the revision we loaded.
+        profile.replace_int("sp", 6)
+        del profile["old"]
+        user.put_profile(GameConstants.DDR, 16, UserID(5), profile)
+        self.assertEqual(len(queries), 1)
+        self.assertTrue(queries[0][0].startswith("UPDATE profile SET data = JSON_REMOVE(JSON_SET(data"))
+        self.assertEqual(queries[0][1]["patch"], '{"sp": 6}')
+        self.assertEqual(queries[0][1]["path0"], '$."sp"')
+        self.assertEqual(queries[0][1]["removed0"], '$."old"')
+        self.assertEqual(queries[0][1]["revision"], 4)
+        self.assertEqual(profile.revision, 5)
+        self.assertEqual(profile.dirty_keys(), (set(), set()))
+
+        # If somebody else wrote the profile in the meantime, the whole thing is written.
+        profile.replace_str("name", "NEW")
+        cursor.rowcount = 0
+        cursor.lastrowid = 9
+        user.put_profile(GameConstants.DDR, 16, UserID(5), profile)
+        self.assertEqual(len(queries), 3)
+        self.assertTrue(queries[2][0].startswith("INSERT INTO profile"))
+        self.assertEqual(profile.revision, 9)
+        self.assertEqual(profile.dirty_keys(), (set(), set()))
+
+    def test_search_users(self) -> None:
+        user = UserData(Mock(), None)
+        queries: List[Tuple[str, Dict[str, Any]]] = []
+
+        def execute(sql: str, params: Dict[str, Any]) -> FakeCursor:
+            queries.append((" ".join(sql.split()), params))
+            if sql.startswith("SELECT COUNT(*)"):
+                return FakeCursor([{"count": 120}])
+            return FakeCursor([{"id": 5, "username": "user_5", "email": None, "admin": 0}])
+
+        user.execute = execute  # type: ignore
+        users, total = user.search_users(username="user_", cardid="E004", limit=50, offset=50)
+        self.assertEqual(total, 120)
+        self.assertEqual([(u.id, u.username, u.admin) for u in users], [(UserID(5), "user_5", False)])
+        self.assertTrue("username LIKE :username AND id IN (SELECT userid FROM card" in queries[1][0])
+        self.assertTrue(queries[1][0].endswith("ORDER BY id LIMIT :limit OFFSET :offset"))
+
+        # Wildcards typed by the searcher are matched literally.
+        self.assertEqual(queries[1][1]["username"], "user\\_%")
+        self.assertEqual(queries[1][1]["cardid"], "E004%")
+        self.assertEqual((queries[1][1]["limit"], queries[1][1]["offset"]), (50, 50))
+
+        # No filters means no WHERE clause at all.
+        user.search_users()
+        self.assertEqual(
+            queries[-1][0], "SELECT id, username, email, admin FROM user ORDER BY id LIMIT :limit OFFSET :offset"
+        )
+
+    def test_get_balances(self) -> None:
+        user = UserData(Mock(), None)
+        queries: List[Tuple[str, Dict[str, Any]]] = []
+
+        def execute(sql: str, params: Dict[str, Any]) -> FakeCursor:
+            queries.append((sql, params))
+            return FakeCursor([{"arcadeid": 1, "balance": 100}, {"arcadeid": 3, "balance": 0}])
+
+        user.execute = execute  # type: ignore
+        self.assertEqual(user.get_balances(UserID(5)), {ArcadeID(1): 100, ArcadeID(3): 0})
+        self.assertEqual(len(queries), 1)
+
+
+@unittest.skipUnless(
+    os.environ.get("BEMANI_TEST_MYSQL_CONFIG"),
+    "Set BEMANI_TEST_MYSQL_CONFIG to a server config for a scratch MySQL database to run",
+)
+class TestUserDataMySQL(unittest.TestCase):
+    # Chosen so they never collide with a real user or arcade in the scratch database.
+    USERID = UserID(0x7FFFFFF0)
+    ARCADEID = ArcadeID(0x7FFFFFF0)
+
+    def setUp(self) -> None:
+        # Imported here since this pulls in every game backend.
+        from bemani.utils.config import load_config
+
+        self.config = Config()
+        try:
+            load_config(os.environ["BEMANI_TEST_MYSQL_CONFIG"], self.config)
+            self.data = Data(self.config)
+            self.clear_balance()
+        except Exception as e:
+            raise unittest.SkipTest(f"MySQL is not available: {e}")
+
+    def tearDown(self) -> None:
+        self.clear_balance()
+        self.data.close()
+
+    def clear_balance(self) -> None:
+        self.data.local.user.execute(
+            "DELETE FROM balance WHERE userid = :userid AND arcadeid = :arcadeid",
+            {"userid": self.USERID, "arcadeid": self.ARCADEID},
+        )
+
+    def test_concurrent_balance_updates(self) -> None:
+        user = self.data.local.user
+        self.assertEqual(user.update_balance(self.USERID, self.ARCADEID, 1000), 1000)
+
+        def debit(_: int) -> Optional[int]:
+            # Each pool thread gets its own connection through the scoped session.
+            return user.update_balance(self.USERID, self.ARCADEID, -10)
+
+        # Twice as many debits as the balance covers, all racing each other.
+        balances = Parallel.map(debit, list(range(200)))
+        succeeded = [balance for balance in balances if balance is not None]
+        self.assertEqual(len(succeeded), 100)
+        self.assertTrue(all(balance >= 0 for balance in succeeded))
+        self.assertEqual(sorted(succeeded), list(range(0, 1000, 10)))
+        self.assertEqual(user.get_balance(self.USERID, self.ARCADEID), 0)
@@ -1,7 +1,7 @@
 # vim: set fileencoding=utf-8
 import unittest
 
-from bemani.common import ValidatedDict, intish
+from bemani.common import GameConstants, Profile, ValidatedDict, intish
 
 
 class TestIntish(unittest.TestCase):
@@ -278,3 +278,23 @@ class TestValidatedDict(unittest.TestCase):
         self.assertEqual(validict.get_int("int2"), 1)
         validict.increment_int("int3")
         self.assertEqual(validict.get_int("int3"), 1)
+
+
+class TestProfile(unittest.TestCase):
+    def test_dirty_keys(self) -> None:
+        profile = Profile(GameConstants.IIDX, 25, "", 0, {"name": "TEST", "int": 1, "dict": {"list": [1, 2]}})
+        self.assertIsNone(profile.dirty_keys())
+
+        profile.mark_stored(3, lambda: {"name": "TEST", "int": 1, "dict": {"list": [1, 2]}, "old": True})
+        self.assertEqual(profile.dirty_keys(), (set(), {"old"}))
+
+        # Nested in-place changes and type changes are both caught.
+        profile.get_dict("dict")["list"].append(3)
+        profile["int"] = 1.0
+        profile.replace_str("new", "value")
+        self.assertEqual(profile.dirty_keys(), ({"dict", "int", "new"}, {"old"}))
+
+        # Clones keep track of what was stored.
+        clone = profile.clone()
+        self.assertEqual(clone.revision, 3)
+        self.assertEqual(clone.dirty_keys(), ({"dict", "int", "new"}, {"old"}))
@@ -18,6 +18,7 @@ from bemani.data import Config, Data
 def load_config(filename: str, config: Config) -> None:
     config.update(yaml.safe_load(open(filename)))
     config["database"]["engine"] = Data.create_engine(config)
+    config["database"]["replica_engine"] = Data.create_replica_engine(config)
     config["filename"] = filename
 
     supported_series: Set[GameConstants] = set()
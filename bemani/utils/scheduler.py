@@ -1,5 +1,9 @@
 import argparse
-from typing import Any, List
+import concurrent.futures
+import time
+import traceback
+from functools import partial
+from typing import Any, Callable, List, Optional, Tuple
 
 from bemani.backend.popn import PopnMusicFactory
 from bemani.backend.jubeat import JubeatFactory
@@ -19,52 +23,126 @@ from bemani.frontend.ddr import DDRCache
 from bemani.frontend.sdvx import SoundVoltexCache
 from bemani.frontend.reflec import ReflecBeatCache
 from bemani.frontend.museca import MusecaCache
-from bemani.common import GameConstants, Time
+from bemani.common import GameConstants, DBConstants, Time
 from bemani.data import Config, Data
+from bemani.data.api.mirror import Replicator
 from bemani.utils.config import load_config, instantiate_cache
 
+# A named unit of scheduled work, run against its own Data instance.
+Job = Tuple[str, Callable[[Data], None]]
 
-def run_scheduled_work(config: Config) -> None:
+
+def replicate_remote_data(data: Data, factory: Any) -> None:
+    replicator = Replicator(data.local.api, data.local.mirror)
+    for game, version, name in factory.all_games():
+        versions = [version]
+        if game in {GameConstants.IIDX, GameConstants.JUBEAT, GameConstants.MUSECA, GameConstants.POPN_MUSIC}:
+            # Omnimix clients look up remote data under their own music version.
+            versions.append(version + DBConstants.OMNIMIX_VERSION_BUMP)
+
+        for replicate_version in versions:
+            try:
+                failures = replicator.replicate(game, replicate_version)
+            except Exception:
+                stack = traceback.format_exc()
+                print(stack)
+                data.local.network.put_event(
+                    "exception",
+                    {
+                        "service": "scheduler",
+                        "traceback": stack,
+                    },
+                )
+                continue
+
+            # Remote servers going away is routine, so don't fill the event log with it.
+            for serverid, error in failures:
+                print(f"Failed to replicate {name} from server {serverid}: {error}")
+
+
+def run_job(config: Config, job: Job) -> None:
+    # Every job gets its own session so that jobs running side by side never share a
+    # connection, and so that one job's failure can't poison another's transaction.
+    name, work = job
     data = Data(config)
+    start = time.monotonic()
+    success = True
+    try:
+        work(data)
+    except Exception:
+        success = False
+        stack = traceback.format_exc()
+        print(stack)
+        data.local.network.put_event(
+            "exception",
+            {
+                "service": "scheduler",
+                "traceback": stack,
+            },
+        )
+
+    data.local.network.put_event(
+        "scheduled_job",
+        {
+            "job": name,
+            "duration": round(time.monotonic() - start, 3),
+            "success": success,
+        },
+    )
+    data.local.network.flush_events()
+    data.close()
+
+
+def run_jobs(config: Config, jobs: List[Job], parallelism: int) -> None:
+    if parallelism <= 1:
+        for job in jobs:
+            run_job(config, job)
+        return
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=parallelism) as executor:
+        for future in [executor.submit(run_job, config, job) for job in jobs]:
+            future.result()
+
 
+def run_scheduled_work(config: Config, only: Optional[List[str]] = None, parallelism: int = 1) -> None:
     # Only run scheduled work for enabled components
-    enabled_factories: List[Any] = []
-    enabled_caches: List[Any] = []
-    if GameConstants.IIDX in config.support:
-        enabled_factories.append(IIDXFactory)
-        enabled_caches.append(IIDXCache)
-    if GameConstants.POPN_MUSIC in config.support:
-        enabled_factories.append(PopnMusicFactory)
-        enabled_caches.append(PopnMusicCache)
-    if GameConstants.JUBEAT in config.support:
-        enabled_factories.append(JubeatFactory)
-        enabled_caches.append(JubeatCache)
-    if GameConstants.BISHI_BASHI in config.support:
-        enabled_factories.append(BishiBashiFactory)
-        enabled_caches.append(BishiBashiCache)
-    if GameConstants.MGA in config.support:
-        enabled_factories.append(MetalGearArcadeFactory)
-        enabled_caches.append(MetalGearArcadeCache)
-    if GameConstants.DDR in config.support:
-        enabled_factories.append(DDRFactory)
-        enabled_caches.append(DDRCache)
-    if GameConstants.SDVX in config.support:
-        enabled_factories.append(SoundVoltexFactory)
-        enabled_caches.append(SoundVoltexCache)
-    if GameConstants.REFLEC_BEAT in config.support:
-        enabled_factories.append(ReflecBeatFactory)
-        enabled_caches.append(ReflecBeatCache)
-    if GameConstants.MUSECA in config.support:
-        enabled_factories.append(MusecaFactory)
-        enabled_caches.append(MusecaCache)
-
-    # First, run any backend scheduled work
-    for factory in enabled_factories:
-        factory.run_scheduled_work(data, config)
-
-    # Now, warm the caches for the frontend
-    for cache in enabled_caches:
-        cache.preload(data, config)
+    components: List[Tuple[GameConstants, Any, Any]] = [
+        (GameConstants.IIDX, IIDXFactory, IIDXCache),
+        (GameConstants.POPN_MUSIC, PopnMusicFactory, PopnMusicCache),
+        (GameConstants.JUBEAT, JubeatFactory, JubeatCache),
+        (GameConstants.BISHI_BASHI, BishiBashiFactory, BishiBashiCache),
+        (GameConstants.MGA, MetalGearArcadeFactory, MetalGearArcadeCache),
+        (GameConstants.DDR, DDRFactory, DDRCache),
+        (GameConstants.SDVX, SoundVoltexFactory, SoundVoltexCache),
+        (GameConstants.REFLEC_BEAT, ReflecBeatFactory, ReflecBeatCache),
+        (GameConstants.MUSECA, MusecaFactory, MusecaCache),
+    ]
+    enabled = [
+        (game, factory, cache)
+        for (game, factory, cache) in components
+        if game in config.support and (only is None or game.value in only)
+    ]
+
+    # First, pull down a fresh copy of any remote data so that scheduled work sees it
+    if config.mirror.enabled:
+        run_jobs(
+            config,
+            [
+                (f"{game.value}.replicate", partial(replicate_remote_data, factory=factory))
+                for (game, factory, _) in enabled
+            ],
+            parallelism,
+        )
+
+    # Now, run any backend scheduled work and warm the caches for the frontend. These
+    # are independent of each other, so a slow cache warmer doesn't hold up the rest.
+    jobs: List[Job] = []
+    for game, factory, cache in enabled:
+        jobs.append((f"{game.value}.scheduled_work", partial(factory.run_scheduled_work, config=config)))
+        jobs.append((f"{game.value}.preload", partial(cache.preload, config=config)))
+    run_jobs(config, jobs, parallelism)
+
+    data = Data(config)
 
     # Now, possibly delete old log entries
     keep_duration = config.get("event_log_duration", 0)
@@ -73,6 +151,13 @@ def run_scheduled_work(config: Config) -> None:
         oldest_event = Time.now() - keep_duration
         data.local.network.delete_events(oldest_event)
 
+    # Sweep out expired login and PASELI sessions.
+    data.local.network.delete_expired_sessions()
+
+    # Make sure any audit events we generated are written out.
+    data.local.network.flush_events()
+    data.close()
+
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="A scheduler for work that needs to be done periodically.")
@@ -89,6 +174,19 @@ if __name__ == "__main__":
         action="store_true",
         help="Force the database into read-only mode.",
     )
+    parser.add_argument(
+        "--only",
+        action="append",
+        choices=[game.value for game in GameConstants],
+        help="Only run scheduled work for this game series. Can be given more than once.",
+    )
+    parser.add_argument(
+        "-p",
+        "--parallelism",
+        help="Number of scheduled jobs to run at once. Defaults to 1.",
+        type=int,
+        default=1,
+    )
     args = parser.parse_args()
 
     # Set up global configuration
@@ -101,4 +199,4 @@ if __name__ == "__main__":
     instantiate_cache(config)
 
     # Run out of band work
-    run_scheduled_work(config)
+    run_scheduled_work(config, only=args.only, parallelism=args.parallelism)
@@ -7,6 +7,7 @@ from typing import Any
 from bemani.protocol import EAmuseProtocol
 from bemani.backend import Dispatch, UnrecognizedPCBIDException
 from bemani.data import Config, Data
+from bemani.data.instrumentation import Instrumentation
 from bemani.utils.config import (
     load_config as base_load_config,
     instantiate_cache as base_instantiate_cache,
@@ -59,10 +60,17 @@ def receive_request(path: str) -> Response:
         "address": remote_address or request.remote_addr,
     }
 
+    # Charge timing to the module and method being called, so expensive handlers stand out.
+    if len(req.children) == 1:
+        packetname = f"{req.children[0].name}.{req.children[0].attribute('method')}"
+    else:
+        packetname = req.name
+
     dataprovider = Data(requestconfig)
     try:
         dispatch = Dispatch(requestconfig, dataprovider, config["verbose"])
-        resp = dispatch.handle(req)
+        with Instrumentation.request(requestconfig, packetname):
+            resp = dispatch.handle(req)
 
         if resp is None:
             # Nothing to do here
@@ -149,6 +157,12 @@ if __name__ == "__main__":
         help="Turn on profiling for services, writing CProfile data to the currenct directory",
         action="store_true",
     )
+    parser.add_argument(
+        "-i",
+        "--instrument",
+        help="Turn on per-packet timing and slow query logging, regardless of the config file",
+        action="store_true",
+    )
     parser.add_argument(
         "-o",
         "--read-only",
@@ -162,6 +176,8 @@ if __name__ == "__main__":
     config["server"]["port"] = args.port
     if args.read_only:
         config["database"]["read_only"] = True
+    if args.instrument:
+        config["instrumentation"] = {**config.get("instrumentation", {}), "enabled": True}
 
     # Force full verbose output when running as a debug app.
     config["verbose"] = True
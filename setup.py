@@ -197,6 +197,7 @@ setup(
         'bemani.common',
         'bemani.data',
         'bemani.data.api',
+        'bemani.data.cache',
         'bemani.data.mysql',
         'bemani.protocol',
 